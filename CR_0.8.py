@@ -1,6 +1,6 @@
 """
 Chain Reaction mäng - lihtsustatud ja loetavam versioon.
-Bugid: kui tekib infinate animation, ei kuulutata kunagi võitjat
+Reeglid tulevad engine.py "classic" variandist, see fail ainult joonistab ja animeerib neid.
 """
 
 import math
@@ -9,9 +9,10 @@ import time
 from typing import List, Tuple
 import pygame
 
+import engine
+
 # Pygame initsialiseeerimine
 pygame.init()
-# Suurendame rekursiooni limiiti ahelreaktsioonide jaoks
 
 # Akna seaded
 WINDOW_WIDTH = 466
@@ -32,6 +33,9 @@ SHAKE_AMOUNT = 3
 SHAKE_SPEED = 10
 ANIMATION_DURATION = 0.3  # sekundites
 
+# Kell animatsioonide jaoks, mõõtmisskriptid asendavad selle simuleeritud kellaga
+CLOCK = time.time
+
 # Mängijate värvid
 RED = (153, 0, 0)
 BLUE = (0, 153, 180)
@@ -41,51 +45,89 @@ BACKGROUND_RED = (255, 204, 204)
 BACKGROUND_BLUE = (204, 255, 255)
 GRID_COLOR = (200, 200, 200)
 
+# Mootori värvid ja nende vasted siin
+PLAYER_COLORS = {engine.NONE: None, engine.RED: RED, engine.BLUE: BLUE}
+ENGINE_COLORS = {color: player for player, color in PLAYER_COLORS.items()}
+
 # Akna loomine
 GAME_WINDOW = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 pygame.display.set_caption("Chain Reaction Classic")
 
 
 class Cell:
-    """Mängulaua ühe ruudu klass."""
+    """Mängulaua ühe ruudu vaade, mis loeb mootori nimekirju."""
 
-    def __init__(self):
-        """Loob tühja ruudu."""
-        self.dot_count = 0
-        self.color = None
+    def __init__(self, rules: engine.Engine, index: int):
+        """Seob ruudu mootori ruuduga `index`."""
+        self.rules = rules
+        self.index = index
 
-    def is_empty(self) -> bool:
-        """Kontrollib, kas ruut on tühi."""
-        return self.dot_count == 0
+    @property
+    def dot_count(self) -> int:
+        return self.rules.dots[self.index]
+
+    @dot_count.setter
+    def dot_count(self, dot_count: int):
+        self.rules.dots[self.index] = dot_count
+
+    @property
+    def color(self):
+        return PLAYER_COLORS[self.rules.owner[self.index]]
 
-    def add_dot(self, player_color: Tuple[int, int, int]):
-        """Lisab ruudusse ühe täpi."""
-        self.dot_count += 1
-        self.color = player_color
+    @color.setter
+    def color(self, color):
+        self.rules.owner[self.index] = ENGINE_COLORS[color]
 
-    def clear(self):
-        """Eemaldab kõik täpid ruudust."""
-        self.dot_count = 0
-        self.color = None
+    def is_empty(self) -> bool:
+        """Kontrollib, kas ruut on tühi."""
+        return self.rules.dots[self.index] == 0
 
 
 class Game:
-    """Mängu põhiloogika klass."""
+    """Mängu olek: mootori "classic" mäng ja selle ruutude vaated."""
 
     def __init__(self):
         """Alustab uue mängu."""
-        self.chain_reaction_in_progress = False
-        # Loome tühja mängulaua
+        self.rules = engine.Engine("classic", rows=GRID_ROWS, cols=GRID_COLS)
+        self.rules.wave_log = []  # Iga laine plahvatused animatsiooni jaoks
+        # Loome mängulaua vaated
         self.grid = []
-        for _ in range(GRID_ROWS):
-            row = [Cell() for _ in range(GRID_COLS)]
-            self.grid.append(row)
-        # Mängu oleku muutujad
-        self.current_player = RED
-        self.is_chain_reacting = False
-        self.game_over = False
-        self.winner = None
-        self.turns_played = 0
+        for row in range(GRID_ROWS):
+            self.grid.append([Cell(self.rules, row * GRID_COLS + col) for col in range(GRID_COLS)])
+
+    @property
+    def current_player(self):
+        """Mängija, kelle käik on. Käik läheb vastasele kohe pärast klikki, nagu varem."""
+        player = self.rules.current_player
+        if self.rules.in_flight is not None:
+            # Mootor vahetab mängija alles siis, kui ahelreaktsioon on läbi
+            player = engine.BLUE if player == engine.RED else engine.RED
+        return PLAYER_COLORS[player]
+
+    @current_player.setter
+    def current_player(self, color):
+        self.rules.current_player = ENGINE_COLORS[color]
+
+    @property
+    def is_chain_reacting(self) -> bool:
+        """Kas viimane käik alles laheneb."""
+        return self.rules.in_flight is not None
+
+    @property
+    def game_over(self) -> bool:
+        return self.rules.game_over
+
+    @property
+    def winner(self):
+        return PLAYER_COLORS[self.rules.winner]
+
+    @property
+    def turns_played(self) -> int:
+        return self.rules.turns_played
+
+    @turns_played.setter
+    def turns_played(self, turns_played: int):
+        self.rules.turns_played = turns_played
 
     def is_valid_move(self, row: int, col: int) -> bool:
         """Kontrollib, kas käik on lubatud."""
@@ -95,30 +137,12 @@ class Game:
         if col < 0 or col >= GRID_COLS:
             return False
 
-        target_cell = self.grid[row][col]
-        
-        # Käik on lubatud, kui:
-        # 1. ruut on tühi VÕI
-        # 2. ruudus on sama värvi täpid
-        return (target_cell.is_empty() or 
-                target_cell.color == self.current_player)
+        # Käik on lubatud, kui ruut on tühi või selles on sama värvi täpid
+        return self.rules.is_valid_index(row * GRID_COLS + col)
 
     def get_critical_mass(self, row: int, col: int) -> int:
         """Tagastab ruudu plahvatamiseks vajaliku täppide arvu."""
-        # Kontrolli, kas tegu on nurgaruuduga
-        is_corner = (row in [0, GRID_ROWS-1] and 
-                    col in [0, GRID_COLS-1])
-        if is_corner:
-            return 2
-
-        # Kontrolli, kas tegu on ääreruuduga
-        is_edge = (row in [0, GRID_ROWS-1] or 
-                  col in [0, GRID_COLS-1])
-        if is_edge:
-            return 3
-
-        # Tegu on tavalise ruuduga
-        return 4
+        return self.rules.board.critical[row * GRID_COLS + col]
     
     def is_about_to_explode(self, row: int, col: int) -> bool:
         """Kontrollib, kas ruut on ühe täpi kaugusel plahvatusest."""
@@ -132,106 +156,14 @@ class Game:
 
     def get_neighbor_positions(self, row: int, col: int) -> List[Tuple[int, int]]:
         """Tagastab ruudu naabrite koordinaadid (üles, alla, vasakule, paremale)."""
-        neighbor_positions = []
-        possible_neighbors = [
-            (row - 1, col),  # üles
-            (row + 1, col),  # alla
-            (row, col - 1),  # vasakule
-            (row, col + 1)   # paremale
-        ]
-        
-        for new_row, new_col in possible_neighbors:
-            # Lisa naaber ainult siis, kui ta on mängulaua piirides
-            if (0 <= new_row < GRID_ROWS and 
-                0 <= new_col < GRID_COLS):
-                neighbor_positions.append((new_row, new_col))
-                
-        return neighbor_positions
-
-    def add_dot(self, row: int, col: int, color: Tuple[int, int, int]) -> bool:
-        """Lisab täpi ruudusse ja tagastab True, kui tekib plahvatus."""
-        target_cell = self.grid[row][col]
-        target_cell.color = color
-        target_cell.dot_count += 1
-        
-        dots_needed_to_explode = self.get_critical_mass(row, col)
-        return target_cell.dot_count >= dots_needed_to_explode
-
-    def remove_dots(self, row: int, col: int) -> Tuple[int, Tuple[int, int, int]]:
-        """Eemaldab täpid ruudust ja tagastab nende arvu ja värvi."""
-        cell = self.grid[row][col]
-        dot_count = cell.dot_count
-        dot_color = cell.color
-        
-        cell.clear()
-        return dot_count, dot_color
-
-    def trigger_chain_reaction(self, row: int, col: int):
-        """Käivitab ahelreaktsiooni antud ruudus."""
-        cell = self.grid[row][col]
-        dots_needed_to_explode = self.get_critical_mass(row, col)
-        
-        # Kontrolli, kas ruudus on piisavalt täppe plahvatuseks
-        if cell.dot_count < dots_needed_to_explode:
-            return
-            
-        # Salvesta täppide värv enne ruudu tühjendamist
-        exploding_color = cell.color
-        cell.clear()
-        
-        # Levita täpid naaberruudutesse
-        for neighbor_row, neighbor_col in self.get_neighbor_positions(row, col):
-            neighbor = self.grid[neighbor_row][neighbor_col]
-            neighbor.color = exploding_color
-            neighbor.dot_count += 1
-            
-            # Kontrolli rekursiivselt, kas tekib uusi plahvatusi
-            self.trigger_chain_reaction(neighbor_row, neighbor_col)
+        board = self.rules.board
+        return [board.coords[neighbor] for neighbor in board.neighbors[row * GRID_COLS + col]]
 
     def make_move(self, row: int, col: int) -> bool:
-        """Teeb käigu antud positsioonile."""
-        # Kontrolli, kas käik on lubatud
-        if self.game_over:
-            return False
+        """Teeb käigu antud positsioonile koos kogu ahelreaktsiooniga, ilma animatsioonita."""
         if not self.is_valid_move(row, col):
             return False
-            
-        # Lisa täpp valitud ruudusse
-        target_cell = self.grid[row][col]
-        target_cell.add_dot(self.current_player)
-        self.is_chain_reacting = True
-        # Käivita võimalik ahelreaktsioon
-        self.trigger_chain_reaction(row, col)
-        
-        self.turns_played += 1
-        
-        # Kontrolli võitu alates teisest käigust
-
-        self.current_player = BLUE if self.current_player == RED else RED
-            
-        return True
-
-    def check_winner(self) -> bool:
-        """Kontrollib, kas keegi on võitnud."""
-        active_colors = set()
-        dots_exist = False
-        
-        # Kontrolli kõiki ruutusid
-        for row in self.grid:
-            for cell in row:
-                if not cell.is_empty():
-                    active_colors.add(cell.color)
-                    dots_exist = True
-        
-        # Võitja on selgunud kui:
-        # 1. Laual on täppe
-        # 2. Kõik täpid on sama värvi
-        print(active_colors)
-        only_one_color_left = len(active_colors) == 1
-        
-        return (dots_exist and 
-                only_one_color_left)
-
+        return self.rules.make_move(row, col)
 
     def get_dot_positions(self) -> List[Tuple[int, int]]:
         """Tagastab kõikide täppide asukohad laual."""
@@ -323,7 +255,7 @@ def draw_game_state(game: Game):
             )
     
     # Joonista täpid koos värisemisefektiga
-    current_time = time.time()
+    current_time = CLOCK()
     
     for row in range(GRID_ROWS):
         for col in range(GRID_COLS):
@@ -431,69 +363,63 @@ def draw_moving_dots(window: pygame.Surface, moving_dots: List[MovingDot]):
 
 def create_explosion_animation(
     game: Game,
-    row: int,
-    col: int,
+    wave: List,
     moving_dots: List[MovingDot]
 ):
-    """Käivitab plahvatuse animatsiooni."""
-    # Kontrolli, kas lahtris on piisavalt täppe plahvatuseks
-    cell = game.grid[row][col]
-    if cell.dot_count < game.get_critical_mass(row, col):
-        return
-        
-    # Eemalda täpid plahvatavast lahtrist
-    dot_count, dot_color = game.remove_dots(row, col)
-    
-    # Arvuta plahvatava lahtri keskpunkt
-    start_x = col * CELL_SIZE + CELL_SIZE // 2
-    start_y = row * CELL_SIZE + CELL_SIZE // 2
-    start_pos = (start_x, start_y)
-    
-    # Loo animatsioon iga naabri jaoks
-    for neighbor_row, neighbor_col in game.get_neighbor_positions(row, col):
-        # Arvuta sihtlahtri keskpunkt
-        end_x = neighbor_col * CELL_SIZE + CELL_SIZE // 2
-        end_y = neighbor_row * CELL_SIZE + CELL_SIZE // 2
-        end_pos = (end_x, end_y)
-        
-        # Lisa uus liikuv täpp
-        new_dot = MovingDot(
-            start_pos=start_pos,
-            end_pos=end_pos,
-            color=dot_color,
-            start_time=time.time()
-        )
-        moving_dots.append(new_dot)
+    """Käivitab ühe laine plahvatuste animatsiooni.
+
+    `wave` on mootori wave_log kirje: plahvatanud ruut, selle värv, järgmine ruut, ...
+    Täpid on mootoris juba teel; siin lendavad need ainult ekraanil.
+    """
+    for index in range(0, len(wave), 2):
+        row, col = divmod(wave[index], GRID_COLS)
+        dot_color = PLAYER_COLORS[wave[index + 1]]
+
+        # Arvuta plahvatava lahtri keskpunkt
+        start_x = col * CELL_SIZE + CELL_SIZE // 2
+        start_y = row * CELL_SIZE + CELL_SIZE // 2
+        start_pos = (start_x, start_y)
+
+        # Loo animatsioon iga naabri jaoks
+        for neighbor_row, neighbor_col in game.get_neighbor_positions(row, col):
+            # Arvuta sihtlahtri keskpunkt
+            end_x = neighbor_col * CELL_SIZE + CELL_SIZE // 2
+            end_y = neighbor_row * CELL_SIZE + CELL_SIZE // 2
+            end_pos = (end_x, end_y)
+
+            # Lisa uus liikuv täpp
+            new_dot = MovingDot(
+                start_pos=start_pos,
+                end_pos=end_pos,
+                color=dot_color,
+                start_time=CLOCK()
+            )
+            moving_dots.append(new_dot)
 
 
 def update_game_state(game: Game, moving_dots: List[MovingDot]):
-    """Uuendab mängu olekut ja animatsioone."""
-    current_time = time.time()
-    finished_dots = []
-    cells_to_check = set()
-    
-    # Uuenda kõiki liikuvaid täppe
-    for dot in moving_dots:
-        if dot.update_position(current_time):
-            finished_dots.append(dot)
-            target_col = int(dot.end_pos[0] // CELL_SIZE)
-            target_row = int(dot.end_pos[1] // CELL_SIZE)
-            
-            if game.add_dot(target_row, target_col, dot.color):
-                cells_to_check.add((target_row, target_col))
-    
+    """Uuendab animatsioone ja laseb mootoril lahendada järgmise laine, kui täpid on kohal."""
+    current_time = CLOCK()
+    finished_dots = [dot for dot in moving_dots if dot.update_position(current_time)]
     for dot in finished_dots:
         moving_dots.remove(dot)
-    
-    # Käivita uued plahvatused
-    game.is_chain_reacting = bool(cells_to_check)
-    for row, col in cells_to_check:
-        create_explosion_animation(game, row, col, moving_dots)
-    
-    # Kontrolli võitjat PÄRAST kõiki reaktsioone
-    if not moving_dots and not game.is_chain_reacting and game.check_winner() and game.turns_played > 1:
-        game.game_over = True
-        game.winner = next((c for c in [RED, BLUE] if any(cell.color == c for row in game.grid for cell in row)), None)
+
+    rules = game.rules
+    if moving_dots or rules.in_flight is None:
+        return
+
+    # Kõik täpid on kohal: need maanduvad mootoris ja kriitilised ruudud plahvatavad
+    if rules.in_flight:
+        waves = len(rules.wave_log)
+        rules.land_wave()
+        # Kui mäng selgus laine ajal, ei lenda täpid enam kuhugi
+        if rules.in_flight and len(rules.wave_log) > waves:
+            create_explosion_animation(game, rules.wave_log[-1], moving_dots)
+
+    # Käik on läbi: mootor kontrollib võitjat ja annab käigu vastasele
+    if not rules.in_flight:
+        rules.finish_move()
+
 
 def handle_player_move(
     game: Game,
@@ -507,16 +433,13 @@ def handle_player_move(
         return False
     if not game.is_valid_move(row, col):
         return False
-    if moving_dots:  # Ära luba uut käiku, kui animatsioonid pole lõppenud
+    if moving_dots or game.is_chain_reacting:  # Ära luba uut käiku, kui eelmine pole lõppenud
         return False
-    
-    # Lisa täpp valitud lahtrisse
-    if game.add_dot(row, col, game.current_player):
-        create_explosion_animation(game, row, col, moving_dots)
-    
-    # Lõpeta käik
-    game.turns_played += 1
-    game.current_player = BLUE if game.current_player == RED else RED
+
+    # Lisa täpp valitud lahtrisse; kui see plahvatab, lendavad täpid naabritesse
+    game.rules.start_move(row * GRID_COLS + col)
+    if game.rules.in_flight:
+        create_explosion_animation(game, game.rules.wave_log[0], moving_dots)
     return True
 
 
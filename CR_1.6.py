@@ -1,10 +1,20 @@
+import argparse
+import csv
+import json
+import os
 import pygame
 import sys
 import math
 import time
 import random
+import threading
+from collections import Counter, deque
+from functools import lru_cache, wraps
+from types import SimpleNamespace
 from typing import List, Tuple, Optional
 
+import engine
+
 # Constants
 WINDOW_WIDTH = 700
 WINDOW_HEIGHT = 700
@@ -19,12 +29,27 @@ SHAKE_SPEED = 10
 HQ_HEALTH = 5
 RED_HQ_POS = (0, GRID_COLS // 2)
 BLUE_HQ_POS = (GRID_ROWS - 1, GRID_COLS // 2)
-POWERUP_SPAWN_CHANCE = 1 / (5 + random.random() * 2)
 POWERUP_STAR = "star"
 POWERUP_HEART = "heart"
-MAX_POWERUP_SPAWNS = 60  # Maximum number of powerups that can spawn in a game
+VARIANT = "hq_powerups"  # engine.py variant with these rules ("hq" has no powerups)
 EXPLOSION_DURATION = 0.5  # seconds
 EXPLOSION_PARTICLES = 300
+TEXT_CACHE_SIZE = 64  # Rendered HUD strings kept around (least recently used are dropped)
+IDLE_WAIT_MS = 1000  # Longest sleep of the main loop while nothing is animating
+STAR_FRAMES = 36  # Pre-rotated star sprites covering one 72 degree period
+MIN_CELL_PX = 4  # Smallest zoom level, in screen pixels per cell
+MAX_CELL_PX = CELL_SIZE * 2  # Largest zoom level
+FIT_MIN_CELL_PX = 32  # Fitting a large board never zooms out further than this
+ZOOM_STEP = 1.25
+SCROLL_STEP = 60  # Pixels per arrow key press
+SCORCH_TILE_CELLS = 4  # Scorch layer tiles are this many cells wide
+PROFILER_HISTORY = 240  # Frames kept for the profiler overlay percentiles
+PROFILER_FONT_SIZE = 22
+TIMELINE_HEIGHT = 32  # Replay timeline bar at the bottom of the window
+TIMELINE_FONT_SIZE = 24
+
+# Clock for the rules and the animations. The offscreen exporter swaps in a simulated one.
+CLOCK = time.time
 
 # Colors
 BLACK = (0, 0, 0)
@@ -35,6 +60,7 @@ PASTEL_BLUE = (204, 255, 255)
 GRAY = (200, 200, 200)
 GREEN = (48, 169, 64)
 DARK_RED = (139, 0, 0)  # Color for the heart powerup
+TRANSPARENT_COLORKEY = (255, 0, 255)  # Transparent color of cached layers and sprites
 
 # Create the window
 pygame.init()  # Initialize all pygame modules
@@ -42,87 +68,120 @@ pygame.font.init()  # Explicitly initialize the font module
 WINDOW = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 pygame.display.set_caption("Chain Base")
 
-# Cache common calculations
-NEIGHBOR_OFFSETS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-ALL_NEIGHBOR_OFFSETS = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if dx != 0 or dy != 0]
+@lru_cache(maxsize=8)
+def get_font(size: int) -> pygame.font.Font:
+    return pygame.font.Font(None, size)
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(size: int, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+    """Rendered text surface for HUD strings. The result is shared, do not draw on it."""
+    return get_font(size).render(text, True, color)
+
+# engine.py keeps players and powerups as small integers
+PLAYER_COLORS = {engine.NONE: None, engine.RED: RED, engine.BLUE: BLUE}
+ENGINE_COLORS = {color: player for player, color in PLAYER_COLORS.items()}
+POWERUP_TYPES = {engine.NO_POWERUP: None, engine.STAR: POWERUP_STAR, engine.HEART: POWERUP_HEART}
+ENGINE_POWERUPS = {powerup_type: kind for kind, powerup_type in POWERUP_TYPES.items()}
 
 class Cell:
-    def __init__(self):
-        self.dots = 0
-        self.color = None
-        self.powerup = None
+    """One square of the board as it is drawn, read from the game's engine.py lists."""
 
-    def is_empty(self) -> bool:
-        return self.dots == 0
+    __slots__ = ("rules", "index")
 
-    def add_dot(self, color: Tuple[int, int, int]):
-        self.dots += 1
-        self.color = color
-        self.powerup = None
+    def __init__(self, rules, index):
+        self.rules = rules
+        self.index = index
 
-    def clear(self):
-        self.dots = 0
-        self.color = None
-        self.powerup = None
+    @property
+    def dots(self):
+        return self.rules.dots[self.index]
+
+    @dots.setter
+    def dots(self, dots):
+        self.rules.dots[self.index] = dots
+
+    @property
+    def color(self):
+        return PLAYER_COLORS[self.rules.owner[self.index]]
+
+    @color.setter
+    def color(self, color):
+        self.rules.owner[self.index] = ENGINE_COLORS[color]
+
+    @property
+    def powerup(self):
+        return POWERUP_TYPES[self.rules.powerup[self.index]]
+
+    @powerup.setter
+    def powerup(self, powerup_type):
+        self.rules.powerup[self.index] = ENGINE_POWERUPS[powerup_type]
+
+    def is_empty(self) -> bool:
+        return self.rules.dots[self.index] == 0
 
     def has_powerup(self):
-        return self.powerup is not None
+        return self.rules.powerup[self.index] != engine.NO_POWERUP
 
 class HQCell(Cell):
-    def __init__(self, color, health):
-        super().__init__()
-        self.color = color
-        self.health = health
-        self.dots = 0
+    __slots__ = ()
+
+    @property
+    def health(self):
+        rules = self.rules
+        return rules.red_hq_health if self.index == rules.board.red_hq else rules.blue_hq_health
 
     def is_empty(self) -> bool:
         return False
 
-    def clear(self):
-        pass
-
-    def add_dot(self, color):
-        pass
-
     def has_powerup(self):
         return False
 
 class Explosion:
-    def __init__(self, x: int, y: int, color: Tuple[int, int, int]):
+    def __init__(self, x: int, y: int, color: Tuple[int, int, int], rng=random):
         self.x = x
         self.y = y
         self.color = color
-        self.start_time = time.time()
+        self.start_time = CLOCK()
         self.particles = []
         self.completed = False
         
         # Pre-calculate particle data
         for _ in range(EXPLOSION_PARTICLES):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(0.3, 3)
+            angle = rng.uniform(0, 2 * math.pi)
+            speed = rng.uniform(0.3, 3)
             self.particles.append({
                 'dx': math.cos(angle) * speed * CELL_SIZE,  # Pre-multiply by CELL_SIZE
                 'dy': math.sin(angle) * speed * CELL_SIZE,
-                'size': random.uniform(2, 6),
+                'size': rng.uniform(2, 6),
                 'final_x': 0,
                 'final_y': 0
             })
 
-    def draw(self, window, offset_x=0, offset_y=0) -> None:
-        current_time = time.time()
-        progress = (current_time - self.start_time) / EXPLOSION_DURATION
+        # Area the particles can reach, used for dirty-rectangle tracking
+        reach = max(max(abs(p['dx']), abs(p['dy'])) + p['size'] for p in self.particles) if self.particles else 0
+        reach = int(reach) + 2
+        self.rect = pygame.Rect(x - reach, y - reach, reach * 2, reach * 2)
 
-        if progress >= 1 and not self.completed:
+    def finish_if_done(self, current_time) -> bool:
+        """Settle the particles once the animation is over, whether or not it was drawn."""
+        if not self.completed and current_time - self.start_time >= EXPLOSION_DURATION:
             for particle in self.particles:
                 particle['final_x'] = self.x + particle['dx']
                 particle['final_y'] = self.y + particle['dy']
             self.completed = True
+        return self.completed
+
+    def draw(self, window, offset_x=0, offset_y=0, current_time=None, scale=1) -> None:
+        if current_time is None:
+            current_time = CLOCK()
+        progress = (current_time - self.start_time) / EXPLOSION_DURATION
+        self.finish_if_done(current_time)
 
         if not self.completed:
             for particle in self.particles:
-                particle_x = self.x + particle['dx'] * progress + offset_x
-                particle_y = self.y + particle['dy'] * progress + offset_y
-                size = particle['size'] * (1 - progress * 0.5)
+                particle_x = (self.x + particle['dx'] * progress) * scale + offset_x
+                particle_y = (self.y + particle['dy'] * progress) * scale + offset_y
+                size = particle['size'] * (1 - progress * 0.5) * scale
                 pygame.draw.circle(window, self.color, 
                                  (int(particle_x), int(particle_y)), 
                                  int(size))
@@ -130,182 +189,294 @@ class Explosion:
             # Draw all particles in one call using draw.circles if possible
             for particle in self.particles:
                 pygame.draw.circle(window, self.color, 
-                                 (int(particle['final_x'] + offset_x), 
-                                  int(particle['final_y'] + offset_y)), 
-                                 int(particle['size'] * 0.5))
+                                 (int(particle['final_x'] * scale + offset_x), 
+                                  int(particle['final_y'] * scale + offset_y)), 
+                                 int(particle['size'] * 0.5 * scale))
+
+    def bake(self, surface, offset_x=0, offset_y=0) -> None:
+        """Draw the settled particles onto a persistent layer."""
+        for particle in self.particles:
+            pygame.draw.circle(surface, self.color,
+                             (int(particle['final_x'] + offset_x), int(particle['final_y'] + offset_y)),
+                             int(particle['size'] * 0.5))
+
+class ScorchLayer:
+    """Settled explosion particles in board coordinates.
+
+    Finished explosions never move again, so they are baked in here once.
+    The layer is split into tiles that only exist where explosions landed,
+    which keeps it small on boards far larger than the window. Tiles scaled
+    to the current zoom level are cached until the zoom or the tile changes.
+    """
+
+    def __init__(self):
+        self.tile_size = CELL_SIZE * SCORCH_TILE_CELLS
+        self.tiles = {}
+        self.scaled_tiles = {}
+        self.scaled_cell_px = None
+
+    def clear(self):
+        self.tiles.clear()
+        self.scaled_tiles.clear()
+
+    def bake(self, explosion):
+        size = self.tile_size
+        rect = explosion.rect
+        for tile_y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for tile_x in range(rect.left // size, (rect.right - 1) // size + 1):
+                tile = self.tiles.get((tile_x, tile_y))
+                if tile is None:
+                    tile = pygame.Surface((size, size))
+                    tile.fill(TRANSPARENT_COLORKEY)
+                    tile.set_colorkey(TRANSPARENT_COLORKEY)
+                    self.tiles[(tile_x, tile_y)] = tile
+                explosion.bake(tile, -tile_x * size, -tile_y * size)
+                self.scaled_tiles.pop((tile_x, tile_y), None)
+
+    def get_scaled_tile(self, key, cell_px):
+        if cell_px == CELL_SIZE:
+            return self.tiles[key]
+        if cell_px != self.scaled_cell_px:
+            self.scaled_tiles.clear()
+            self.scaled_cell_px = cell_px
+        tile = self.scaled_tiles.get(key)
+        if tile is None:
+            tile_px = SCORCH_TILE_CELLS * cell_px
+            tile = pygame.transform.scale(self.tiles[key], (tile_px, tile_px))
+            tile.set_colorkey(TRANSPARENT_COLORKEY)
+            self.scaled_tiles[key] = tile
+        return tile
+
+    def draw(self, window, viewport, rect):
+        """Blit the tiles overlapping `rect` (window coordinates)."""
+        if not self.tiles:
+            return
+        tile_px = SCORCH_TILE_CELLS * viewport.cell_px
+        first_x = (rect.left + viewport.scroll_x) // tile_px
+        last_x = (rect.right - 1 + viewport.scroll_x) // tile_px
+        first_y = (rect.top + viewport.scroll_y) // tile_px
+        last_y = (rect.bottom - 1 + viewport.scroll_y) // tile_px
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                if (tile_x, tile_y) in self.tiles:
+                    tile = self.get_scaled_tile((tile_x, tile_y), viewport.cell_px)
+                    window.blit(tile, (tile_x * tile_px - viewport.scroll_x, tile_y * tile_px - viewport.scroll_y))
+
+SCORCH_LAYER = ScorchLayer()
+
+def reset_scorch_layer():
+    SCORCH_LAYER.clear()
+
+def bake_completed_explosions(game, current_time=None):
+    """Move completed explosions from the game into the scorch layer."""
+    if current_time is None:
+        current_time = CLOCK()
+    still_running = []
+    for explosion in game.explosions:
+        if explosion.finish_if_done(current_time):
+            SCORCH_LAYER.bake(explosion)
+        else:
+            still_running.append(explosion)
+    game.explosions = still_running
+
+class GameMetrics:
+    """Counters and histograms for one game, for sizing simulations and comparing versions.
+
+    The counters are plain integer increments. Timing is_valid_move,
+    spawn_powerup and the engine's start_move and land_wave costs two clock
+    reads per call, so it only runs once GameMetrics.timing is switched on
+    (--metrics does that). The engine spawns powerups from start_move, so
+    that timer includes spawn_powerup's.
+    """
+
+    timing = False
 
-class Game:
     def __init__(self):
-        self.grid = [[Cell() for _ in range(GRID_COLS)] for _ in range(GRID_ROWS)]
-        self.current_player = BLUE
-        self.game_over = False
-        self.winner = None
-        self.turns_played = 0
-        self.red_hq_health = HQ_HEALTH
-        self.blue_hq_health = HQ_HEALTH
-        self.powerup_spawns = 0  # Add this line to track number of powerups spawned
+        self.counters = Counter()
+        self.histograms = {"waves_per_turn": Counter(), "cells_exploded_per_turn": Counter()}
+        self.timers = {}  # name -> [calls, total seconds, slowest call]
+        self.max_blobs_in_flight = 0
+        self.turn_waves = 0
+        self.turn_cells = 0
+
+    def count(self, name, amount=1):
+        if amount:
+            self.counters[name] += amount
+
+    def add_wave(self, cells_exploded):
+        self.turn_waves += 1
+        self.turn_cells += cells_exploded
+
+    def end_turn(self):
+        self.histograms["waves_per_turn"][self.turn_waves] += 1
+        self.histograms["cells_exploded_per_turn"][self.turn_cells] += 1
+        self.counters["cells_exploded"] += self.turn_cells
+        self.turn_waves = 0
+        self.turn_cells = 0
+
+    def observe_blobs(self, blobs_in_flight):
+        if blobs_in_flight > self.max_blobs_in_flight:
+            self.max_blobs_in_flight = blobs_in_flight
+
+    def add_time(self, name, seconds):
+        timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+    def to_dict(self):
+        return {
+            "counters": dict(self.counters, max_blobs_in_flight=self.max_blobs_in_flight),
+            "histograms": {name: {str(value): count for value, count in sorted(histogram.items())}
+                           for name, histogram in self.histograms.items()},
+            "timers": {name: {"calls": calls, "total_ms": total * 1000, "max_ms": slowest * 1000}
+                       for name, (calls, total, slowest) in self.timers.items()},
+        }
+
+def timed(name):
+    """Adds the run time of a Game method to game.metrics while GameMetrics.timing is on."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args):
+            if not GameMetrics.timing:
+                return method(self, *args)
+            start = time.perf_counter()
+            try:
+                return method(self, *args)
+            finally:
+                self.metrics.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def rules_field(name):
+    """A Game attribute that is kept in its engine.py game."""
+    return property(lambda game: getattr(game.rules, name), lambda game, value: setattr(game.rules, name, value))
+
+class Game:
+    """The game on screen. engine.py plays the rules; the Game adds what is only drawn.
+
+    A move's chain reaction is resolved one wave at a time, as the blobs of
+    the wave before land (update_game), and the turn passes once nothing is
+    in flight. HQ explosions draw their particles from the game's own
+    generator, so the picture never touches the rules' random stream.
+    """
+
+    def __init__(self, seed=None, spawn_interval=None):
+        self.rules = engine.Engine(VARIANT, seed=seed, rows=GRID_ROWS, cols=GRID_COLS,
+                                   spawn_interval=spawn_interval, hq_health=HQ_HEALTH)
+        self.rules.wave_log = []
+        self.rules.hit_log = []
+        self.seed = self.rules.seed
+        self.rng = random.Random(self.seed)
+        self.grid = [[Cell(self.rules, row * GRID_COLS + col) for col in range(GRID_COLS)]
+                     for row in range(GRID_ROWS)]
+        for row, col in (RED_HQ_POS, BLUE_HQ_POS):
+            self.grid[row][col] = HQCell(self.rules, row * GRID_COLS + col)
+        self.moves = []  # Accepted moves, for recordings
         self.explosions: List[Explosion] = []
-        self.turn_pending = False
+        self.waves_shown = 0  # Waves of the current move that have sent their blobs
+        self.metrics = GameMetrics()
+        self.rules.spawn_powerup = self.spawn_powerup  # The engine's spawns go through the timer
 
-        red_row, red_col = RED_HQ_POS
-        blue_row, blue_col = BLUE_HQ_POS
-        self.grid[red_row][red_col] = HQCell(RED, self.red_hq_health)
-        self.grid[blue_row][blue_col] = HQCell(BLUE, self.blue_hq_health)
+    game_over = rules_field("game_over")
+    turns_played = rules_field("turns_played")
+    red_hq_health = rules_field("red_hq_health")
+    blue_hq_health = rules_field("blue_hq_health")
+    powerup_spawns = rules_field("powerup_spawns")
 
-    def get_neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
-        return [(row + dr, col + dc) for dr, dc in NEIGHBOR_OFFSETS 
-                if 0 <= row + dr < GRID_ROWS and 0 <= col + dc < GRID_COLS]
+    @property
+    def current_player(self):
+        return PLAYER_COLORS[self.rules.current_player]
 
-    def get_all_neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
-        return [(row + dr, col + dc) for dr, dc in ALL_NEIGHBOR_OFFSETS 
-                if 0 <= row + dr < GRID_ROWS and 0 <= col + dc < GRID_COLS]
+    @current_player.setter
+    def current_player(self, color):
+        self.rules.current_player = ENGINE_COLORS[color]
 
-    def is_valid_move(self, row: int, col: int) -> bool:
-        if not (0 <= row < GRID_ROWS and 0 <= col < GRID_COLS):
-            return False
-        if (row, col) in [RED_HQ_POS, BLUE_HQ_POS]:
-            return False
+    @property
+    def winner(self):
+        return PLAYER_COLORS[self.rules.winner]
 
-        # Check HQ rows - allow only empty cells or own dots
-        if (self.current_player == RED and row == RED_HQ_POS[0]) or \
-           (self.current_player == BLUE and row == BLUE_HQ_POS[0]):
-            return self.grid[row][col].is_empty() or self.grid[row][col].color == self.current_player
+    @winner.setter
+    def winner(self, color):
+        self.rules.winner = ENGINE_COLORS[color]
 
-        if self.turns_played < 2:
-            if self.current_player == RED:
-                return row == 1
-            else:
-                return row == GRID_ROWS - 2
+    @property
+    def turn_pending(self):
+        """The last move is still resolving; the turn passes when it is done."""
+        return self.rules.in_flight is not None
 
-        # Normal move rules for other cases
-        if not self.grid[row][col].is_empty():
-            return self.grid[row][col].color == self.current_player
-        
-        has_neighbor = False
-        for n_row, n_col in self.get_all_neighbors(row, col):
-            cell = self.grid[n_row][n_col]
-            if not cell.is_empty() and cell.color == self.current_player:
-                has_neighbor = True
-                break
-            if (self.current_player == RED and (n_row, n_col) == RED_HQ_POS) or \
-               (self.current_player == BLUE and (n_row, n_col) == BLUE_HQ_POS):
-                has_neighbor = True
-                break
-        return self.grid[row][col].is_empty() and has_neighbor
+    def get_neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
+        return [divmod(neighbor, GRID_COLS) for neighbor in self.rules.board.neighbors[row * GRID_COLS + col]]
+
+    @timed("is_valid_move")
+    def is_valid_move(self, row: int, col: int) -> bool:
+        return 0 <= row < GRID_ROWS and 0 <= col < GRID_COLS and self.rules.is_valid_index(row * GRID_COLS + col)
 
     def get_critical_mass(self, row: int, col: int) -> int:
-        if (row in (0, GRID_ROWS - 1)) and (col in (0, GRID_COLS - 1)):
-            return 2
-        if row in (0, GRID_ROWS - 1) or col in (0, GRID_COLS - 1):
-            return 3
-        return 4
+        return self.rules.board.critical[row * GRID_COLS + col]
 
     def is_near_critical(self, row: int, col: int) -> bool:
-        if self.grid[row][col].is_empty():
-            return False
-        return self.grid[row][col].dots == self.get_critical_mass(row, col) - 1
-
-    def add_dot_to_cell(self, row, col, color):
-        if isinstance(self.grid[row][col], HQCell):
-            if (row, col) == RED_HQ_POS and color == BLUE:
-                self.add_explosion(row, col, RED)
-                self.red_hq_health -= 1
-                return False
-            elif (row, col) == BLUE_HQ_POS and color == RED:
-                self.add_explosion(row, col, BLUE)
-                self.blue_hq_health -= 1
-                return False
-            return False
+        return self.rules.is_near_critical(row * GRID_COLS + col)
 
-        # Check for powerup before adding dot
-        if self.grid[row][col].has_powerup():
-            handle_powerup(self, row, col, [])
-            self.grid[row][col].powerup = None  # Clear the powerup after using it
-
-        self.grid[row][col].color = color
-        self.grid[row][col].dots += 1
-        return self.grid[row][col].dots >= self.get_critical_mass(row, col)
-
-    def remove_dots_from_cell(self, row, col):
-        dots = self.grid[row][col].dots
-        color = self.grid[row][col].color
-        self.grid[row][col].clear()
-        return dots, color
-
-    def chain_reaction(self, row: int, col: int):
-        """Käsitle ahelreaktsiooni"""
-        if self.grid[row][col].dots >= self.get_critical_mass(row, col):
-            color = self.grid[row][col].color  # This is the color/player causing the chain reaction
-            self.grid[row][col].clear()
-
-            # Kontrolli kõiki naabreid
-            for neighbor_row, neighbor_col in self.get_neighbors(row, col):
-                # Lisa plahvatus enne kahju tegemist
-                if (neighbor_row, neighbor_col) == RED_HQ_POS and color == BLUE:
-                    self.add_explosion(neighbor_row, neighbor_col, RED)
-                    self.red_hq_health -= 1
-                elif (neighbor_row, neighbor_col) == BLUE_HQ_POS and color == RED:
-                    self.add_explosion(neighbor_row, neighbor_col, BLUE)
-                    self.blue_hq_health -= 1
-                elif not isinstance(self.grid[neighbor_row][neighbor_col], HQCell):
-                    # Kontrolli võimendit enne täpi lisamist
-                    if self.grid[neighbor_row][neighbor_col].has_powerup():
-                        # Save the current player temporarily
-                        original_player = self.current_player
-                        # Set current player to the color causing the chain reaction
-                        self.current_player = color
-                        handle_powerup(self, neighbor_row, neighbor_col, [])
-                        # Restore the original player
-                        self.current_player = original_player
-
-                    self.grid[neighbor_row][neighbor_col].color = color
-                    self.grid[neighbor_row][neighbor_col].dots += 1
-                    self.chain_reaction(neighbor_row, neighbor_col)
-
-    def check_winner(self) -> bool:
-        if self.red_hq_health <= 0:
-            self.winner = BLUE
-            return True
-        if self.blue_hq_health <= 0:
-            self.winner = RED
-            return True
-        return False
+    @timed("start_move")
+    def start_move(self, row, col, moving_blobs):
+        """Play a move in the engine and send off the blobs of its explosion. Returns False if it is not valid."""
+        if not self.rules.start_move(row * GRID_COLS + col):
+            return False
+        self.moves.append((row, col))
+        self.waves_shown = 0
+        self.show_waves(moving_blobs)
+        return True
 
+    @timed("spawn_powerup")
     def spawn_powerup(self):
-        if self.powerup_spawns >= MAX_POWERUP_SPAWNS:
-            return  # Stop spawning after reaching the limit
-
-        empty_cells = []
-        for row in range(1, GRID_ROWS - 1):
-            for col in list(range(0, (GRID_COLS//2 - 1))) + list(range((GRID_COLS//2 + 2), GRID_COLS)):
-                cell = self.grid[row][col]
-                if cell.is_empty():
-                    has_neighbor = False
-                    for n_row, n_col in self.get_all_neighbors(row, col):
-                        if not self.grid[n_row][n_col].is_empty():
-                            has_neighbor = True
-                            break
-                    if not has_neighbor:
-                        empty_cells.append((row, col))
-
-        if empty_cells:
-            row, col = random.choice(empty_cells)
-            self.grid[row][col].powerup = random.choice([POWERUP_STAR, POWERUP_HEART])
-            self.powerup_spawns += 1
+        engine.Engine.spawn_powerup(self.rules)
+
+    @timed("land_wave")
+    def land_wave(self, moving_blobs):
+        """The blobs in flight have landed: the engine resolves the next wave."""
+        self.rules.land_wave()
+        self.show_waves(moving_blobs)
+
+    def show_waves(self, moving_blobs):
+        rules = self.rules
+        current_time = CLOCK()
+        for wave in rules.wave_log[self.waves_shown:]:
+            if wave:
+                moving_blobs.extend(wave_blobs(self, wave, current_time))
+                self.metrics.add_wave(len(wave) // 2)
+        self.waves_shown = len(rules.wave_log)
+        for index in rules.hit_log:
+            row, col = divmod(index, GRID_COLS)
+            self.add_explosion(row, col, self.grid[row][col].color)
+        rules.hit_log.clear()
+        self.metrics.observe_blobs(len(moving_blobs))
+        if not rules.in_flight:
+            rules.finish_move()
+            self.count_powerups()
+            self.metrics.count("hq_hits", rules.hq_hits)
+            self.metrics.end_turn()
+
+    def count_powerups(self):
+        rules = self.rules
+        totals = (("powerup_spawns", rules.powerup_spawns),
+                  (f"{POWERUP_STAR}_activations", rules.powerups_by_kind[engine.STAR]),
+                  (f"{POWERUP_HEART}_activations", rules.powerups_by_kind[engine.HEART]))
+        for name, total in totals:
+            self.metrics.count(name, total - self.metrics.counters[name])
 
     def add_explosion(self, row: int, col: int, color: Tuple[int, int, int]):
         x = col * CELL_SIZE + CELL_SIZE // 2
         y = row * CELL_SIZE + CELL_SIZE // 2
-        self.explosions.append(Explosion(x, y, color))
+        self.explosions.append(Explosion(x, y, color, self.rng))
+
+DOT_PATTERNS = {
+    1: [(0, 0)],
+    2: [(-1.5, 0), (1.5, 0)],
+    3: [(0, -1.5), (-1.5, 1), (1.5, 1)]
+}
 
 def draw_dot_pattern(window, cell, center_x, center_y, shake_offset_x=0, shake_offset_y=0):
-    # Pre-calculated dot positions
-    DOT_PATTERNS = {
-        1: [(0, 0)],
-        2: [(-1.5, 0), (1.5, 0)],
-        3: [(0, -1.5), (-1.5, 1), (1.5, 1)]
-    }
-    
     if cell.dots in DOT_PATTERNS:
         for dx, dy in DOT_PATTERNS[cell.dots]:
             x = center_x + dx * DOT_RADIUS + shake_offset_x
@@ -327,77 +498,298 @@ def draw_powerup(window, powerup_type, center_x, center_y, angle):
         ]
         pygame.draw.polygon(window, GREEN, points, 0)
 
-def draw_game(game: Game):
+def draw_hq_square(window, x, y, color, health):
+    # Calculate size reduction based on health
+    health_ratio = health / HQ_HEALTH
+    size_reduction = (1 - health_ratio) * (CELL_SIZE * 0.4)  # 0.4 controls max shrink
+
+    # Center the smaller square
+    adjusted_x = x + (size_reduction / 2)
+    adjusted_y = y + (size_reduction / 2)
+    adjusted_size = CELL_SIZE - size_reduction
+
+    pygame.draw.rect(window, color, (adjusted_x, adjusted_y, adjusted_size, adjusted_size))
+
+    # Adjust text position to center of new square
+    text = render_text(36, str(health), BLACK)
+    text_rect = text.get_rect(center=(adjusted_x + adjusted_size // 2, adjusted_y + adjusted_size // 2))
+    window.blit(text, text_rect)
+
+class SpriteAtlas:
+    """Cell-sized sprites rendered once, so every cell is drawn with a single blit.
+
+    Sprites are drawn at the base CELL_SIZE and scaled to `cell_size`.
+    """
+
+    def __init__(self, cell_size, player_colors=(RED, BLUE)):
+        self.cell_size = cell_size
+        self.dots = {}
+        self.hqs = {}
+        for color in player_colors:
+            for dots in DOT_PATTERNS:
+                self.dots[(color, dots)] = self.render_dots(color, dots)
+            for health in range(HQ_HEALTH + 1):
+                self.hqs[(color, health)] = self.render_hq(color, health)
+        self.stars = [self.render_powerup(POWERUP_STAR, frame * 72 / STAR_FRAMES) for frame in range(STAR_FRAMES)]
+        self.heart = self.render_powerup(POWERUP_HEART, 0)
+
+    def new_sprite(self):
+        sprite = pygame.Surface((CELL_SIZE, CELL_SIZE))
+        sprite.fill(TRANSPARENT_COLORKEY)
+        return sprite
+
+    def finish_sprite(self, sprite):
+        if self.cell_size != CELL_SIZE:
+            sprite = pygame.transform.scale(sprite, (self.cell_size, self.cell_size))
+        sprite.set_colorkey(TRANSPARENT_COLORKEY, pygame.RLEACCEL)
+        return sprite.convert()
+
+    def render_dots(self, color, dots):
+        sprite = self.new_sprite()
+        # Cells are views of a game's board, so a stand-in with the same two fields is drawn
+        draw_dot_pattern(sprite, SimpleNamespace(dots=dots, color=color), CELL_SIZE // 2, CELL_SIZE // 2)
+        return self.finish_sprite(sprite)
+
+    def render_hq(self, color, health):
+        sprite = self.new_sprite()
+        draw_hq_square(sprite, 0, 0, color, health)
+        return self.finish_sprite(sprite)
+
+    def render_powerup(self, powerup_type, angle):
+        sprite = self.new_sprite()
+        draw_powerup(sprite, powerup_type, CELL_SIZE // 2, CELL_SIZE // 2, angle)
+        return self.finish_sprite(sprite)
+
+    def get_dots(self, color, dots):
+        # Cells over critical mass (after a star) have no pattern, as before
+        if dots not in DOT_PATTERNS:
+            return None
+        sprite = self.dots.get((color, dots))
+        if sprite is None:
+            sprite = self.dots[(color, dots)] = self.render_dots(color, dots)
+        return sprite
+
+    def get_hq(self, color, health):
+        sprite = self.hqs.get((color, health))
+        if sprite is None:
+            sprite = self.hqs[(color, health)] = self.render_hq(color, health)
+        return sprite
+
+    def get_powerup(self, powerup_type, angle):
+        if powerup_type == POWERUP_STAR:
+            return self.stars[int((angle % 72) / 72 * STAR_FRAMES) % STAR_FRAMES]
+        return self.heart
+
+@lru_cache(maxsize=8)
+def get_sprite_atlas(cell_px: int) -> SpriteAtlas:
+    return SpriteAtlas(cell_px)
+
+class Viewport:
+    """The part of the board shown in the window and the zoom level.
+
+    Board (world) coordinates use CELL_SIZE pixels per cell, as the rules
+    code does. On screen a cell is `cell_px` pixels and the board is
+    shifted by the scroll offset.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cell_px = CELL_SIZE
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.fit_board()
+
+    @property
+    def scale(self) -> float:
+        return self.cell_px / CELL_SIZE
+
+    def get_state(self):
+        return (self.cell_px, self.scroll_x, self.scroll_y, self.width, self.height)
+
+    def fit_board(self):
+        fit = min(self.width // GRID_COLS, self.height // GRID_ROWS)
+        self.cell_px = min(max(fit, FIT_MIN_CELL_PX, MIN_CELL_PX), MAX_CELL_PX)
+        self.clamp()
+
+    def clamp(self):
+        self.scroll_x = min(max(self.scroll_x, 0), max(GRID_COLS * self.cell_px - self.width, 0))
+        self.scroll_y = min(max(self.scroll_y, 0), max(GRID_ROWS * self.cell_px - self.height, 0))
+
+    def scroll_by(self, dx, dy):
+        self.scroll_x += int(dx)
+        self.scroll_y += int(dy)
+        self.clamp()
+
+    def center_on_cell(self, row, col):
+        self.scroll_x = col * self.cell_px + self.cell_px // 2 - self.width // 2
+        self.scroll_y = row * self.cell_px + self.cell_px // 2 - self.height // 2
+        self.clamp()
+
+    def zoom_at(self, steps, anchor_x, anchor_y):
+        """Zoom in (steps > 0) or out, keeping the board point under the anchor in place."""
+        board_x = (anchor_x + self.scroll_x) / self.cell_px
+        board_y = (anchor_y + self.scroll_y) / self.cell_px
+        cell_px = int(round(self.cell_px * ZOOM_STEP ** steps))
+        if cell_px == self.cell_px:
+            cell_px += 1 if steps > 0 else -1
+        self.cell_px = min(max(cell_px, MIN_CELL_PX), MAX_CELL_PX)
+        self.scroll_x = int(board_x * self.cell_px - anchor_x)
+        self.scroll_y = int(board_y * self.cell_px - anchor_y)
+        self.clamp()
+
+    def get_board_rect(self) -> pygame.Rect:
+        return pygame.Rect(-self.scroll_x, -self.scroll_y, GRID_COLS * self.cell_px, GRID_ROWS * self.cell_px)
+
+    def get_cell_rect(self, row, col) -> pygame.Rect:
+        return pygame.Rect(col * self.cell_px - self.scroll_x, row * self.cell_px - self.scroll_y,
+                           self.cell_px, self.cell_px)
+
+    def world_to_screen(self, x, y):
+        scale = self.scale
+        return x * scale - self.scroll_x, y * scale - self.scroll_y
+
+    def world_rect_to_screen(self, rect) -> pygame.Rect:
+        scale = self.scale
+        return pygame.Rect(int(rect.left * scale) - self.scroll_x - 1, int(rect.top * scale) - self.scroll_y - 1,
+                           int(rect.width * scale) + 2, int(rect.height * scale) + 2)
+
+    def screen_to_cell(self, x, y):
+        return (y + self.scroll_y) // self.cell_px, (x + self.scroll_x) // self.cell_px
+
+    def get_visible_cells(self, rect=None):
+        """Inclusive (first_row, last_row, first_col, last_col) of the cells overlapping `rect`."""
+        if rect is None:
+            rect = pygame.Rect(0, 0, self.width, self.height)
+        first_col = max((rect.left + self.scroll_x) // self.cell_px, 0)
+        last_col = min((rect.right - 1 + self.scroll_x) // self.cell_px, GRID_COLS - 1)
+        first_row = max((rect.top + self.scroll_y) // self.cell_px, 0)
+        last_row = min((rect.bottom - 1 + self.scroll_y) // self.cell_px, GRID_ROWS - 1)
+        return first_row, last_row, first_col, last_col
+
+    def get_dot_radius(self) -> int:
+        return max(1, int(DOT_RADIUS * self.scale))
+
+def get_board_color(game: Game):
     if game.game_over:
-        pastel_color = PASTEL_RED if game.winner == RED else PASTEL_BLUE
-        winner_text_color = RED if game.winner == RED else BLUE
-    else:
-        pastel_color = PASTEL_RED if game.current_player == RED else PASTEL_BLUE
-    WINDOW.fill(pastel_color)
+        return PASTEL_RED if game.winner == RED else PASTEL_BLUE
+    return PASTEL_RED if game.current_player == RED else PASTEL_BLUE
+
+BOARD_BACKGROUNDS = {}  # (window size, cell size, color) -> pre-rendered surface
+
+def get_board_background(viewport, color) -> pygame.Surface:
+    """Pastel fill with grid outlines, rendered once per board color and zoom level.
+
+    The grid repeats every cell, so a surface one cell larger than the
+    window covers any scroll offset.
+    """
+    key = (viewport.width, viewport.height, viewport.cell_px, color)
+    background = BOARD_BACKGROUNDS.get(key)
+    if background is None:
+        # Layers of an old window size or zoom level are rarely used again
+        if len(BOARD_BACKGROUNDS) >= 4:
+            BOARD_BACKGROUNDS.clear()
+        cell_px = viewport.cell_px
+        cols = viewport.width // cell_px + 2
+        rows = viewport.height // cell_px + 2
+        background = pygame.Surface((cols * cell_px, rows * cell_px)).convert()
+        background.fill(color)
+        for row in range(rows):
+            for col in range(cols):
+                pygame.draw.rect(background, GRAY, (col * cell_px, row * cell_px, cell_px, cell_px), 1)
+        BOARD_BACKGROUNDS[key] = background
+    return background
+
+def draw_board_background(window, viewport, color, rect):
+    board_area = viewport.get_board_rect().clip(rect)
+    if board_area != rect:
+        window.fill(color, rect)
+    if board_area.width and board_area.height:
+        previous_clip = window.get_clip()
+        window.set_clip(board_area)
+        window.blit(get_board_background(viewport, color),
+                    (-(viewport.scroll_x % viewport.cell_px), -(viewport.scroll_y % viewport.cell_px)))
+        window.set_clip(previous_clip)
+
+def is_cell_animating(game, row, col) -> bool:
+    """Rotating stars and shaking cells move every frame until the game ends."""
+    if game.game_over:
+        return False
+    return game.grid[row][col].powerup == POWERUP_STAR or game.is_near_critical(row, col)
+
+def draw_cell(window, game, row, col, current_time, viewport, sprites):
+    cell = game.grid[row][col]
+    x = col * viewport.cell_px - viewport.scroll_x
+    y = row * viewport.cell_px - viewport.scroll_y
+    if not cell.is_empty():
+        shake_offset_x = shake_offset_y = 0
+        if game.is_near_critical(row, col) and not game.game_over:
+            shake_offset_x = int(math.sin(current_time * SHAKE_SPEED) * SHAKE_AMPLITUDE * viewport.scale)
+            shake_offset_y = int(math.cos(current_time * SHAKE_SPEED) * SHAKE_AMPLITUDE * viewport.scale)
+
+        sprite = sprites.get_dots(cell.color, cell.dots)
+        if sprite is not None:
+            window.blit(sprite, (x + shake_offset_x, y + shake_offset_y))
+    if cell.has_powerup():
+        angle = 0 if game.game_over else current_time * 50
+        window.blit(sprites.get_powerup(cell.powerup, angle), (x, y))
+
+def render_winner_text(game, viewport):
+    winner_color = "Punane" if game.winner == RED else "Sinine"
+    winner_text_color = RED if game.winner == RED else BLUE
+    text = render_text(74, f"{winner_color} võitis!", winner_text_color)
+    text_rect = text.get_rect(center=(viewport.width // 2, viewport.height // 2 - 50))
+    return text, text_rect
+
+def draw_hq(window, row, col, color, health, viewport):
+    sprite = get_sprite_atlas(viewport.cell_px).get_hq(color, health)
+    window.blit(sprite, viewport.get_cell_rect(row, col))
+
+def get_hqs(game):
+    return [(RED_HQ_POS, RED, game.red_hq_health), (BLUE_HQ_POS, BLUE, game.blue_hq_health)]
+
+def draw_explosion(window, explosion, viewport, current_time):
+    explosion.draw(window, -viewport.scroll_x, -viewport.scroll_y, current_time, viewport.scale)
 
-    current_time = time.time()
+def draw_game(game: Game, viewport: Viewport, window=None):
+    """Repaint the whole window, drawing only cells inside the viewport. Presenting is left to the caller.
 
-    # Draw grid lines
-    for row in range(GRID_ROWS):
-        for col in range(GRID_COLS):
-            x = col * CELL_SIZE
-            y = row * CELL_SIZE
-            pygame.draw.rect(WINDOW, GRAY, (x, y, CELL_SIZE, CELL_SIZE), 1)
+    `window` may be any surface of the viewport's size, e.g. an offscreen one.
+    """
+    if window is None:
+        window = WINDOW
+    window_rect = window.get_rect()
+
+    # Background and grid lines
+    draw_board_background(window, viewport, get_board_color(game), window_rect)
+    PROFILER.lap("cells")
+
+    current_time = CLOCK()
 
     # Draw explosions first (so they appear under dots)
+    bake_completed_explosions(game, current_time)
+    SCORCH_LAYER.draw(window, viewport, window_rect)
     for explosion in game.explosions:
-        explosion.draw(WINDOW)
+        if viewport.world_rect_to_screen(explosion.rect).colliderect(window_rect):
+            draw_explosion(window, explosion, viewport, current_time)
+    PROFILER.lap("explosions")
 
     # Then draw dots and powerups
-    for row in range(GRID_ROWS):
-        for col in range(GRID_COLS):
-            cell = game.grid[row][col]
-            if not cell.is_empty():
-                center_x = col * CELL_SIZE + CELL_SIZE // 2
-                center_y = row * CELL_SIZE + CELL_SIZE // 2
-
-                shake_offset_x = shake_offset_y = 0
-                if game.is_near_critical(row, col):
-                    shake_offset_x = math.sin(current_time * SHAKE_SPEED) * SHAKE_AMPLITUDE
-                    shake_offset_y = math.cos(current_time * SHAKE_SPEED) * SHAKE_AMPLITUDE
-
-                draw_dot_pattern(WINDOW, cell, center_x, center_y, shake_offset_x, shake_offset_y)
-            if cell.has_powerup():
-                center_x = col * CELL_SIZE + CELL_SIZE // 2
-                center_y = row * CELL_SIZE + CELL_SIZE // 2
-                angle = current_time * 50
-                draw_powerup(WINDOW, cell.powerup, center_x, center_y, angle)
+    first_row, last_row, first_col, last_col = viewport.get_visible_cells()
+    sprites = get_sprite_atlas(viewport.cell_px)
+    for row in range(first_row, last_row + 1):
+        for col in range(first_col, last_col + 1):
+            draw_cell(window, game, row, col, current_time, viewport, sprites)
 
     # Draw HQ squares and game over text
     if game.game_over:
-        font = pygame.font.Font(None, 74)
-        winner_color = "Punane" if game.winner == RED else "Sinine"
-        text = font.render(f"{winner_color} võitis!", True, winner_text_color)
-        text_rect = text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 50))
-        WINDOW.blit(text, text_rect)
-
-    for (row, col), color, health in [(RED_HQ_POS, RED, game.red_hq_health), (BLUE_HQ_POS, BLUE, game.blue_hq_health)]:
-        x = col * CELL_SIZE
-        y = row * CELL_SIZE
-        
-        # Calculate size reduction based on health
-        health_ratio = health / HQ_HEALTH
-        size_reduction = (1 - health_ratio) * (CELL_SIZE * 0.4)  # 0.4 controls max shrink
-        
-        # Center the smaller square
-        adjusted_x = x + (size_reduction / 2)
-        adjusted_y = y + (size_reduction / 2)
-        adjusted_size = CELL_SIZE - size_reduction
-        
-        pygame.draw.rect(WINDOW, color, (adjusted_x, adjusted_y, adjusted_size, adjusted_size))
-
-        # Adjust text position to center of new square
-        font = pygame.font.Font(None, 36)
-        text = font.render(str(health), True, BLACK)
-        text_rect = text.get_rect(center=(adjusted_x + adjusted_size // 2, adjusted_y + adjusted_size // 2))
-        WINDOW.blit(text, text_rect)
+        text, text_rect = render_winner_text(game, viewport)
+        window.blit(text, text_rect)
 
-    pygame.display.flip()
+    for (row, col), color, health in get_hqs(game):
+        if viewport.get_cell_rect(row, col).colliderect(window_rect):
+            draw_hq(window, row, col, color, health, viewport)
+    PROFILER.lap("cells")
 
 class MovingBlob:
     def __init__(self, start_pos, end_pos, color, start_time, duration=0.3):
@@ -408,6 +800,15 @@ class MovingBlob:
         self.duration = duration
         self.current_pos = start_pos
 
+        # Board area the blob passes through, used to skip blobs outside the viewport
+        left, right = sorted((start_pos[0], end_pos[0]))
+        top, bottom = sorted((start_pos[1], end_pos[1]))
+        self.path_rect = pygame.Rect(int(left) - DOT_RADIUS - 1, int(top) - DOT_RADIUS - 1,
+                                     int(right - left) + DOT_RADIUS * 2 + 3, int(bottom - top) + DOT_RADIUS * 2 + 3)
+
+    def is_finished(self, current_time) -> bool:
+        return current_time - self.start_time >= self.duration
+
     def update_position(self, current_time):
         elapsed_time = current_time - self.start_time
         if elapsed_time >= self.duration:
@@ -420,173 +821,812 @@ class MovingBlob:
         )
         return False
 
-def draw_moving_blobs(window, moving_blobs):
+    def get_rect(self, viewport) -> pygame.Rect:
+        radius = viewport.get_dot_radius()
+        x, y = viewport.world_to_screen(*self.current_pos)
+        rect = pygame.Rect(0, 0, radius * 2 + 2, radius * 2 + 2)
+        rect.center = (int(x), int(y))
+        return rect
+
+    def draw(self, window, viewport):
+        x, y = viewport.world_to_screen(*self.current_pos)
+        pygame.draw.circle(window, self.color, (int(x), int(y)), viewport.get_dot_radius())
+
+def update_visible_blobs(moving_blobs, viewport, current_time):
+    """Move the blobs whose path crosses the viewport and return them. The others are not animated."""
+    window_rect = pygame.Rect(0, 0, viewport.width, viewport.height)
+    visible = []
     for blob in moving_blobs:
-        pygame.draw.circle(window, blob.color, (int(blob.current_pos[0]), int(blob.current_pos[1])), DOT_RADIUS)
-
-def chain_reaction(game, row, col, moving_blobs):
-    if game.grid[row][col].dots >= game.get_critical_mass(row, col):
-        dots, color = game.remove_dots_from_cell(row, col)
+        if viewport.world_rect_to_screen(blob.path_rect).colliderect(window_rect):
+            blob.update_position(current_time)
+            visible.append(blob)
+    return visible
 
-        for neighbor_row, neighbor_col in game.get_neighbors(row, col):
-            start_pos = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
+def draw_moving_blobs(window, moving_blobs, viewport):
+    for blob in moving_blobs:
+        blob.draw(window, viewport)
+
+def merge_rects(rects):
+    """Union overlapping rectangles so every pixel is repainted only once."""
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        hits = rect.collidelistall(merged)
+        while hits:
+            for index in reversed(hits):
+                rect.union_ip(merged.pop(index))
+            hits = rect.collidelistall(merged)
+        merged.append(rect)
+    return merged
+
+class FrameProfiler:
+    """Frame-time percentiles and a per-stage breakdown, shown as an overlay (F3).
+
+    Stages are timed with lap(), which attributes the time since the previous
+    lap to a stage. While disabled every call returns right away.
+    """
+
+    STAGES = ("events", "update", "explosions", "cells", "blobs", "present")
+
+    def __init__(self, history=PROFILER_HISTORY):
+        self.enabled = False
+        self.frame_times = deque(maxlen=history)
+        self.stage_times = {stage: deque(maxlen=history) for stage in self.STAGES}
+        self.current = dict.fromkeys(self.STAGES, 0.0)
+        self.frame_start = 0.0
+        self.mark = 0.0
+        self.rect = pygame.Rect(8, 8, 330, (len(self.STAGES) + 3) * PROFILER_FONT_SIZE + 12)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        for times in self.stage_times.values():
+            times.clear()
+
+    def start_frame(self):
+        if self.enabled:
+            self.frame_start = self.mark = time.perf_counter()
+            for stage in self.STAGES:
+                self.current[stage] = 0.0
+
+    def lap(self, stage):
+        if self.enabled:
+            now = time.perf_counter()
+            self.current[stage] += now - self.mark
+            self.mark = now
+
+    def end_frame(self):
+        if self.enabled:
+            self.frame_times.append(time.perf_counter() - self.frame_start)
+            for stage in self.STAGES:
+                self.stage_times[stage].append(self.current[stage])
+
+    def get_percentile(self, percent):
+        if not self.frame_times:
+            return 0.0
+        ordered = sorted(self.frame_times)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def get_lines(self, game, moving_blobs):
+        lines = ["frame ms  p50 {:.2f}  p95 {:.2f}  p99 {:.2f}".format(
+            *(self.get_percentile(percent) * 1000 for percent in (50, 95, 99)))]
+        for stage in self.STAGES:
+            times = self.stage_times[stage]
+            mean = sum(times) / len(times) * 1000 if times else 0.0
+            lines.append(f"{stage:<11}{mean:7.3f} ms")
+        particles = sum(len(explosion.particles) for explosion in game.explosions)
+        lines.append(f"blobs in flight {len(moving_blobs)}")
+        lines.append(f"explosion particles {particles}")
+        return lines
+
+    def draw(self, window, game, moving_blobs):
+        panel = pygame.Surface(self.rect.size)
+        panel.set_alpha(200)
+        panel.fill(BLACK)
+        window.blit(panel, self.rect)
+        for index, line in enumerate(self.get_lines(game, moving_blobs)):
+            text = render_text(PROFILER_FONT_SIZE, line, GRAY)
+            window.blit(text, (self.rect.x + 8, self.rect.y + 6 + index * PROFILER_FONT_SIZE))
+
+PROFILER = FrameProfiler()
+
+class Timeline:
+    """The scrub bar of replays (--replay): click or drag it to jump to a turn."""
+
+    def __init__(self, width, height, turns):
+        self.rect = pygame.Rect(0, height - TIMELINE_HEIGHT, width, TIMELINE_HEIGHT)
+        self.track = self.rect.inflate(-140, -TIMELINE_HEIGHT // 2)
+        self.track.right = self.rect.right - 12
+        self.turns = turns
+        self.turn = 0
+        self.dragging = False
+        self.changed = True
+
+    def set_turn(self, turn):
+        self.turn = min(max(turn, 0), self.turns)
+        self.changed = True
+
+    def turn_at(self, x):
+        fraction = (x - self.track.left) / max(self.track.width, 1)
+        return min(max(round(fraction * self.turns), 0), self.turns)
+
+    def draw(self, window):
+        pygame.draw.rect(window, BLACK, self.rect)
+        text = render_text(TIMELINE_FONT_SIZE, f"{self.turn}/{self.turns}", GRAY)
+        window.blit(text, text.get_rect(midleft=(self.rect.x + 10, self.rect.centery)))
+        pygame.draw.rect(window, GRAY, self.track, 1)
+        filled = self.track.copy()
+        filled.width = self.track.width * self.turn // max(self.turns, 1)
+        pygame.draw.rect(window, GRAY, filled)
+        handle_x = self.track.left + filled.width
+        pygame.draw.line(window, PASTEL_RED, (handle_x, self.rect.top + 4), (handle_x, self.rect.bottom - 4), 3)
+
+class DirtyRenderer:
+    """Repaints only the changed parts of the window and presents them once per frame.
+
+    Dirty regions are cells whose contents changed, shaking cells, rotating
+    stars, HQ squares whose health changed, the old and new positions of
+    moving blobs and the area of running explosions. `animating` tells the
+    main loop whether anything will change without new input.
+    """
+
+    def __init__(self, window, viewport):
+        self.window = window
+        self.viewport = viewport
+        self.window_rect = window.get_rect()
+        self.full_redraw = True
+        self.last_board_color = None
+        self.last_game_over = None
+        self.last_viewport = None
+        self.last_cells = {}
+        self.last_hq_health = None
+        self.last_blob_rects = []
+        self.visible_blobs = []
+        self.animating = True
+        self.timeline = None
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def collect_dirty_rects(self, game, moving_blobs, current_time):
+        viewport = self.viewport
+        dirty = []
+        self.animating = bool(moving_blobs or game.explosions)
+
+        # Only cells inside the viewport are compared with the last frame
+        first_row, last_row, first_col, last_col = viewport.get_visible_cells()
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                cell = game.grid[row][col]
+                state = (cell.dots, cell.color, cell.powerup)
+                cell_animating = is_cell_animating(game, row, col)
+                if self.last_cells.get((row, col)) != state:
+                    self.last_cells[(row, col)] = state
+                    dirty.append(viewport.get_cell_rect(row, col))
+                elif cell_animating:
+                    dirty.append(viewport.get_cell_rect(row, col))
+                self.animating = self.animating or cell_animating
+
+        hq_health = (game.red_hq_health, game.blue_hq_health)
+        if hq_health != self.last_hq_health:
+            self.last_hq_health = hq_health
+            dirty.append(viewport.get_cell_rect(*RED_HQ_POS))
+            dirty.append(viewport.get_cell_rect(*BLUE_HQ_POS))
+        PROFILER.lap("cells")
+
+        self.visible_blobs = update_visible_blobs(moving_blobs, viewport, current_time)
+        blob_rects = [blob.get_rect(viewport) for blob in self.visible_blobs]
+        dirty.extend(self.last_blob_rects)
+        dirty.extend(blob_rects)
+        self.last_blob_rects = blob_rects
+        PROFILER.lap("blobs")
+
+        for explosion in game.explosions:
+            dirty.append(viewport.world_rect_to_screen(explosion.rect))
+        PROFILER.lap("explosions")
+
+        if self.timeline is not None and self.timeline.changed:
+            self.timeline.changed = False
+            dirty.append(self.timeline.rect)
+
+        # The overlay changes every frame and keeps the loop out of idle mode
+        if PROFILER.enabled:
+            dirty.append(PROFILER.rect)
+            self.animating = True
+
+        board_color = get_board_color(game)
+        if board_color != self.last_board_color or game.game_over != self.last_game_over:
+            self.last_board_color = board_color
+            self.last_game_over = game.game_over
+            self.full_redraw = True
+        if viewport.get_state() != self.last_viewport:
+            self.last_viewport = viewport.get_state()
+            self.full_redraw = True
+
+        clipped = [rect.clip(self.window_rect) for rect in dirty]
+        return merge_rects([rect for rect in clipped if rect.width and rect.height])
+
+    def repaint(self, game, rect, current_time):
+        window = self.window
+        viewport = self.viewport
+        window.set_clip(rect)
+        draw_board_background(window, viewport, self.last_board_color, rect)
+        PROFILER.lap("cells")
+        SCORCH_LAYER.draw(window, viewport, rect)
+
+        for explosion in game.explosions:
+            if viewport.world_rect_to_screen(explosion.rect).colliderect(rect):
+                draw_explosion(window, explosion, viewport, current_time)
+        PROFILER.lap("explosions")
+
+        first_row, last_row, first_col, last_col = viewport.get_visible_cells(rect)
+        sprites = get_sprite_atlas(viewport.cell_px)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                draw_cell(window, game, row, col, current_time, viewport, sprites)
+
+        if game.game_over:
+            text, text_rect = render_winner_text(game, viewport)
+            if text_rect.colliderect(rect):
+                window.blit(text, text_rect)
+
+        for (row, col), color, health in get_hqs(game):
+            if viewport.get_cell_rect(row, col).colliderect(rect):
+                draw_hq(window, row, col, color, health, viewport)
+        PROFILER.lap("cells")
+
+        for blob in self.visible_blobs:
+            if blob.get_rect(viewport).colliderect(rect):
+                blob.draw(window, viewport)
+        PROFILER.lap("blobs")
+
+        window.set_clip(None)
+
+    def draw(self, game, moving_blobs):
+        current_time = CLOCK()
+        dirty = self.collect_dirty_rects(game, moving_blobs, current_time)
+
+        if self.full_redraw:
+            self.full_redraw = False
+            draw_game(game, self.viewport, self.window)
+            draw_moving_blobs(self.window, self.visible_blobs, self.viewport)
+            PROFILER.lap("blobs")
+            if self.timeline is not None:
+                self.timeline.draw(self.window)
+            if PROFILER.enabled:
+                PROFILER.draw(self.window, game, moving_blobs)
+            pygame.display.update([self.window_rect])
+            PROFILER.lap("present")
+            return
+
+        # Explosions finishing this frame are still in `dirty` and now come from the scorch layer
+        bake_completed_explosions(game, current_time)
+        PROFILER.lap("explosions")
+        for rect in dirty:
+            self.repaint(game, rect, current_time)
+        if self.timeline is not None and self.timeline.rect.collidelist(dirty) != -1:
+            self.timeline.draw(self.window)
+        if PROFILER.enabled:
+            PROFILER.draw(self.window, game, moving_blobs)
+        if dirty:
+            pygame.display.update(dirty)
+        PROFILER.lap("present")
+
+def wave_blobs(game, wave, start_time):
+    """Blobs from every cell of an explosion wave ([cell, color, ...] as engine.py logs it) to its neighbors."""
+    blobs = []
+    neighbors = game.rules.board.neighbors
+    for position in range(0, len(wave), 2):
+        index = wave[position]
+        color = PLAYER_COLORS[wave[position + 1]]
+        row, col = divmod(index, GRID_COLS)
+        start_pos = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
+        for neighbor in neighbors[index]:
+            neighbor_row, neighbor_col = divmod(neighbor, GRID_COLS)
             end_pos = (neighbor_col * CELL_SIZE + CELL_SIZE // 2, neighbor_row * CELL_SIZE + CELL_SIZE // 2)
-            moving_blobs.append(MovingBlob(start_pos, end_pos, color, time.time()))
+            blobs.append(MovingBlob(start_pos, end_pos, color, start_time))
+    return blobs
 
 def update_game(game, moving_blobs):
-    if game.turns_played == 0:
+    if not game.turn_pending:
+        return
+    current_time = CLOCK()
+    # Positions are interpolated by the renderer, only for blobs it can see
+    if any(not blob.is_finished(current_time) for blob in moving_blobs):
         return
-    current_time = time.time()
-    completed_blobs = []
-    cells_to_check = set()
+    # A wave's blobs all leave together, so they have all landed
+    moving_blobs.clear()
+    game.land_wave(moving_blobs)
 
-    for blob in moving_blobs:
-        if blob.update_position(current_time):
-            completed_blobs.append(blob)
-            col = int(blob.end_pos[0] // CELL_SIZE)
-            row = int(blob.end_pos[1] // CELL_SIZE)
-            if game.add_dot_to_cell(row, col, blob.color):
-                cells_to_check.add((row, col))
-
-    for blob in completed_blobs:
-        moving_blobs.remove(blob)
-
-    for row, col in cells_to_check:
-        chain_reaction(game, row, col, moving_blobs)
-
-    # Check for winner before switching turns
-    if not game.game_over and (game.red_hq_health <= 0 or game.blue_hq_health <= 0):
-        game.game_over = True
-        print(game.current_player, "lol")
-        game.winner = game.current_player  # Winner is the current player who made the winning move
-
-    # Only switch turns when animations complete and turn is pending
-    if not moving_blobs and hasattr(game, 'turn_pending') and game.turn_pending:
-        game.current_player = BLUE if game.current_player == RED else RED
-        game.turn_pending = False
-
-def handle_powerup(game, row, col, moving_blobs):
-    color = game.current_player
-    powerup_type = game.grid[row][col].powerup
+def make_move(game, row, col, moving_blobs):
+    if game.game_over or not game.is_valid_move(row, col) or moving_blobs or game.turn_pending:
+        return False
+    return game.start_move(row, col, moving_blobs)
+
+# Build the sprites for the default zoom level at startup
+SPRITES = get_sprite_atlas(CELL_SIZE)
+
+def set_board_size(rows, cols):
+    global GRID_ROWS, GRID_COLS, RED_HQ_POS, BLUE_HQ_POS
+    GRID_ROWS = rows
+    GRID_COLS = cols
+    RED_HQ_POS = (0, GRID_COLS // 2)
+    BLUE_HQ_POS = (GRID_ROWS - 1, GRID_COLS // 2)
+
+def board_size(text):
+    try:
+        rows, cols = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected ROWSxCOLS, for example 100x100")
+    if rows < 4 or cols < 3:
+        raise argparse.ArgumentTypeError("the board must be at least 4x3")
+    return rows, cols
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chain Base")
+    parser.add_argument("--board", type=board_size, default=(GRID_ROWS, GRID_COLS),
+                        help="board size as ROWSxCOLS (default 9x9)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="save the moves of the current game as JSON, or as a binary log if FILE ends in "
+                             ".crlog (restarting begins a new recording)")
+    parser.add_argument("--seed", type=int, help="random seed of the first game")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="append rules metrics of every game to FILE (.csv, anything else is JSON)")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="play a match on server.py instead of on this computer")
+    parser.add_argument("--host-peer", metavar="PORT", type=int,
+                        help="wait for a --peer player on PORT and play a lockstep game with no server")
+    parser.add_argument("--peer", metavar="HOST:PORT", help="play the lockstep game of a --host-peer player")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="step through a recording (JSON, .crlog or .crkf from keyframes.py) instead of playing")
+    return parser.parse_args(argv)
+
+def start_recorded_game(seed=None, spawn_interval=None):
+    """A new game that can be replayed from its seed and moves.
+
+    The powerup spawn interval is drawn from the seed too (as engine.py draws
+    it) unless it is given, so the seed and the moves are the whole game.
+    """
+    return Game(seed, spawn_interval)
+
+def load_position(game, position):
+    """Show an engine.py position (from a keyframed replay or a server) on a Game's board."""
+    rules = game.rules
+    rules.dots[:] = position.dots
+    rules.owner[:] = position.owner
+    rules.powerup[:] = position.powerup
+    for name in ("red_hq_health", "blue_hq_health", "current_player", "game_over", "winner",
+                 "turns_played", "powerup_spawns"):
+        setattr(rules, name, getattr(position, name))
+    rules.in_flight = None
+    game.explosions.clear()
+
+def show_turn(game, replay, turn, renderer):
+    """Jump a replay to the board after `turn` moves."""
+    renderer.timeline.set_turn(turn)
+    load_position(game, replay.position(renderer.timeline.turn))
+    game.moves = [divmod(index, GRID_COLS) for index in replay.record.moves[:renderer.timeline.turn]]
+    reset_scorch_layer()
+
+NETWORK_EVENT = pygame.event.custom_type()
+
+class NetworkClient:
+    """A seat in a match of server.py (--connect). The server plays the moves; this client draws them.
+
+    Messages from the server arrive in the event queue as NETWORK_EVENT events,
+    so an idle main loop wakes up for them.
+    """
+
+    def __init__(self, address):
+        import socket
+        host, port = address.rsplit(":", 1)
+        self.socket = socket.create_connection((host, int(port)))
+        self.file = self.socket.makefile("rb")
+        self.thread = threading.Thread(target=self.receive, daemon=True)
+        self.codec = None
+        self.synced = False  # A snapshot is on the board, so the server's deltas apply to it
+
+    def send(self, message):
+        self.socket.sendall(json.dumps(message).encode() + b"\n")
+
+    def read(self):
+        line = self.file.readline()
+        return json.loads(line) if line else {"type": "closed"}
+
+    def join(self, board):
+        """Wait for a seat; returns the server's "joined" message."""
+        self.send({"type": "join", "variant": "hq_powerups", "board": list(board)})
+        message = self.read()
+        if message["type"] != "joined":
+            sys.exit(f"the server did not seat us: {message.get('message', message['type'])}")
+        import positions
+        self.codec = positions.PositionCodec(message["variant"], *message["board"])
+        self.thread.start()
+        return message
+
+    def receive(self):
+        while True:
+            message = self.read()
+            pygame.event.post(pygame.event.Event(NETWORK_EVENT, message=message))
+            if message["type"] == "closed":
+                return
+
+class PeerLink:
+    """The other player of a lockstep game (--host-peer, --peer), with no server in between.
+
+    Both computers play every move on their own board; only the moves and a
+    hash of the position after each cross the network (lockstep.py). The hash
+    is of the board on screen, so it is taken once a move has finished
+    resolving: our frame goes out then, and the peer's move is checked then.
+    The peer's frames arrive in the event queue as NETWORK_EVENT events and
+    wait in `frames` until the board has finished animating the last move.
+    """
+
+    def __init__(self, connection, file, hello, color):
+        self.socket = connection
+        self.file = file
+        self.hello = hello
+        self.lockstep = None  # Set up by new_game()
+        self.engine_color = color
+        self.color = RED if color == engine.RED else BLUE
+        self.frames = deque()  # Peer moves not yet on the board
+        self.expected = None  # (turn, checksum) of the peer move on the board, checked once it has resolved
+        self.unsent = False  # Our last move, sent once it has resolved
+        self.left = False
+        self.thread = threading.Thread(target=self.receive, daemon=True)
+
+    @classmethod
+    def host(cls, port, board, seed=None):
+        import socket
+        import lockstep
+        listener = socket.create_server(("", port))
+        print(f"Ootan vastast pordil {port}")
+        connection, _ = listener.accept()
+        listener.close()
+        hello = lockstep.hello_message(engine.Engine("hq_powerups", seed=seed, rows=board[0], cols=board[1]),
+                                       engine.BLUE)
+        connection.sendall(json.dumps(hello).encode() + b"\n")
+        return cls(connection, connection.makefile("rb"), hello, engine.RED)
+
+    @classmethod
+    def join(cls, address):
+        import socket
+        import sync
+        host, port = address.rsplit(":", 1)
+        connection = socket.create_connection((host, int(port)))
+        file = connection.makefile("rb")
+        line = file.readline()
+        if not line:
+            sys.exit("the host closed the connection")
+        hello = json.loads(line)
+        return cls(connection, file, hello, sync.COLORS[hello["color"]])
+
+    def new_game(self):
+        """Our board for the game in the host's hello, with the lockstep checks kept on it."""
+        import lockstep
+        shared = lockstep.game_from_hello(self.hello)
+        if shared.variant.name != VARIANT or shared.max_hq_health != HQ_HEALTH:
+            raise ValueError(f"this game plays {VARIANT} with HQ health {HQ_HEALTH}, not {shared.variant.name} "
+                             f"with {shared.max_hq_health}")
+        set_board_size(shared.rows, shared.cols)
+        game = start_recorded_game(shared.seed, shared.spawn_interval)
+        self.lockstep = lockstep.Lockstep(game.rules, self.engine_color)
+        return game
+
+    @property
+    def our_turn(self):
+        """We may move: it is our color's turn and the peer's last move has been checked."""
+        return self.expected is None and self.lockstep.our_turn
+
+    def update(self, game, moving_blobs):
+        """Between moves: check the peer's last move, send ours and start the peer's next.
+
+        Returns True when a peer move was started. Raises lockstep.Desync once the games differ.
+        """
+        if moving_blobs or game.turn_pending:
+            return False
+        if self.expected:
+            self.lockstep.verify(*self.expected)
+            self.expected = None
+        if self.unsent:
+            self.socket.sendall(self.lockstep.frame())
+            self.unsent = False
+        if not self.frames:
+            return False
+        turn, index, checksum = self.lockstep.read(self.frames.popleft())
+        make_move(game, *divmod(index, GRID_COLS), moving_blobs)
+        self.expected = (turn, checksum)
+        return True
+
+    def receive(self):
+        import lockstep
+        while True:
+            frame = self.file.read(lockstep.MOVE.size)
+            if len(frame) < lockstep.MOVE.size:
+                pygame.event.post(pygame.event.Event(NETWORK_EVENT, message={"type": "closed"}))
+                return
+            pygame.event.post(pygame.event.Event(NETWORK_EVENT, message={"type": "move", "frame": frame}))
+
+def handle_peer_message(peer, message):
+    """Queue a move of the lockstep peer for the board; PeerLink.update plays and checks it."""
+    if message["type"] == "closed":
+        # The moves it sent before leaving are still played
+        print("Vastane lahkus")
+        peer.left = True
+    else:
+        peer.frames.append(message["frame"])
 
-    if powerup_type == POWERUP_STAR:
-        # Store cells with powerups to process after the star effect
-        powerup_cells = []
-        # Process the column first
-        for r in range(GRID_ROWS):
-            if not isinstance(game.grid[r][col], HQCell):
-                # Store cells with powerups for later processing
-                if game.grid[r][col].has_powerup():
-                    powerup_cells.append((r, col))
-
-                # Only add dot if cell is empty, same color, or not near critical
-                if (game.grid[r][col].is_empty() or 
-                    game.grid[r][col].color == color or 
-                    not game.is_near_critical(r, col)):
-                    # Don't add dot if enemy color
-                    if game.grid[r][col].color is None or game.grid[r][col].color == color:
-                        game.grid[r][col].color = color
-                        game.grid[r][col].dots += 1
-
-        # Now process all found powerups
-        for r, c in powerup_cells:
-            if game.grid[r][c].has_powerup():  # Check again in case it was already processed
-                temp_powerup = game.grid[r][c].powerup
-                game.grid[r][c].powerup = None
-                if temp_powerup == POWERUP_STAR:
-                    # Recursively handle additional stars
-                    handle_powerup(game, r, c, moving_blobs)
-                elif temp_powerup == POWERUP_HEART:  # Handle heart powerup
-                    if color == RED:
-                        if game.red_hq_health < HQ_HEALTH:
-                            game.red_hq_health += 1
-                        else:
-                            game.blue_hq_health -= 1
-                            game.add_explosion(BLUE_HQ_POS[0], BLUE_HQ_POS[1], BLUE)
-                            if game.blue_hq_health <= 0:
-                                game.game_over = True
-                                print('punane on game_winner')
-                                game.winner = RED
-                    else:  # BLUE
-                        if game.blue_hq_health < HQ_HEALTH:
-                            game.blue_hq_health += 1
-                        else:
-                            game.red_hq_health -= 1
-                            game.add_explosion(RED_HQ_POS[0], RED_HQ_POS[1], RED)
-                            if game.red_hq_health <= 0:
-                                game.game_over = True
-                                print('sinine on game_winner')
-                                game.winner = BLUE
+class WaveAnimation:
+    """Blobs flying out of the cells that exploded, one wave after another, from a server's wave summary.
 
-    elif powerup_type == POWERUP_HEART:
-        if color == RED:
-            if game.red_hq_health < HQ_HEALTH:
-                game.red_hq_health += 1
-            else:
-                game.blue_hq_health -= 1
-                game.add_explosion(BLUE_HQ_POS[0], BLUE_HQ_POS[1], BLUE)
-                if game.blue_hq_health <= 0:
-                    game.game_over = True
-                    game.winner = RED
-        else:  # BLUE
-            if game.blue_hq_health < HQ_HEALTH:
-                game.blue_hq_health += 1
-            else:
-                game.red_hq_health -= 1
-                game.add_explosion(RED_HQ_POS[0], RED_HQ_POS[1], RED)
-                if game.red_hq_health <= 0:
-                    game.game_over = True
-                    game.winner = BLUE
+    Only for show: the board already holds the result, and the blobs are
+    never handed to update_game.
+    """
 
-def make_move(game, row, col, moving_blobs):
-    if game.game_over or not game.is_valid_move(row, col) or moving_blobs:
+    def __init__(self):
+        self.pending = deque()  # (start time, blobs) of the waves still to come
+        self.blobs = []
+
+    def add(self, game, waves, current_time):
+        start = max([current_time] + [blob.start_time + blob.duration for blob in self.blobs])
+        for number, wave in enumerate(waves):
+            self.pending.append((start + number * 0.3, wave_blobs(game, wave, start + number * 0.3)))
+
+    def update(self, current_time):
+        while self.pending and self.pending[0][0] <= current_time:
+            self.blobs.extend(self.pending.popleft()[1])
+        self.blobs = [blob for blob in self.blobs if not blob.is_finished(current_time)]
+
+def handle_network_message(game, message, network, animation):
+    """Show what the server sent. Returns False once the connection is gone."""
+    import sync
+    if message["type"] == "snapshot":
+        load_position(game, sync.read_snapshot(network.codec, message))
+        network.synced = True
+    elif message["type"] == "state" and network.synced:
+        sync.apply_delta(game.rules, message)
+        if not sync.check(network.codec, game.rules, message):
+            network.send({"type": "resync"})
+        game.moves.append(tuple(message["move"]))
+        animation.add(game, message.get("waves", ()), CLOCK())
+    elif message["type"] == "start":
+        print("Vastane liitus, mäng algab")
+    elif message["type"] == "opponent_left":
+        print("Vastane lahkus")
+    elif message["type"] == "error":
+        print("Server:", message["message"])
+    elif message["type"] == "closed":
+        print("Ühendus serveriga katkes")
         return False
+    return True
 
-    cell = game.grid[row][col]
-    if cell.has_powerup():
-        handle_powerup(game, row, col, moving_blobs)
-        cell.powerup = None
-    else:
-        if game.add_dot_to_cell(row, col, game.current_player):
-            chain_reaction(game, row, col, moving_blobs)
-    game.turns_played += 1
+def restart_game(moving_blobs, renderer, seed=None):
+    """What the R key does: a new recorded game on a clean board and a full redraw."""
+    game = start_recorded_game(seed)
+    moving_blobs.clear()
+    reset_scorch_layer()
+    renderer.invalidate()
+    return game
+
+def save_recording(game, path):
+    """JSON, or the compact binary log of movelog.py when the file name ends in .crlog."""
+    if path.endswith(".crlog"):
+        import movelog
+        rules = game.rules
+        record = movelog.GameRecord(rules.variant.name, GRID_ROWS, GRID_COLS, rules.max_hq_health,
+                                    rules.spawn_interval, game.seed,
+                                    [row * GRID_COLS + col for row, col in game.moves])
+        movelog.write_log(path, [record])
+        return
 
-    if game.turns_played % int(1/POWERUP_SPAWN_CHANCE) == 0:
-        game.spawn_powerup()
+    recording = {
+        "version": engine.REPLAY_VERSION,
+        "board": [GRID_ROWS, GRID_COLS],
+        "seed": game.seed,
+        "spawn_interval": game.rules.spawn_interval,
+        "moves": [list(move) for move in game.moves],
+    }
+    with open(path, "w") as file:
+        json.dump(recording, file)
+
+def save_metrics(game, path):
+    """Append the metrics of a game: a JSON list of games, or CSV rows of seed, metric, key, value."""
+    metrics = game.metrics.to_dict()
+    if path.lower().endswith(".csv"):
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(["seed", "metric", "key", "value"])
+            writer.writerow([game.seed, "turns", "", game.turns_played])
+            for name, value in metrics["counters"].items():
+                writer.writerow([game.seed, name, "", value])
+            for name, histogram in metrics["histograms"].items():
+                for key, count in histogram.items():
+                    writer.writerow([game.seed, name, key, count])
+            for name, timer in metrics["timers"].items():
+                for key, value in timer.items():
+                    writer.writerow([game.seed, name, key, value])
+        return
 
-    # If there are no animations, switch turns immediately
-    if not moving_blobs:
-        game.current_player = BLUE if game.current_player == RED else RED
-    else:
-        # Set a flag to switch turns after animations complete
-        game.turn_pending = True
-    return True
+    games = []
+    if os.path.exists(path):
+        with open(path) as file:
+            games = json.load(file)
+    winner = {RED: "red", BLUE: "blue"}.get(game.winner)
+    games.append(dict(seed=game.seed, board=[GRID_ROWS, GRID_COLS], turns=game.turns_played,
+                      winner=winner, **metrics))
+    with open(path, "w") as file:
+        json.dump(games, file, indent=1)
 
 def main():
-    game = Game()
+    args = parse_args()
+    set_board_size(*args.board)
+    GameMetrics.timing = bool(args.metrics)
+
+    replay = None
+    if args.replay:
+        import keyframes
+        replay = keyframes.open_replay(args.replay)
+        if replay.record.variant == "classic":
+            sys.exit(f"{args.replay} is a classic game; CR_0.8.py plays those")
+        set_board_size(replay.record.rows, replay.record.cols)
+
+    network = None
+    if args.connect:
+        network = NetworkClient(args.connect)
+        joined = network.join(args.board)
+        set_board_size(*joined["board"])
+        animation = WaveAnimation()
+        my_color = RED if joined["color"] == "red" else BLUE
+        pygame.display.set_caption(f"Chain Base: {'Punane' if my_color == RED else 'Sinine'}, mäng {joined['match']}")
+
+    peer = None
+    if args.host_peer or args.peer:
+        peer = PeerLink.host(args.host_peer, args.board, args.seed) if args.host_peer else PeerLink.join(args.peer)
+        try:
+            game = peer.new_game()
+        except ValueError as error:
+            sys.exit(f"Vastase mängu ei saa mängida: {error}")
+        my_color = peer.color
+        pygame.display.set_caption(f"Chain Base: {'Punane' if my_color == RED else 'Sinine'}, seeme {game.seed}")
+        peer.thread.start()
+    else:
+        game = start_recorded_game(args.seed)
+    online = args.connect or peer
     clock = pygame.time.Clock()
     moving_blobs = []
+    viewport = Viewport(WINDOW_WIDTH, WINDOW_HEIGHT - (TIMELINE_HEIGHT if replay else 0))
+    viewport.center_on_cell(*BLUE_HQ_POS)
+    renderer = DirtyRenderer(WINDOW, viewport)
+    if replay:
+        renderer.timeline = Timeline(WINDOW_WIDTH, WINDOW_HEIGHT, replay.turns)
+        show_turn(game, replay, 0, renderer)
+    dragging = False
+    metrics_saved = False
+
+    def finish_metrics():
+        # Once per game: when it is won, or when it is abandoned after at least one move
+        nonlocal metrics_saved
+        if args.metrics and not metrics_saved and game.moves and replay is None and not args.connect:
+            save_metrics(game, args.metrics)
+            metrics_saved = True
 
     while True:
-        for event in pygame.event.get():
+        if renderer.animating:
+            events = pygame.event.get()
+        else:
+            # Nothing moves on screen: sleep until input arrives instead of redrawing at 60 FPS
+            events = [pygame.event.wait(IDLE_WAIT_MS)] + pygame.event.get()
+        PROFILER.start_frame()
+
+        for event in events:
             if event.type == pygame.QUIT:
+                finish_metrics()
                 pygame.quit()
                 sys.exit()
 
-            if event.type == pygame.MOUSEBUTTONDOWN and not game.game_over:
+            if replay:
+                # Replays are scrubbed on the timeline, and the board does not take moves
+                timeline = renderer.timeline
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and timeline.rect.collidepoint(event.pos):
+                    timeline.dragging = True
+                if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                    timeline.dragging = False
+                if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION) and timeline.dragging \
+                        and timeline.turn_at(event.pos[0]) != timeline.turn:
+                    show_turn(game, replay, timeline.turn_at(event.pos[0]), renderer)
+                if event.type == pygame.KEYDOWN:
+                    steps = {pygame.K_COMMA: -1, pygame.K_PERIOD: 1, pygame.K_PAGEUP: -10, pygame.K_PAGEDOWN: 10}
+                    if event.key in steps:
+                        show_turn(game, replay, timeline.turn + steps[event.key], renderer)
+                    elif event.key == pygame.K_END:
+                        show_turn(game, replay, replay.turns, renderer)
+            elif args.connect:
+                # Moves go to the server, and the board changes only when it answers
+                if event.type == NETWORK_EVENT and not handle_network_message(game, event.message, network, animation):
+                    network = None
+                if network and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not game.game_over \
+                        and game.current_player == my_color:
+                    row, col = viewport.screen_to_cell(*event.pos)
+                    if game.is_valid_move(row, col):
+                        network.send({"type": "move", "row": row, "col": col})
+            elif args.host_peer or args.peer:
+                # Both boards play every move; ours is sent once our board has taken it
+                if event.type == NETWORK_EVENT and peer:
+                    handle_peer_message(peer, event.message)
+                if peer and not peer.left and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 \
+                        and peer.our_turn and not game.turn_pending:
+                    row, col = viewport.screen_to_cell(*event.pos)
+                    if make_move(game, row, col, moving_blobs):
+                        peer.unsent = True
+                        if args.record:
+                            save_recording(game, args.record)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not game.game_over:
                 mouse_x, mouse_y = pygame.mouse.get_pos()
-                col = mouse_x // CELL_SIZE
-                row = mouse_y // CELL_SIZE
-                make_move(game, row, col, moving_blobs)
-
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
-                game = Game()
-                moving_blobs.clear()
-
+                row, col = viewport.screen_to_cell(mouse_x, mouse_y)
+                if make_move(game, row, col, moving_blobs) and args.record:
+                    save_recording(game, args.record)
+
+            # Right or middle button drags the board, the wheel zooms
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button in (2, 3):
+                dragging = True
+            if event.type == pygame.MOUSEBUTTONUP and event.button in (2, 3):
+                dragging = False
+            if event.type == pygame.MOUSEMOTION and dragging:
+                viewport.scroll_by(-event.rel[0], -event.rel[1])
+            if event.type == pygame.MOUSEWHEEL:
+                viewport.zoom_at(event.y, *pygame.mouse.get_pos())
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    viewport.scroll_by(-SCROLL_STEP, 0)
+                elif event.key == pygame.K_RIGHT:
+                    viewport.scroll_by(SCROLL_STEP, 0)
+                elif event.key == pygame.K_UP:
+                    viewport.scroll_by(0, -SCROLL_STEP)
+                elif event.key == pygame.K_DOWN:
+                    viewport.scroll_by(0, SCROLL_STEP)
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    viewport.zoom_at(1, viewport.width // 2, viewport.height // 2)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    viewport.zoom_at(-1, viewport.width // 2, viewport.height // 2)
+                elif event.key == pygame.K_HOME:
+                    viewport.fit_board()
+                elif event.key == pygame.K_F3:
+                    PROFILER.toggle()
+                    renderer.invalidate()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_r and not online:
+                finish_metrics()
+                game = restart_game(moving_blobs, renderer)
+                metrics_saved = False
+                if replay:
+                    # Leaving the replay for a game of your own
+                    replay = renderer.timeline = None
+                    viewport.height = WINDOW_HEIGHT
+                    viewport.clamp()
+
+        if peer:
+            import lockstep
+            try:
+                if peer.update(game, moving_blobs) and args.record:
+                    save_recording(game, args.record)
+            except (lockstep.Desync, ValueError) as error:
+                print("Mängud läksid lahku:", error)
+                peer.socket.close()
+                peer = None
+        PROFILER.lap("events")
         update_game(game, moving_blobs)
-        draw_game(game)
-        draw_moving_blobs(WINDOW, moving_blobs)
-        pygame.display.flip()
+        if game.game_over and not moving_blobs:
+            finish_metrics()
+        PROFILER.lap("update")
+        if args.connect:
+            animation.update(CLOCK())
+            renderer.draw(game, animation.blobs)
+        else:
+            renderer.draw(game, moving_blobs)
+        PROFILER.end_frame()
         clock.tick(60)
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+"""
+Streaming statistics over movelog.py game logs.
+
+    python analyze.py games.crlog [more.crlog ...] [--workers N] [--output stats.json]
+
+    for game, turn in replay_turns(record):   # one TurnRecord per move
+        ...
+
+Every game is re-played in engine.py one move at a time and turned into
+per-turn records (chain length in waves, cells exploded, cells captured, HQ
+damage, powerups taken). Stats folds them into distributions, first-move win
+rates and an explosion heatmap whose size depends only on the board, so
+memory stays flat however many games the logs hold. With --workers, the
+logs are dealt out to the worker processes, so each log is read by one
+worker only; a single log is shared instead, worker N keeping game number
+G when G % workers == N. The workers' Stats are merged at the end.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+import movelog
+
+TurnRecord = namedtuple("TurnRecord", "seed turn player cell waves exploded captured hq_damage powerups_taken last")
+COLOR_NAMES = {engine.NONE: "none", engine.RED: "red", engine.BLUE: "blue"}
+
+
+def read_logs(paths, shard=0, shards=1):
+    """The GameRecords of several logs, keeping every shards-th game from `shard` on."""
+    number = 0
+    for path in paths:
+        for record in movelog.read_log(path):
+            if number % shards == shard:
+                yield record
+            number += 1
+
+
+def replay_turns(record):
+    """Re-play a logged game, yielding (game, TurnRecord) after every move.
+
+    `game` is the live Engine, so it is only valid until the next item.
+    """
+    game = record.new_game()
+    hqs = (game.board.red_hq, game.board.blue_hq) if game.hqs else ()
+    last = len(record.moves) - 1
+    for turn, index in enumerate(record.moves):
+        player = game.current_player
+        owners = game.owner[:]
+        health = (game.red_hq_health, game.blue_hq_health)
+        if not game.play_index(index):
+            raise ValueError(f"move {turn + 1} (cell {index}) of seed {record.seed} is not valid")
+        captured = sum(1 for cell, (before, after) in enumerate(zip(owners, game.owner))
+                       if after == player and before != player and cell not in hqs)
+        hq_damage = (health[0] - game.red_hq_health if player == engine.BLUE
+                     else health[1] - game.blue_hq_health)
+        yield game, TurnRecord(record.seed, turn + 1, player, index, game.waves, game.exploded,
+                               captured, max(hq_damage, 0), game.powerups_taken, turn == last)
+
+
+class Stats:
+    """Streaming aggregates of any number of games on one board size."""
+
+    def __init__(self):
+        self.games = 0
+        self.turns = 0
+        self.game_lengths = Counter()
+        self.winners = Counter()
+        self.chain_lengths = Counter()  # Waves per turn
+        self.exploded = Counter()  # Cells exploded per turn
+        self.totals = Counter()  # Captured cells, HQ damage, powerups
+        self.first_moves = {}  # Opening cell -> [games, won by the first player]
+        self.heatmap = None
+        self.cols = None
+
+    def add_turn(self, game, turn):
+        self.turns += 1
+        self.chain_lengths[turn.waves] += 1
+        self.exploded[turn.exploded] += 1
+        self.totals["captured"] += turn.captured
+        self.totals["hq_damage"] += turn.hq_damage
+        self.totals["powerups_taken"] += turn.powerups_taken
+        if turn.last:
+            self.add_game(game)
+
+    def add_game(self, game):
+        self.games += 1
+        self.game_lengths[game.turns_played] += 1
+        self.winners[game.winner] += 1
+        opening = self.first_moves.setdefault(game.moves[0], [0, 0])
+        opening[0] += 1
+        opening[1] += game.winner == game.variant.first_player
+        if self.heatmap is None:
+            self.heatmap = [0] * len(game.explosion_counts)
+            self.cols = game.cols
+        elif len(self.heatmap) != len(game.explosion_counts):
+            raise ValueError("every game must be on the same board size")
+        self.heatmap = [total + count for total, count in zip(self.heatmap, game.explosion_counts)]
+
+    def merge(self, other):
+        self.games += other.games
+        self.turns += other.turns
+        for name in ("game_lengths", "winners", "chain_lengths", "exploded", "totals"):
+            getattr(self, name).update(getattr(other, name))
+        for cell, (games, wins) in other.first_moves.items():
+            opening = self.first_moves.setdefault(cell, [0, 0])
+            opening[0] += games
+            opening[1] += wins
+        if other.heatmap is not None:
+            if self.heatmap is None:
+                self.heatmap, self.cols = other.heatmap[:], other.cols
+            else:
+                self.heatmap = [total + count for total, count in zip(self.heatmap, other.heatmap)]
+        return self
+
+    def percentile(self, counts, percent):
+        """Percentile of a Counter histogram."""
+        target = sum(counts.values()) * percent / 100
+        seen = 0
+        for value in sorted(counts):
+            seen += counts[value]
+            if seen >= target:
+                return value
+        return 0
+
+    def to_dict(self):
+        first_player_wins = sum(wins for games, wins in self.first_moves.values())
+        return {
+            "games": self.games,
+            "turns": self.turns,
+            "winners": {COLOR_NAMES[color]: count for color, count in self.winners.items()},
+            "first_player_win_rate": first_player_wins / self.games if self.games else 0.0,
+            "game_length": {"mean": self.turns / self.games if self.games else 0.0,
+                            "p50": self.percentile(self.game_lengths, 50),
+                            "p99": self.percentile(self.game_lengths, 99),
+                            "histogram": dict(sorted(self.game_lengths.items()))},
+            "chain_length": dict(sorted(self.chain_lengths.items())),
+            "exploded_per_turn": dict(sorted(self.exploded.items())),
+            "per_turn": {name: total / self.turns if self.turns else 0.0
+                         for name, total in sorted(self.totals.items())},
+            "first_moves": {f"{cell // self.cols},{cell % self.cols}": {"games": games, "win_rate": wins / games}
+                            for cell, (games, wins) in sorted(self.first_moves.items())},
+            "heatmap": [self.heatmap[row:row + self.cols] for row in range(0, len(self.heatmap), self.cols)]
+            if self.heatmap else [],
+        }
+
+
+def analyze_shard(paths, shard=0, shards=1):
+    stats = Stats()
+    add_turn = stats.add_turn
+    for record in read_logs(paths, shard, shards):
+        for game, turn in replay_turns(record):
+            add_turn(game, turn)
+    return stats
+
+
+def analyze(paths, workers=1):
+    if workers <= 1:
+        return analyze_shard(paths)
+    if len(paths) > 1:
+        workers = min(workers, len(paths))
+        jobs = [(paths[shard::workers], 0, 1) for shard in range(workers)]
+    else:
+        # Every worker reads the one log and keeps its share of the games
+        jobs = [(paths, shard, workers) for shard in range(workers)]
+    stats = Stats()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(analyze_shard, *zip(*jobs)):
+            stats.merge(part)
+    return stats
+
+
+def print_summary(stats, file=sys.stdout):
+    summary = stats.to_dict()
+    length = summary["game_length"]
+    print(f"{stats.games} games, {stats.turns} turns; length mean {length['mean']:.1f}, "
+          f"p50 {length['p50']}, p99 {length['p99']}; winners {summary['winners']}", file=file)
+    print(f"first player wins {summary['first_player_win_rate']:.1%}; per turn: "
+          + ", ".join(f"{name} {value:.2f}" for name, value in summary["per_turn"].items()), file=file)
+    openings = sorted(summary["first_moves"].items(), key=lambda item: -item[1]["games"])[:5]
+    print("most played openings: " + ", ".join(f"({cell}) {value['games']} games, {value['win_rate']:.0%} won"
+                                               for cell, value in openings), file=file)
+    if summary["heatmap"]:
+        print("explosions per game by cell:", file=file)
+        for row in summary["heatmap"]:
+            print(" ".join(f"{count / stats.games:6.1f}" for count in row), file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="game logs made with movelog.py")
+    parser.add_argument("--workers", type=int, default=1, help="processes to shard the logs (or the games of one log) across")
+    parser.add_argument("--output", help="write the statistics to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = analyze(args.logs, args.workers)
+    elapsed = time.perf_counter() - start
+    print_summary(stats)
+    print(f"analyzed in {elapsed:.2f} s, {stats.games / elapsed:.1f} games/s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(stats.to_dict(), file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
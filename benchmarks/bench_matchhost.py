@@ -0,0 +1,107 @@
+"""
+Memory and move latency of matchhost.py with many matches at once.
+
+    python benchmarks/bench_matchhost.py [--matches 50000] [--variant hq_powerups] [--board 9x9]
+                                         [--moves 100000] [--output result.json]
+
+Seats two players in every match, then plays random moves in random matches
+through Host.play, all in one coroutine, so each move decodes a packed
+match, rebuilds its random generator, plays and packs it again. Memory is what tracemalloc sees the host
+allocate, next to its own PackedMatch.nbytes total and to the same number of
+live engine.Engine games (measured on a sample and scaled up).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from common import REPO_DIR, percentile  # noqa: F401  (puts the repository on sys.path)
+import engine
+import matchhost
+
+ENGINE_SAMPLE = 2000
+
+
+def engine_bytes(key, count):
+    """Bytes per match of live Engine games, from a sample."""
+    variant, rows, cols = key
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    games = [engine.Engine(variant, seed=seed, rows=rows, cols=cols) for seed in range(count)]
+    size = (tracemalloc.get_traced_memory()[0] - start) / len(games)
+    tracemalloc.stop()
+    return size
+
+
+async def run(matches, key, moves, seed):
+    rng = random.Random(seed)
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    host = matchhost.Host(seed)
+    for _ in range(matches * 2):
+        host.seat(key)
+    created = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    numbers = list(host.matches)
+    times = []
+    stuck = 0
+    for _ in range(moves):
+        match = host.matches.get(rng.choice(numbers))
+        if match is None:
+            continue  # Finished
+        game = match.game()
+        valid = game.valid_moves()
+        if not valid:
+            stuck += 1
+            continue
+        row, col = divmod(rng.choice(valid), game.cols)
+        begin = time.perf_counter()
+        result = await host.play(match, game.current_player, row, col)
+        times.append(time.perf_counter() - begin)
+        if isinstance(result, str):
+            raise RuntimeError(f"match {match.number} rejected ({row}, {col}): {result}")
+    return host, created, times, stuck
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matches", type=int, default=50000)
+    parser.add_argument("--variant", choices=sorted(engine.VARIANTS), default="hq_powerups")
+    parser.add_argument("--board", help="ROWSxCOLS (default: the variant's)")
+    parser.add_argument("--moves", type=int, default=100000, help="moves to play across the matches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    variant = engine.VARIANTS[args.variant]
+    rows, cols = ([int(part) for part in args.board.lower().split("x")] if args.board
+                  else (variant.rows, variant.cols))
+    key = (args.variant, rows, cols)
+    per_engine = engine_bytes(key, min(args.matches, ENGINE_SAMPLE))
+    start = time.perf_counter()
+    host, created, times, stuck = asyncio.run(run(args.matches, key, args.moves, args.seed))
+    elapsed = time.perf_counter() - start
+    summary = {"matches": args.matches, "board": [rows, cols], "variant": args.variant,
+               "bytes_per_new_match": round(created / args.matches, 1),
+               "nbytes_per_match": host.stats()["per_match"], "engine_bytes_per_match": round(per_engine, 1),
+               "moves": len(times), "no_valid_move": stuck, "finished": args.matches - len(host.matches),
+               "seconds": round(elapsed, 3),
+               "move_ms": {"mean": round(sum(times) / len(times) * 1000, 3) if times else 0.0,
+                           "p50": round(percentile(times, 50) * 1000, 3) if times else 0.0,
+                           "p99": round(percentile(times, 99) * 1000, 3) if times else 0.0}}
+    print(f"{args.matches} {args.variant} matches on {rows}x{cols}: {summary['bytes_per_new_match']} bytes each "
+          f"when new (tracemalloc), {per_engine:.0f} as live Engines")
+    print(f"{len(times)} moves in {elapsed:.2f} s, {summary['finished']} matches finished; "
+          f"{summary['nbytes_per_match']} bytes per match after (nbytes); move resolved in "
+          f"{summary['move_ms']['mean']} ms mean, p50 {summary['move_ms']['p50']} ms, p99 {summary['move_ms']['p99']} ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Loopback load test of server.py: random bots play many matches at once.
+
+    python benchmarks/bench_server.py [--matches 200] [--variant hq_powerups] [--board 30x30]
+                                      [--spectators 0] [--output result.json]
+
+The server and every client share one event loop, so the numbers include the
+clients' work. Each bot keeps an engine.Engine mirror of its match from the
+server's snapshot and deltas (sync.py), checks the checksums and picks valid
+moves from the mirror; a checksum mismatch counts as a desync. A move the server rejects counts as an error, and a bot
+left without a valid move (the rules allow that) leaves its match. Spectators
+keep the same kind of mirror of the match they watch.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from common import REPO_DIR  # noqa: F401  (puts the repository on sys.path)
+import engine
+import positions
+import server
+import sync
+
+MAX_TURNS = 2000
+WATCH_TIMEOUT = 5.0  # Seconds a spectator keeps asking for a match that has not been created yet
+
+
+async def bot(port, variant, board, seed, results):
+    client = await server.Client().connect("127.0.0.1", port)
+    rng = random.Random(seed)
+    await client.send({"type": "join", "variant": variant, "board": board})
+    joined = await client.receive()
+    codec = positions.PositionCodec(variant, *joined["board"])
+    color = sync.COLORS[joined["color"]]
+    game = None
+    latencies = []
+    sent = None
+    while True:
+        message = await client.receive()
+        if message is None or message["type"] == "opponent_left":
+            break
+        if message["type"] == "error":
+            results["errors"] += 1
+            break
+        if message["type"] == "snapshot":
+            game = sync.read_snapshot(codec, message)
+        if message["type"] == "state":
+            if sent is not None:
+                latencies.append(time.perf_counter() - sent)
+                sent = None
+            sync.apply_delta(game, message)
+            if not sync.check(codec, game, message):
+                results["desyncs"] += 1
+                await client.send({"type": "resync"})
+            results["moves"] += color == engine.RED
+            if message["game_over"] or message["turn"] >= MAX_TURNS:
+                results["games"] += color == engine.RED
+                break
+        if game is not None and game.current_player == color and not game.game_over:
+            moves = game.valid_moves()
+            if not moves:
+                results["stuck"] += 1
+                break
+            row, col = divmod(rng.choice(moves), game.cols)
+            sent = time.perf_counter()
+            await client.send({"type": "move", "row": row, "col": col})
+    results["latencies"].extend(latencies)
+    results["bytes"] += client.bytes_received
+    await client.close()
+
+
+async def spectator(port, number, results):
+    client = await server.Client().connect("127.0.0.1", port)
+    deadline = time.perf_counter() + WATCH_TIMEOUT
+    while True:
+        await client.send({"type": "watch", "match": number})
+        watching = await client.receive()
+        if watching["type"] == "watching":
+            break
+        if time.perf_counter() > deadline:
+            await client.close()
+            return
+        await asyncio.sleep(0.01)
+    codec = positions.PositionCodec(watching["variant"], *watching["board"])
+    game = None
+    while True:
+        message = await client.receive()
+        if message is None or message["type"] == "opponent_left":
+            break
+        results["spectator_messages"] += 1
+        if message["type"] == "snapshot":
+            game = sync.read_snapshot(codec, message)
+        elif message["type"] == "state" and game is not None:
+            sync.apply_delta(game, message)
+            if not sync.check(codec, game, message):
+                results["desyncs"] += 1
+                await client.send({"type": "resync"})
+            if message["game_over"] or message["turn"] >= MAX_TURNS:
+                break
+    results["spectators"] += 1
+    results["spectator_bytes"] += client.bytes_received
+    await client.close()
+
+
+async def run(matches, variant, board, seed, spectators):
+    host = server.Server(seed)
+    listener = await host.serve_tcp("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    results = {"games": 0, "moves": 0, "errors": 0, "stuck": 0, "desyncs": 0, "bytes": 0, "latencies": [],
+               "spectators": 0, "spectator_messages": 0, "spectator_bytes": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(bot(port, variant, board, seed * 100000 + number, results) for number in range(matches * 2)),
+                         *(spectator(port, number % matches + 1, results) for number in range(matches * spectators)))
+    elapsed = time.perf_counter() - start
+    while host.connections:
+        await asyncio.sleep(0.01)
+    results["lagged"], results["dropped"] = host.lagged, host.dropped
+    listener.close()
+    await listener.wait_closed()
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matches", type=int, default=200)
+    parser.add_argument("--variant", choices=sorted(engine.VARIANTS), default="hq_powerups")
+    parser.add_argument("--board", help="ROWSxCOLS (default: the variant's)")
+    parser.add_argument("--spectators", type=int, default=0, help="spectators per match")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    board = None
+    if args.board:
+        board = [int(part) for part in args.board.lower().split("x")]
+    results, elapsed = asyncio.run(run(args.matches, args.variant, board, args.seed, args.spectators))
+    latencies = sorted(results.pop("latencies"))
+    percentile = lambda percent: latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000 \
+        if latencies else 0.0
+    summary = dict(results, matches=args.matches, seconds=round(elapsed, 3),
+                   moves_per_second=round(results["moves"] / elapsed, 1),
+                   latency_ms={"p50": round(percentile(50), 3), "p99": round(percentile(99), 3)})
+    print(f"{args.matches} concurrent matches: {results['games']} finished, {results['moves']} moves, "
+          f"{results['errors']} errors, {results['stuck']} with no valid move, {results['desyncs']} desyncs "
+          f"in {elapsed:.2f} s; {summary['moves_per_second']} moves/s, "
+          f"{results['bytes'] / max(results['moves'], 1) / 2:.0f} bytes per move and player, "
+          f"move round trip p50 {summary['latency_ms']['p50']} ms, p99 {summary['latency_ms']['p99']} ms")
+    if args.spectators:
+        print(f"{results['spectators']} spectators received {results['spectator_messages']} messages, "
+              f"{results['spectator_bytes'] / max(results['spectators'], 1) / 1024:.1f} KiB each; "
+              f"{results['lagged']} fell behind and were sent a snapshot, {results['dropped']} dropped")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
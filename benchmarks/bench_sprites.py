@@ -0,0 +1,87 @@
+"""
+Compare immediate-mode cell drawing with the sprite atlas in CR_1.6.py.
+
+    python benchmarks/bench_sprites.py [--frames N] [--seed S]
+"""
+
+import argparse
+import math
+import random
+
+from common import load_script, time_call
+
+
+def build_board(cr, seed):
+    """A crowded mid-game board: most cells hold dots, some hold powerups."""
+    rng = random.Random(seed)
+    game = cr.Game()
+    for row in range(cr.GRID_ROWS):
+        for col in range(cr.GRID_COLS):
+            cell = game.grid[row][col]
+            if isinstance(cell, cr.HQCell):
+                continue
+            roll = rng.random()
+            if roll < 0.1:
+                cell.powerup = rng.choice([cr.POWERUP_STAR, cr.POWERUP_HEART])
+            elif roll < 0.9:
+                cell.color = rng.choice([cr.RED, cr.BLUE])
+                cell.dots = rng.randint(1, 3)
+    game.red_hq_health = 3
+    return game
+
+
+def draw_cells_immediate(cr, window, game, current_time, viewport, sprites):
+    for row in range(cr.GRID_ROWS):
+        for col in range(cr.GRID_COLS):
+            cell = game.grid[row][col]
+            center_x = col * cr.CELL_SIZE + cr.CELL_SIZE // 2
+            center_y = row * cr.CELL_SIZE + cr.CELL_SIZE // 2
+            if not cell.is_empty():
+                shake_x = shake_y = 0
+                if game.is_near_critical(row, col):
+                    shake_x = math.sin(current_time * cr.SHAKE_SPEED) * cr.SHAKE_AMPLITUDE
+                    shake_y = math.cos(current_time * cr.SHAKE_SPEED) * cr.SHAKE_AMPLITUDE
+                cr.draw_dot_pattern(window, cell, center_x, center_y, shake_x, shake_y)
+            if cell.has_powerup():
+                cr.draw_powerup(window, cell.powerup, center_x, center_y, current_time * 50)
+    for (row, col), color, health in cr.get_hqs(game):
+        cr.draw_hq_square(window, col * cr.CELL_SIZE, row * cr.CELL_SIZE, color, health)
+
+
+def draw_cells_sprites(cr, window, game, current_time, viewport, sprites):
+    for row in range(cr.GRID_ROWS):
+        for col in range(cr.GRID_COLS):
+            cr.draw_cell(window, game, row, col, current_time, viewport, sprites)
+    for (row, col), color, health in cr.get_hqs(game):
+        cr.draw_hq(window, row, col, color, health, viewport)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    cr = load_script("CR_1.6.py")
+    game = build_board(cr, args.seed)
+    window = cr.WINDOW
+    viewport = cr.Viewport(cr.WINDOW_WIDTH, cr.WINDOW_HEIGHT)
+    atlas = cr.get_sprite_atlas(viewport.cell_px)
+    clock = {"t": 0.0}
+
+    def frame(draw):
+        clock["t"] += 1 / 60
+        window.fill(cr.PASTEL_BLUE)
+        draw(cr, window, game, clock["t"], viewport, atlas)
+
+    immediate = time_call(lambda: frame(draw_cells_immediate), args.frames)
+    sprites = time_call(lambda: frame(draw_cells_sprites), args.frames)
+
+    print(f"board {cr.GRID_ROWS}x{cr.GRID_COLS}, {args.frames} frames")
+    print(f"immediate mode: {immediate * 1000:8.3f} ms/frame")
+    print(f"sprite atlas:   {sprites * 1000:8.3f} ms/frame")
+    print(f"speedup:        {immediate / sprites:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
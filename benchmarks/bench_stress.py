@@ -0,0 +1,286 @@
+"""
+Worst-case chain reactions: resolution time, peak memory, waves and blobs.
+
+    python benchmarks/bench_stress.py [--boards 9x9,16x16,32x32] [--max-waves N] [--output results.json]
+
+Every board comes from fixtures.build_pathological: each cell one dot below
+critical mass, owners in a checkerboard, and stars on empty cells down every
+third column (hq rules only). One dot is added to the middle cell and the
+reaction is resolved by each resolver:
+
+    engine hq           engine.py under CR_1.6.py, start_move + land_wave with nothing drawn
+    1.6 animated        make_move + update_game waves (what CR_1.6.py runs)
+    ref 1.6 recursive   Game.chain_reaction in reference/CR_1.6.py
+    ref 1.6 animated    make_move + update_game waves in reference/CR_1.6.py
+    engine classic      engine.py under CR_0.8.py, as for engine hq
+    0.8 animated        handle_player_move + update_game_state waves (what CR_0.8.py runs)
+    ref 0.8 recursive   Game.trigger_chain_reaction in reference/CR_0.8.py
+    ref 0.8 animated    handle_player_move + update_game_state waves in reference/CR_0.8.py
+
+reference/ holds the scripts as they were before engine.py, so the ref rows
+are the baseline the others are measured against. Wave resolvers stop after
+--max-waves waves; recursive ones stop at the interpreter's recursion limit.
+Either counts as an unbounded reaction. Time, memory and counts are measured
+in separate runs, so tracing and counting do not inflate the timings.
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from common import StepClock, load_script
+from fixtures import build_pathological
+
+MAX_WAVES = 1000
+SEED = 0
+
+
+class Resolver:
+    def __init__(self, script, max_waves, module_name=None):
+        self.cr = load_script(script, module_name)
+        self.max_waves = max_waves
+        self.clock = StepClock()
+        if hasattr(self.cr, "CLOCK"):
+            self.cr.CLOCK = self.clock.now
+        else:
+            self.cr.time = SimpleNamespace(time=self.clock.now)  # The reference copies call time.time()
+
+    def set_board_size(self, rows, cols):
+        cr = self.cr
+        if hasattr(cr, "set_board_size"):
+            cr.set_board_size(rows, cols)
+            return
+        cr.GRID_ROWS, cr.GRID_COLS = rows, cols
+        if hasattr(cr, "RED_HQ_POS"):
+            # The reference CR_1.6.py places its HQs when it is imported
+            cr.RED_HQ_POS = (0, cols // 2)
+            cr.BLUE_HQ_POS = (rows - 1, cols // 2)
+
+    def board(self):
+        cr = self.cr
+        game = build_pathological(cr, SEED)
+        row, col = cr.GRID_ROWS // 2, cr.GRID_COLS // 2
+        if getattr(game.grid[row][col], "powerup", None):
+            col += 1  # Start from a dot, the stars are reached by the reaction
+        game.current_player = game.grid[row][col].color
+        return game, row, col
+
+
+class EngineWaves(Resolver):
+    counts = ("waves", "explosions")
+
+    def setup(self, fixture):
+        game, row, col = copy.deepcopy(fixture)
+        return game.rules, game.rules.index(row, col)
+
+    def resolve(self, state, counts=None):
+        rules, index = state
+        rules.start_move(index)
+        for _ in range(self.max_waves):
+            if not rules.in_flight:
+                break
+            rules.land_wave()
+        if counts is not None:
+            counts["waves"] = rules.waves
+            counts["explosions"] = rules.exploded
+        return not rules.in_flight
+
+
+class EngineHQ(EngineWaves):
+    name = "engine hq"
+
+    def __init__(self, max_waves):
+        super().__init__("CR_1.6.py", max_waves)
+
+
+class EngineClassic(EngineWaves):
+    name = "engine classic"
+
+    def __init__(self, max_waves):
+        super().__init__("CR_0.8.py", max_waves)
+
+
+class Recursive(Resolver):
+    counts = ("calls", "max_depth")
+
+    def setup(self, fixture):
+        game, row, col = copy.deepcopy(fixture)
+        cell = game.grid[row][col]
+        cell.color = game.current_player
+        setattr(cell, self.dots, getattr(cell, self.dots) + 1)
+        return game, row, col
+
+    def resolve(self, state, counts=None):
+        game, row, col = state
+        method = getattr(game, self.method)
+        if counts is not None:
+            # A profile hook sees every call without adding stack frames, so the recursion
+            # still stops exactly where it does in the timed run
+            code = method.__code__
+            depth = [0]
+
+            def profile(frame, event, arg):
+                if frame.f_code is code:
+                    if event == "call":
+                        counts["calls"] += 1
+                        depth[0] += 1
+                        counts["max_depth"] = max(counts["max_depth"], depth[0])
+                    elif event == "return":
+                        depth[0] -= 1
+
+            sys.setprofile(profile)
+        try:
+            method(row, col)
+        except RecursionError:
+            return False
+        finally:
+            sys.setprofile(None)
+        return True
+
+
+class Recursive16(Recursive):
+    name = "ref 1.6 recursive"
+    method = "chain_reaction"
+    dots = "dots"
+
+    def __init__(self, max_waves):
+        super().__init__(os.path.join("reference", "CR_1.6.py"), max_waves, "reference_cr_1_6")
+
+
+class Recursive08(Recursive):
+    name = "ref 0.8 recursive"
+    method = "trigger_chain_reaction"
+    dots = "dot_count"
+
+    def __init__(self, max_waves):
+        super().__init__(os.path.join("reference", "CR_0.8.py"), max_waves, "reference_cr_0_8")
+
+
+class Animated16(Resolver):
+    name = "1.6 animated"
+    counts = ("waves", "blobs", "peak_blobs")
+
+    def __init__(self, max_waves, script="CR_1.6.py", module_name=None):
+        super().__init__(script, max_waves, module_name)
+
+    def setup(self, fixture):
+        game, row, col = copy.deepcopy(fixture)
+        return game, row, col, []
+
+    def resolve(self, state, counts=None):
+        game, row, col, moving_blobs = state
+        self.cr.make_move(game, row, col, moving_blobs)
+        return self.run_waves(moving_blobs, lambda: self.cr.update_game(game, moving_blobs), counts)
+
+    def run_waves(self, moving_blobs, update, counts):
+        if counts is not None:
+            counts["blobs"] += len(moving_blobs)
+            counts["peak_blobs"] = len(moving_blobs)
+        for _ in range(self.max_waves):
+            if not moving_blobs:
+                return True
+            self.clock.step()
+            update()
+            if counts is not None:
+                # A clock step is longer than a blob flight, so every blob lands each wave
+                # and the ones in flight now were all sent off by it
+                counts["waves"] += 1
+                counts["blobs"] += len(moving_blobs)
+                counts["peak_blobs"] = max(counts["peak_blobs"], len(moving_blobs))
+        return not moving_blobs
+
+
+class ReferenceAnimated16(Animated16):
+    name = "ref 1.6 animated"
+
+    def __init__(self, max_waves):
+        super().__init__(max_waves, os.path.join("reference", "CR_1.6.py"), "reference_cr_1_6_animated")
+
+
+class Animated08(Animated16):
+    name = "0.8 animated"
+
+    def __init__(self, max_waves, script="CR_0.8.py", module_name=None):
+        super().__init__(max_waves, script, module_name)
+
+    def resolve(self, state, counts=None):
+        game, row, col, moving_dots = state
+        self.cr.handle_player_move(game, row, col, moving_dots)
+        return self.run_waves(moving_dots, lambda: self.cr.update_game_state(game, moving_dots), counts)
+
+
+class ReferenceAnimated08(Animated08):
+    name = "ref 0.8 animated"
+
+    def __init__(self, max_waves):
+        super().__init__(max_waves, os.path.join("reference", "CR_0.8.py"), "reference_cr_0_8_animated")
+
+
+RESOLVERS = (EngineHQ, Animated16, Recursive16, ReferenceAnimated16,
+             EngineClassic, Animated08, Recursive08, ReferenceAnimated08)
+
+
+def measure(resolver, fixture):
+    # Time
+    state = resolver.setup(fixture)
+    start = time.perf_counter()
+    bounded = resolver.resolve(state)
+    seconds = time.perf_counter() - start
+
+    # Peak memory allocated while resolving
+    state = resolver.setup(fixture)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    resolver.resolve(state)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    # Waves, explosions and blobs
+    counts = dict.fromkeys(resolver.counts, 0)
+    resolver.resolve(resolver.setup(fixture), counts)
+    return dict(bounded=bounded, ms=seconds * 1000, peak_kib=peak / 1024, **counts)
+
+
+def parse_board(text):
+    rows, cols = (int(part) for part in text.lower().split("x"))
+    return rows, cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boards", default="9x9,16x16,32x32", help="comma-separated ROWSxCOLS sizes")
+    parser.add_argument("--max-waves", type=int, default=MAX_WAVES)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    resolvers = [resolver_class(args.max_waves) for resolver_class in RESOLVERS]
+    results = {}
+    for rows, cols in (parse_board(text) for text in args.boards.split(",")):
+        for resolver in resolvers:
+            resolver.set_board_size(rows, cols)
+            result = results[f"{resolver.name} / {rows}x{cols}"] = measure(resolver, resolver.board())
+            if "blobs" in result:
+                counts = f"{result['waves']:5d} waves {result['blobs']:8d} blobs (peak {result['peak_blobs']})"
+            elif "calls" in result:
+                counts = f"{result['calls']:8d} calls (depth {result['max_depth']})"
+            else:
+                counts = f"{result['waves']:5d} waves {result['explosions']:8d} explosions"
+            print(f"{resolver.name:<18} {rows:>3}x{cols:<3} {result['ms']:10.2f} ms "
+                  f"{result['peak_kib']:10.1f} KiB peak  {counts}"
+                  f"{'' if result['bounded'] else '  UNBOUNDED'}")
+
+    if args.output:
+        report = {"version": 3, "max_waves": args.max_waves, "results": results}
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Micro-benchmarks for the rules and rendering hot paths of CR_1.6.py.
+
+    python benchmarks/bench_suite.py [--board 9x9] [--repeat N] [--seed S]
+                                     [--output results.json] [--compare old.json] [--only NAME]
+
+Each benchmark runs on the seeded fixtures in fixtures.py (empty, mid-game,
+saturated, powerup-heavy). Results are printed and, with --output, written as
+JSON; --compare prints the change against an earlier results file.
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import platform
+import random
+import sys
+
+from common import StepClock, load_script, percentile, time_runs
+from fixtures import FIXTURES, playable_cells
+
+
+def trigger_cell(cr, game):
+    """The cell a chain reaction starts from: the fullest cell, or the middle of the board."""
+    cells = playable_cells(cr, game)
+    return max(cells, key=lambda cell: (game.grid[cell[0]][cell[1]].dots, -abs(cell[0] - cr.GRID_ROWS // 2)))
+
+
+def bench_chain_reaction(cr, fixture, seed):
+    """A move on a cell one dot below critical mass, resolved by the game's engine.py rules."""
+    row, col = trigger_cell(cr, fixture)
+
+    def setup():
+        game = copy.deepcopy(fixture)
+        cell = game.grid[row][col]
+        cell.color = cell.color or cr.RED
+        cell.dots = game.get_critical_mass(row, col) - 1
+        game.current_player = cell.color
+        return game.rules
+
+    def run(rules):
+        rules.start_move(rules.index(row, col))
+        while rules.in_flight:
+            rules.land_wave()
+
+    return setup, run
+
+
+def bench_is_valid_move(cr, fixture, seed):
+    def run(game):
+        for row in range(cr.GRID_ROWS):
+            for col in range(cr.GRID_COLS):
+                game.is_valid_move(row, col)
+
+    return lambda: fixture, run
+
+
+def bench_spawn_powerup(cr, fixture, seed):
+    def setup():
+        game = copy.deepcopy(fixture)
+        game.powerup_spawns = 0
+        game.rules.rng = random.Random(seed)
+        return game.rules
+
+    return setup, lambda rules: rules.spawn_powerup()
+
+
+def bench_star_cascade(cr, fixture, seed):
+    """A star in the column holding the most stars, so it sets the others off."""
+    def stars(col):
+        return sum(fixture.grid[row][col].powerup == cr.POWERUP_STAR for row in range(cr.GRID_ROWS))
+
+    col = max(range(cr.GRID_COLS), key=stars)
+    row = cr.GRID_ROWS // 2
+
+    def setup():
+        game = copy.deepcopy(fixture)
+        game.current_player = cr.RED
+        game.grid[row][col].powerup = cr.POWERUP_STAR
+        return game.rules
+
+    return setup, lambda rules: rules.handle_powerup(rules.index(row, col))
+
+
+def blobs_from_every_cell(cr, game):
+    """Blobs in flight from every cell to each neighbor, also put in flight in the game's engine."""
+    blobs = []
+    game.rules.in_flight = []
+    game.rules.wave_log = [[]]
+    game.waves_shown = 1
+    for row, col in playable_cells(cr, game):
+        start = (col * cr.CELL_SIZE + cr.CELL_SIZE // 2, row * cr.CELL_SIZE + cr.CELL_SIZE // 2)
+        color = cr.RED if (row + col) % 2 else cr.BLUE
+        for neighbor_row, neighbor_col in game.get_neighbors(row, col):
+            end = (neighbor_col * cr.CELL_SIZE + cr.CELL_SIZE // 2, neighbor_row * cr.CELL_SIZE + cr.CELL_SIZE // 2)
+            blobs.append(cr.MovingBlob(start, end, color, 0.0))
+            game.rules.in_flight.append((game.rules.index(neighbor_row, neighbor_col), cr.ENGINE_COLORS[color]))
+    return blobs
+
+
+def bench_update_game(cr, fixture, seed, current_time):
+    """One update_game call with a blob leaving every cell towards each neighbor."""
+    clock = StepClock(current_time)
+
+    def setup():
+        cr.CLOCK = clock.now
+        game = copy.deepcopy(fixture)
+        game.turns_played = max(game.turns_played, 2)
+        return game, blobs_from_every_cell(cr, game)
+
+    return setup, lambda state: cr.update_game(*state)
+
+
+def bench_blobs_landing(cr, fixture, seed):
+    return bench_update_game(cr, fixture, seed, current_time=1.0)
+
+
+def bench_blobs_in_flight(cr, fixture, seed):
+    return bench_update_game(cr, fixture, seed, current_time=0.1)
+
+
+def bench_draw_game(cr, fixture, seed):
+    import pygame
+
+    clock = StepClock(0.5)
+    surface = pygame.Surface((cr.WINDOW_WIDTH, cr.WINDOW_HEIGHT))
+    viewport = cr.Viewport(cr.WINDOW_WIDTH, cr.WINDOW_HEIGHT)
+    viewport.fit_board()
+
+    def setup():
+        cr.CLOCK = clock.now
+        clock.step(1 / 60)
+        return fixture
+
+    return setup, lambda game: cr.draw_game(game, viewport, surface)
+
+
+BENCHMARKS = {
+    "chain reaction (engine waves)": bench_chain_reaction,
+    "is_valid_move (all cells)": bench_is_valid_move,
+    "spawn_powerup": bench_spawn_powerup,
+    "handle_powerup (star cascade)": bench_star_cascade,
+    "update_game (blobs landing)": bench_blobs_landing,
+    "update_game (blobs in flight)": bench_blobs_in_flight,
+    "draw_game": bench_draw_game,
+}
+
+
+def run_benchmark(cr, name, fixture, seed, repeat):
+    setup, function = BENCHMARKS[name](cr, fixture, seed)
+    times = time_runs(setup, function, repeat)
+    return {
+        "mean_ms": sum(times) / len(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "p50_ms": percentile(times, 50) * 1000,
+    }
+
+
+def parse_board(text):
+    rows, cols = (int(part) for part in text.lower().split("x"))
+    return rows, cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--board", type=parse_board, default=(9, 9), help="ROWSxCOLS")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    args = parser.parse_args()
+
+    import pygame
+
+    cr = load_script("CR_1.6.py")
+    cr.set_board_size(*args.board)
+    fixtures = {name: build(cr, args.seed) for name, build in FIXTURES.items()}
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["results"]
+
+    results = {}
+    for name in BENCHMARKS:
+        if args.only and args.only not in name:
+            continue
+        for fixture_name, fixture in fixtures.items():
+            key = f"{name} / {fixture_name}"
+            result = results[key] = run_benchmark(cr, name, fixture, args.seed, args.repeat)
+            line = f"{key:<52} {result['mean_ms']:9.3f} ms  (min {result['min_ms']:.3f})"
+            old = previous.get(key, {})
+            if "mean_ms" in old:
+                line += f"  {result['mean_ms'] / old['mean_ms']:6.2f}x of before"
+            print(line)
+
+    if args.output:
+        report = {
+            "version": 1,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "board": list(args.board),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Games-per-second throughput of complete bot-vs-bot games, run headless.
+
+    python benchmarks/bench_throughput.py [--games N] [--bots random,greedy]
+                                          [--rules hq,classic,engine-hq_powerups,...] [--seed S]
+                                          [--output results.json]
+
+Rulesets: "hq" is CR_1.6.py (HQs and powerups), "classic" is CR_0.8.py
+(elimination), and "engine-<variant>" is engine.py alone. The scripts play
+engine.py's rules too, but a wave at a time from their animated update
+loops, driven by a step clock. Turn latency is the time from the move to
+the settled board and leaves out the bot's choice.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import StepClock, load_script, percentile, settle
+
+MAX_TURNS = 1000  # Games still running after this many moves count as unfinished
+MAX_WAVES = 2000  # A turn whose chain reaction runs longer is treated as a never-ending cycle
+
+
+class HQRules:
+    """CR_1.6.py: HQs, powerups, blue moves first."""
+
+    script = "CR_1.6.py"
+
+    def __init__(self):
+        self.cr = load_script(self.script)
+        self.clock = StepClock()
+
+    def new_game(self, seed):
+        cr = self.cr
+        cr.CLOCK = self.clock.now
+        # Seeds the game and takes its spawn interval from engine.default_spawn_interval, as CR_1.6.py does
+        game = cr.start_recorded_game(seed)
+        game.moving_blobs = []
+        return game
+
+    def valid_moves(self, game):
+        return [(row, col) for row in range(self.cr.GRID_ROWS) for col in range(self.cr.GRID_COLS)
+                if game.is_valid_move(row, col)]
+
+    def score(self, game, row, col):
+        cr = self.cr
+        cell = game.grid[row][col]
+        if game.is_near_critical(row, col):
+            return 3
+        if cell.has_powerup():
+            return 2
+        enemy_row = cr.RED_HQ_POS[0] if game.current_player == cr.BLUE else cr.BLUE_HQ_POS[0]
+        return 1 - abs(row - enemy_row) / cr.GRID_ROWS
+
+    def play(self, game, row, col):
+        """Make a move and resolve it. Returns False if the chain reaction never ends."""
+        self.cr.make_move(game, row, col, game.moving_blobs)
+        return settle(self.cr, game, game.moving_blobs, self.clock) is not None
+
+    def winner(self, game):
+        return {self.cr.RED: "red", self.cr.BLUE: "blue"}.get(game.winner)
+
+
+class ClassicRules:
+    """CR_0.8.py: elimination, red moves first."""
+
+    script = "CR_0.8.py"
+
+    def __init__(self):
+        self.cr = load_script(self.script)
+        self.clock = StepClock()
+
+    def new_game(self, seed):
+        self.cr.CLOCK = self.clock.now
+        game = self.cr.Game()
+        game.moving_dots = []
+        return game
+
+    def valid_moves(self, game):
+        return [(row, col) for row in range(self.cr.GRID_ROWS) for col in range(self.cr.GRID_COLS)
+                if game.is_valid_move(row, col)]
+
+    def score(self, game, row, col):
+        if game.is_about_to_explode(row, col):
+            return 3
+        return 1 / game.get_critical_mass(row, col)
+
+    def play(self, game, row, col):
+        cr = self.cr
+        cr.handle_player_move(game, row, col, game.moving_dots)
+        for _ in range(MAX_WAVES):
+            self.clock.step()
+            cr.update_game_state(game, game.moving_dots)
+            if not game.moving_dots and not game.is_chain_reacting:
+                return True
+        return False
+
+    def winner(self, game):
+        return {self.cr.RED: "red", self.cr.BLUE: "blue"}.get(game.winner)
+
+
+class EngineRules:
+    """engine.py, the same rules without animation bookkeeping."""
+
+    def __init__(self, variant):
+        import engine
+
+        self.engine = engine
+        self.variant = variant
+        self.script = f"engine.py {variant}"
+
+    def new_game(self, seed):
+        return self.engine.Engine(self.variant, seed=seed)
+
+    def valid_moves(self, game):
+        return game.valid_moves()
+
+    def score(self, game, index):
+        if game.is_near_critical(index):
+            return 3
+        if game.powerup[index]:
+            return 2
+        return 1 / game.board.critical[index]
+
+    def play(self, game, index):
+        return game.play_index(index)
+
+    def winner(self, game):
+        return {self.engine.RED: "red", self.engine.BLUE: "blue"}.get(game.winner)
+
+
+RULES = {
+    "hq": HQRules,
+    "classic": ClassicRules,
+    "engine-classic": lambda: EngineRules("classic"),
+    "engine-hq": lambda: EngineRules("hq"),
+    "engine-hq_powerups": lambda: EngineRules("hq_powerups"),
+}
+
+
+def random_bot(rules, game, moves, rng):
+    return rng.choice(moves)
+
+
+def greedy_bot(rules, game, moves, rng):
+    """Explode a cell if possible, otherwise take the best-scoring cell; ties are broken at random."""
+    scores = [rules.score(game, *move) if isinstance(move, tuple) else rules.score(game, move) for move in moves]
+    best = max(scores)
+    return rng.choice([move for move, score in zip(moves, scores) if score == best])
+
+
+BOTS = {"random": random_bot, "greedy": greedy_bot}
+
+
+def play_game(rules, bot, seed, latencies):
+    rng = random.Random(seed)
+    game = rules.new_game(seed)
+    while not game.game_over and game.turns_played < MAX_TURNS:
+        moves = rules.valid_moves(game)
+        if not moves:
+            break
+        move = bot(rules, game, moves, rng)
+        start = time.perf_counter()
+        resolved = rules.play(game, *move) if isinstance(move, tuple) else rules.play(game, move)
+        latencies.append(time.perf_counter() - start)
+        if not resolved:
+            break
+    return game
+
+
+def run(rules, bot, games, seed):
+    latencies = []
+    winners = {}
+    unfinished = 0
+    moves = 0
+    start = time.perf_counter()
+    for index in range(games):
+        game = play_game(rules, bot, seed + index, latencies)
+        moves += game.turns_played
+        if game.game_over:
+            winner = rules.winner(game)
+            winners[winner] = winners.get(winner, 0) + 1
+        else:
+            unfinished += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "seconds": elapsed,
+        "games_per_s": games / elapsed,
+        "moves_per_s": moves / elapsed,
+        "mean_moves": moves / games,
+        "turn_p50_ms": percentile(latencies, 50) * 1000,
+        "turn_p99_ms": percentile(latencies, 99) * 1000,
+        "unfinished": unfinished,
+        "winners": winners,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--bots", default="random,greedy", help="comma-separated: " + ", ".join(BOTS))
+    parser.add_argument("--rules", default=",".join(RULES), help="comma-separated: " + ", ".join(RULES))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for rules_name in args.rules.split(","):
+        rules = RULES[rules_name]()
+        for bot_name in args.bots.split(","):
+            result = results[f"{rules_name} / {bot_name}"] = run(rules, BOTS[bot_name], args.games, args.seed)
+            print(f"{rules.script:<22} {bot_name:>6} bots: {result['games_per_s']:8.2f} games/s "
+                  f"{result['moves_per_s']:9.0f} moves/s  turn p50 {result['turn_p50_ms']:.3f} ms "
+                  f"p99 {result['turn_p99_ms']:.3f} ms  {result['mean_moves']:.0f} moves/game, "
+                  f"{result['unfinished']} unfinished")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"version": 1, "seed": args.seed, "results": results}, file, indent=1)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
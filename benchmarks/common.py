@@ -0,0 +1,49 @@
+"""Helpers shared by the benchmark scripts."""
+
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from headless import StepClock, load_script  # noqa: E402,F401
+
+MAX_WAVES = 10000  # settle() gives up on chain reactions that cycle forever
+
+
+def time_call(function, repeat):
+    """Run function `repeat` times and return the mean time per call in seconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def time_runs(setup, function, repeat):
+    """Time `function(setup())` `repeat` times, leaving setup out. Returns the times in seconds."""
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def settle(cr, game, moving_blobs, clock):
+    """Let every blob land and the turn switch. Returns the number of waves, or None if it never ends."""
+    waves = 0
+    while moving_blobs or game.turn_pending:
+        if waves == MAX_WAVES:
+            return None
+        clock.step()
+        cr.update_game(game, moving_blobs)
+        waves += 1
+    return waves
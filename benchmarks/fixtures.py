@@ -0,0 +1,104 @@
+"""
+Seeded board fixtures for the CR_1.6.py benchmarks.
+
+Every builder takes the loaded script and a seed and returns a settled Game
+at the script's current board size. The same seed always gives the same board.
+build_pathological also builds boards for CR_0.8.py and for the frozen copies
+of both scripts in reference/.
+"""
+
+import random
+
+from common import StepClock, settle
+
+MID_GAME_MOVES = 40
+
+
+def playable_cells(cr, game):
+    return [(row, col) for row in range(cr.GRID_ROWS) for col in range(cr.GRID_COLS)
+            if not isinstance(game.grid[row][col], getattr(cr, "HQCell", ()))]
+
+
+def build_empty(cr, seed):
+    return cr.Game(seed)
+
+
+def build_mid_game(cr, seed, moves=MID_GAME_MOVES):
+    """Random valid moves from the start, each one resolved before the next."""
+    rng = random.Random(seed)
+    clock = StepClock()
+    cr.CLOCK = clock.now
+    game = cr.Game(seed)
+    moving_blobs = []
+    for _ in range(moves):
+        valid = [(row, col) for row in range(cr.GRID_ROWS) for col in range(cr.GRID_COLS)
+                 if game.is_valid_move(row, col)]
+        if game.game_over or not valid:
+            break
+        cr.make_move(game, *rng.choice(valid), moving_blobs)
+        if settle(cr, game, moving_blobs, clock) is None:
+            break
+    game.explosions.clear()
+    return game
+
+
+def build_saturated(cr, seed):
+    """Every cell one dot below critical mass, owners picked at random."""
+    rng = random.Random(seed)
+    game = cr.Game(seed)
+    game.turns_played = 2
+    for row, col in playable_cells(cr, game):
+        cell = game.grid[row][col]
+        cell.color = rng.choice([cr.RED, cr.BLUE])
+        cell.dots = game.get_critical_mass(row, col) - 1
+    return game
+
+
+def build_powerup_heavy(cr, seed):
+    """A third of the cells hold a powerup (mostly stars), the rest a dot or two."""
+    rng = random.Random(seed)
+    game = cr.Game(seed)
+    game.turns_played = 2
+    for row, col in playable_cells(cr, game):
+        cell = game.grid[row][col]
+        if rng.random() < 1 / 3:
+            cell.powerup = cr.POWERUP_STAR if rng.random() < 0.75 else cr.POWERUP_HEART
+        else:
+            cell.color = rng.choice([cr.RED, cr.BLUE])
+            cell.dots = rng.randint(1, max(1, game.get_critical_mass(row, col) - 2))
+    return game
+
+
+FIXTURES = {
+    "empty": build_empty,
+    "mid_game": build_mid_game,
+    "saturated": build_saturated,
+    "powerup_heavy": build_powerup_heavy,
+}
+
+
+def new_game(cr, seed):
+    """A Game of the script whose randomness comes from `seed`."""
+    if not hasattr(cr, "POWERUP_STAR"):
+        return cr.Game()  # CR_0.8.py's classic game draws nothing at random
+    if hasattr(cr, "engine"):
+        return cr.Game(seed)
+    cr.random = random.Random(seed)  # The reference CR_1.6.py predates seeded games
+    return cr.Game()
+
+
+def build_pathological(cr, seed, star_spacing=3):
+    """The worst case for chain reactions: a checkerboard of owners, every cell one dot below
+    critical mass, and (where the rules have powerups) stars on empty cells every `star_spacing`
+    rows down every `star_spacing`-th column, so one star sets off the rest of its column."""
+    game = new_game(cr, seed)
+    game.turns_played = 2
+    dots = "dots" if hasattr(game.grid[0][0], "dots") else "dot_count"
+    for row, col in playable_cells(cr, game):
+        cell = game.grid[row][col]
+        if hasattr(cr, "POWERUP_STAR") and col % star_spacing == 1 and row % star_spacing == 1:
+            cell.powerup = cr.POWERUP_STAR
+            continue
+        cell.color = cr.RED if (row + col) % 2 else cr.BLUE
+        setattr(cell, dots, game.get_critical_mass(row, col) - 1)
+    return game
@@ -0,0 +1,220 @@
+"""
+Long-session soak test of CR_1.6.py: many consecutive games in one process.
+
+    python benchmarks/soak.py [--minutes M] [--sample-every SECONDS] [--restart-chance P]
+                              [--board 9x9] [--seed S] [--output soak.jsonl] [--no-tracemalloc]
+
+Random bots play game after game through the real renderer under the SDL
+dummy driver, on a simulated clock at 60 frames per second of game time. Some
+games are abandoned part-way with the same restart the R key does. Every
+sample reports frame times, live Explosion/MovingBlob/Cell objects, the size
+of each cache and list that could grow, and tracemalloc growth since the
+first sample grouped by the function that allocated it ("subsystem").
+"""
+
+import argparse
+import ast
+import bisect
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from common import REPO_DIR, StepClock, load_script, percentile
+
+FPS = 60
+MOVE_EVERY = 10  # Frames between a settled board and the bot's next move
+HOLD_FRAMES = 60  # Frames a finished game stays on screen before the next one
+TOP_SUBSYSTEMS = 8
+
+
+def function_ranges(path):
+    """(first line, last line, qualified name) of every function in a source file, innermost last."""
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    ranges = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.ClassDef)):
+                name = prefix + child.name
+                if isinstance(child, ast.FunctionDef):
+                    ranges.append((child.lineno, child.end_lineno, name))
+                visit(child, name + ".")
+
+    visit(tree, "")
+    return sorted(ranges)
+
+
+class Subsystems:
+    """Maps an allocation site to the CR_1.6.py function it is in, or to the file name elsewhere."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.ranges = function_ranges(path)
+        self.starts = [first for first, _, _ in self.ranges]
+
+    def name(self, filename, lineno):
+        if os.path.abspath(filename) != self.path:
+            return os.path.basename(filename)
+        index = bisect.bisect_right(self.starts, lineno)
+        # Nested functions start later than their parent, so the nearest match is the innermost
+        for first, last, name in reversed(self.ranges[:index]):
+            if first <= lineno <= last:
+                return name
+        return "module level"
+
+    def group(self, snapshot):
+        # Leave out the soak loop's own bookkeeping
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, os.path.abspath(__file__))])
+        totals = {}
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            name = self.name(frame.filename, frame.lineno)
+            totals[name] = totals.get(name, 0) + stat.size
+        return totals
+
+
+def count_objects(cr):
+    classes = {cls: 0 for cls in (cr.Explosion, cr.MovingBlob, cr.Cell, cr.HQCell)}
+    for obj in gc.get_objects():
+        if type(obj) in classes:
+            classes[type(obj)] += 1
+    return {cls.__name__: count for cls, count in classes.items()}
+
+
+def container_sizes(cr, game, moving_blobs):
+    return {
+        "game.explosions": len(game.explosions),
+        "game.moves": len(game.moves),
+        "moving_blobs": len(moving_blobs),
+        "scorch tiles": len(cr.SCORCH_LAYER.tiles),
+        "scorch scaled tiles": len(cr.SCORCH_LAYER.scaled_tiles),
+        "board backgrounds": len(cr.BOARD_BACKGROUNDS),
+        "render_text cache": cr.render_text.cache_info().currsize,
+        "sprite atlases": cr.get_sprite_atlas.cache_info().currsize,
+        "profiler frames": len(cr.PROFILER.frame_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=60.0, help="wall-clock length of the run")
+    parser.add_argument("--sample-every", type=float, default=60.0, help="seconds between samples")
+    parser.add_argument("--restart-chance", type=float, default=0.02,
+                        help="chance per move of abandoning the game with a restart")
+    parser.add_argument("--board", default="9x9", help="ROWSxCOLS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="append every sample to this file as a JSON line")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip allocation tracing (faster)")
+    args = parser.parse_args()
+
+    cr = load_script("CR_1.6.py")
+    import pygame
+
+    cr.set_board_size(*(int(part) for part in args.board.lower().split("x")))
+    clock = StepClock()
+    cr.CLOCK = clock.now
+    rng = random.Random(args.seed)
+    subsystems = Subsystems(os.path.join(REPO_DIR, "CR_1.6.py"))
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+
+    viewport = cr.Viewport(cr.WINDOW_WIDTH, cr.WINDOW_HEIGHT)
+    viewport.fit_board()
+    renderer = cr.DirtyRenderer(cr.WINDOW, viewport)
+    moving_blobs = []
+    game = cr.restart_game(moving_blobs, renderer, rng.randrange(2 ** 32))
+
+    games = moves = frames = 0
+    idle_frames = 0
+    frame_times = []
+    baseline = None
+    # The first sample, the baseline for growth, comes after a warm-up period that fills the caches
+    start = time.perf_counter()
+    next_sample = start + args.sample_every
+    end = start + args.minutes * 60
+    output = open(args.output, "a") if args.output else None
+    try:
+        while True:
+            frame_start = time.perf_counter()
+            pygame.event.get()  # Like the game loop, so nothing piles up in the event queue
+            settled = not moving_blobs and not game.turn_pending and not game.explosions
+            idle_frames = idle_frames + 1 if settled else 0
+
+            if game.game_over and idle_frames >= HOLD_FRAMES:
+                games += 1
+                game = cr.restart_game(moving_blobs, renderer, rng.randrange(2 ** 32))
+            elif not game.game_over and settled and idle_frames >= MOVE_EVERY:
+                if game.moves and rng.random() < args.restart_chance:
+                    games += 1
+                    game = cr.restart_game(moving_blobs, renderer, rng.randrange(2 ** 32))
+                else:
+                    valid = [(row, col) for row in range(cr.GRID_ROWS) for col in range(cr.GRID_COLS)
+                             if game.is_valid_move(row, col)]
+                    if valid:
+                        cr.make_move(game, *rng.choice(valid), moving_blobs)
+                        moves += 1
+                    else:
+                        games += 1
+                        game = cr.restart_game(moving_blobs, renderer, rng.randrange(2 ** 32))
+                idle_frames = 0
+
+            cr.update_game(game, moving_blobs)
+            renderer.draw(game, moving_blobs)
+            clock.step(1 / FPS)
+            frames += 1
+            frame_times.append(time.perf_counter() - frame_start)
+
+            now = time.perf_counter()
+            if now < next_sample and now < end:
+                continue
+
+            gc.collect()
+            sample = {
+                "elapsed_s": round(now - start, 1),
+                "frames": frames,
+                "games": games,
+                "moves": moves,
+                "frame_ms": {
+                    "p50": percentile(frame_times, 50) * 1000,
+                    "p99": percentile(frame_times, 99) * 1000,
+                    "max": max(frame_times) * 1000,
+                },
+                "objects": count_objects(cr),
+                "containers": container_sizes(cr, game, moving_blobs),
+            }
+            if not args.no_tracemalloc:
+                sample["traced_kib"] = tracemalloc.get_traced_memory()[0] / 1024
+                totals = subsystems.group(tracemalloc.take_snapshot())
+                if baseline is None:
+                    baseline = totals
+                growth = {name: (size - baseline.get(name, 0)) / 1024 for name, size in totals.items()}
+                top = sorted(growth.items(), key=lambda item: -abs(item[1]))[:TOP_SUBSYSTEMS]
+                sample["growth_kib"] = {name: round(size, 1) for name, size in top if size}
+
+            print(f"{sample['elapsed_s']:8.0f} s {frames:9d} frames {games:6d} games  "
+                  f"frame p50 {sample['frame_ms']['p50']:.2f} p99 {sample['frame_ms']['p99']:.2f} ms  "
+                  f"traced {sample.get('traced_kib', 0):9.0f} KiB  objects {sample['objects']}")
+            if sample.get("growth_kib"):
+                print("          growth since first sample (KiB): "
+                      + ", ".join(f"{name} {size:+.1f}" for name, size in sample["growth_kib"].items()))
+            if output:
+                output.write(json.dumps(sample) + "\n")
+                output.flush()
+
+            frame_times.clear()
+            next_sample = now + args.sample_every
+            if now >= end:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Differential check of engine.py against the game scripts as they were before it.
+
+    python check_engine.py [--games N] [--seed S]
+
+reference/ holds frozen copies of CR_0.8.py and CR_1.6.py from before the
+scripts took their rules from engine.py; they are the oracle and are never
+edited. Seeded random games are played move by move with Engine.play_index()
+and in the reference script of the variant (CR_0.8.py for classic, CR_1.6.py
+for hq and hq_powerups), which resolves chain reactions through its own
+animated update loop. A step clock stands in for its time module and a
+seeded generator for its random module. After every move the valid moves,
+the board, the HQs, the player to move and the result must agree.
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import engine
+from headless import StepClock, load_script
+
+MAX_TURNS = 400
+MAX_WAVES = 2000
+
+
+class ReferenceRandom:
+    """The random module of the reference CR_1.6.py.
+
+    Its powerup spawns are the only draws engine.py makes, and come from the
+    game's seed. The explosion particles draw from a generator of their own,
+    as the current CR_1.6.py does.
+    """
+
+    def __init__(self, seed):
+        spawns = random.Random(seed)
+        particles = random.Random(seed)
+        self.choice = spawns.choice
+        self.uniform = particles.uniform
+        self.random = particles.random
+
+
+class HQScript:
+    """The reference CR_1.6.py, with powerup spawns switched off for the hq variant."""
+
+    def __init__(self, powerups):
+        self.cr = load_script(os.path.join("reference", "CR_1.6.py"), "reference_cr_1_6")
+        self.powerups = powerups
+        self.clock = StepClock()
+        self.colors = {None: engine.NONE, self.cr.RED: engine.RED, self.cr.BLUE: engine.BLUE}
+        self.kinds = {None: engine.NO_POWERUP, self.cr.POWERUP_STAR: engine.STAR,
+                      self.cr.POWERUP_HEART: engine.HEART}
+
+    def new_game(self, game):
+        cr = self.cr
+        if (game.rows, game.cols) != (cr.GRID_ROWS, cr.GRID_COLS):
+            raise ValueError(f"the reference CR_1.6.py only plays {cr.GRID_ROWS}x{cr.GRID_COLS}")
+        cr.time = SimpleNamespace(time=self.clock.now)
+        cr.random = ReferenceRandom(game.seed)
+        cr.POWERUP_SPAWN_CHANCE = 1 / game.spawn_interval
+        cr.MAX_POWERUP_SPAWNS = game.variant.max_powerup_spawns if self.powerups else 0
+        self.game = cr.Game()
+        self.moving_blobs = []
+
+    def valid_moves(self):
+        return [row * self.cr.GRID_COLS + col for row in range(self.cr.GRID_ROWS)
+                for col in range(self.cr.GRID_COLS) if self.game.is_valid_move(row, col)]
+
+    def play(self, row, col):
+        cr = self.cr
+        cr.make_move(self.game, row, col, self.moving_blobs)
+        for _ in range(MAX_WAVES):
+            if not self.moving_blobs and not self.game.turn_pending:
+                cr.update_game(self.game, self.moving_blobs)  # The winner check of the next frame
+                return True
+            self.clock.step()
+            cr.update_game(self.game, self.moving_blobs)
+        return False
+
+    def state(self):
+        game = self.game
+        cells = [(0 if isinstance(cell, self.cr.HQCell) else cell.dots,
+                  self.colors[cell.color] if not isinstance(cell, self.cr.HQCell) else engine.NONE,
+                  self.kinds[cell.powerup])
+                 for row in game.grid for cell in row]
+        return {
+            "cells": cells,
+            "hq_health": (game.red_hq_health, game.blue_hq_health),
+            "current_player": self.colors[game.current_player],
+            "game_over": game.game_over,
+            "winner": self.colors.get(game.winner, engine.NONE),
+        }
+
+
+class ClassicScript:
+    """The reference CR_0.8.py."""
+
+    def __init__(self):
+        self.cr = load_script(os.path.join("reference", "CR_0.8.py"), "reference_cr_0_8")
+        self.clock = StepClock()
+        self.colors = {None: engine.NONE, self.cr.RED: engine.RED, self.cr.BLUE: engine.BLUE}
+
+    def new_game(self, game):
+        cr = self.cr
+        if (game.rows, game.cols) != (cr.GRID_ROWS, cr.GRID_COLS):
+            raise ValueError(f"the reference CR_0.8.py only plays {cr.GRID_ROWS}x{cr.GRID_COLS}")
+        cr.time = SimpleNamespace(time=self.clock.now)
+        self.game = cr.Game()
+        self.moving_dots = []
+
+    def valid_moves(self):
+        return [row * self.cr.GRID_COLS + col for row in range(self.cr.GRID_ROWS)
+                for col in range(self.cr.GRID_COLS) if self.game.is_valid_move(row, col)]
+
+    def play(self, row, col):
+        self.cr.handle_player_move(self.game, row, col, self.moving_dots)
+        for _ in range(MAX_WAVES):
+            self.clock.step()
+            self.cr.update_game_state(self.game, self.moving_dots)
+            if not self.moving_dots:
+                return True
+        return False
+
+    def state(self):
+        game = self.game
+        return {
+            "cells": [(cell.dot_count, self.colors[cell.color], engine.NO_POWERUP)
+                      for row in game.grid for cell in row],
+            "hq_health": (0, 0),
+            "current_player": self.colors[game.current_player],
+            "game_over": game.game_over,
+            "winner": self.colors.get(game.winner, engine.NONE),
+        }
+
+
+def engine_state(game):
+    hqs = (game.board.red_hq, game.board.blue_hq) if game.hqs else ()
+    return {
+        "cells": [(dots, engine.NONE if index in hqs else owner, powerup)
+                  for index, (dots, owner, powerup) in enumerate(zip(game.dots, game.owner, game.powerup))],
+        "hq_health": (game.red_hq_health, game.blue_hq_health),
+        "current_player": game.current_player,
+        "game_over": game.game_over,
+        "winner": game.winner,
+    }
+
+
+def describe(expected, actual, cols):
+    lines = []
+    for key in expected:
+        if key == "cells":
+            for index, (old, new) in enumerate(zip(expected["cells"], actual["cells"])):
+                if old != new:
+                    lines.append(f"  cell {divmod(index, cols)}: script {old}, engine {new}")
+        elif expected[key] != actual[key]:
+            lines.append(f"  {key}: script {expected[key]}, engine {actual[key]}")
+    return "\n".join(lines[:12])
+
+
+def check_game(variant, script, seed):
+    """Play one game in both. Returns (moves compared, None) or (moves, description of the mismatch)."""
+    rng = random.Random(seed)
+    game = engine.Engine(variant, seed=seed)
+    script.new_game(game)
+    for turn in range(MAX_TURNS):
+        if game.game_over:
+            return turn, None
+        moves = game.valid_moves()
+        script_moves = script.valid_moves()
+        if moves != script_moves:
+            return turn, f"  valid moves: script {script_moves}, engine {moves}"
+        if not moves:
+            return turn, None
+        index = rng.choice(moves)
+        game.play_index(index)
+        if not script.play(*divmod(index, game.cols)):
+            # CR_0.8.py never ends a reaction that has taken the whole board; the engine
+            # declares the winner instead, so only the result is compared
+            if game.game_over and variant == "classic":
+                return turn + 1, None
+            return turn + 1, "  the script's chain reaction did not settle"
+        expected = script.state()
+        actual = engine_state(game)
+        if game.game_over and variant == "classic":
+            # The engine stops the reaction as soon as one color is left, so the boards may differ
+            expected = {key: expected[key] for key in ("game_over", "winner")}
+            actual = {key: actual[key] for key in ("game_over", "winner")}
+        if expected != actual:
+            return turn + 1, f"after move {turn + 1} {divmod(index, game.cols)}:\n" + describe(expected, actual, game.cols)
+    return MAX_TURNS, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=20, help="games per variant")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    scripts = {"classic": ClassicScript(), "hq": HQScript(powerups=False), "hq_powerups": HQScript(powerups=True)}
+    failures = 0
+    for variant, script in scripts.items():
+        total_moves = 0
+        for seed in range(args.seed, args.seed + args.games):
+            # The reference scripts print on game over and on every winner check
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                moves, mismatch = check_game(variant, script, seed)
+            total_moves += moves
+            if mismatch:
+                failures += 1
+                print(f"{variant} seed {seed} differs {mismatch}")
+        print(f"{variant:<12} {args.games} games, {total_moves} moves compared")
+    if failures:
+        print(f"{failures} games differ")
+        sys.exit(1)
+    print("engine matches the reference scripts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Chain Reaction rules without pygame, for every variant of the game scripts.
+
+    from engine import Engine
+    game = Engine("hq_powerups", seed=7)
+    game.make_move(7, 4)
+
+Variants:
+
+    classic       CR_0.8.py: 9x7 board, red moves first, any empty or own cell,
+                  a player wins by being the only color left
+    hq            CR_1.6.py without powerups: HQs with health, blue moves first,
+                  restricted openings and moves next to your own dots
+    hq_powerups   CR_1.6.py: HQs plus star and heart powerups
+
+CR_0.8.py and CR_1.6.py play through this engine and only animate it:
+start_move() plays the clicked cell, land_wave() resolves one wave of the
+chain reaction (every dot in flight lands, then every cell that reached
+critical mass explodes) and finish_move() passes the turn. Only these two
+scripts are covered: the older ones (the alphas and CR_1.0 to CR_1.5) are
+earlier drafts kept as they were, with rules of their own that this engine
+does not reproduce and nothing checks.
+
+The board is kept in flat lists indexed by row * cols + col, with the
+neighbors and critical masses worked out once per board size. The landing
+order within a wave is fixed, so seeded powerup spawns and recorded games
+come out exactly the same. check_engine.py plays frozen copies of the
+scripts from before this engine (reference/) against play_index() move by
+move.
+"""
+
+import random
+
+NONE = 0
+RED = 1
+BLUE = 2
+
+NO_POWERUP = 0
+STAR = 1
+HEART = 2
+
+MAX_WAVES = 10000  # A reaction still running after this many waves is cut off
+# Raised whenever a seed and its moves stop giving the same game, so recordings can tell.
+# 2: HQ hits no longer draw from the game's generator (CR_1.6.py used to, for the particles)
+REPLAY_VERSION = 2
+
+
+class Variant:
+    """Rule settings of one game variant."""
+
+    def __init__(self, name, rows, cols, first_player, hq_health=0, powerups=False,
+                 neighbor_offsets=((-1, 0), (1, 0), (0, -1), (0, 1)), max_powerup_spawns=60):
+        self.name = name
+        self.rows = rows
+        self.cols = cols
+        self.first_player = first_player
+        self.hq_health = hq_health  # 0 means no HQs: elimination rules
+        self.powerups = powerups
+        # Order in which an exploding cell sends its dots, which is the landing order of the next wave
+        self.neighbor_offsets = neighbor_offsets
+        self.max_powerup_spawns = max_powerup_spawns
+
+
+VARIANTS = {
+    "classic": Variant("classic", 9, 7, RED),
+    "hq": Variant("hq", 9, 9, BLUE, hq_health=5,
+                  neighbor_offsets=((0, 1), (1, 0), (0, -1), (-1, 0))),
+    "hq_powerups": Variant("hq_powerups", 9, 9, BLUE, hq_health=5, powerups=True,
+                           neighbor_offsets=((0, 1), (1, 0), (0, -1), (-1, 0))),
+}
+
+
+def default_spawn_interval(seed):
+    """Moves between powerup spawns, drawn the way CR_1.6.py draws it but from the seed."""
+    return int(5 + random.Random(seed).random() * 2)
+
+
+class Board:
+    """Neighbor lists and critical masses of one board size and variant, shared by all its games."""
+
+    def __init__(self, variant, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.coords = [(index // cols, index % cols) for index in range(self.size)]
+        self.neighbors = []
+        self.all_neighbors = []
+        self.critical = []
+        for row, col in self.coords:
+            self.neighbors.append(tuple((row + dr) * cols + col + dc for dr, dc in variant.neighbor_offsets
+                                        if 0 <= row + dr < rows and 0 <= col + dc < cols))
+            self.all_neighbors.append(tuple((row + dr) * cols + col + dc
+                                            for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                                            if (dr or dc) and 0 <= row + dr < rows and 0 <= col + dc < cols))
+            edges = (row in (0, rows - 1)) + (col in (0, cols - 1))
+            self.critical.append(4 - edges)
+        # CR_1.6.py puts the HQs in the middle of the first and last rows
+        self.red_hq = cols // 2
+        self.blue_hq = (rows - 1) * cols + cols // 2
+        self.columns = [[row * cols + col for row in range(rows)] for col in range(cols)]
+        middle = cols // 2
+        # Powerups spawn away from the HQ columns and the first and last rows
+        self.spawn_cells = [row * cols + col for row in range(1, rows - 1)
+                            for col in list(range(0, middle - 1)) + list(range(middle + 2, cols))]
+
+
+BOARDS = {}
+
+
+def get_board(variant, rows, cols):
+    key = (variant.name, rows, cols)
+    board = BOARDS.get(key)
+    if board is None:
+        board = BOARDS[key] = Board(variant, rows, cols)
+    return board
+
+
+class Engine:
+    """One game. Rows and columns are counted from the top left, as in the scripts."""
+
+    def __init__(self, variant="hq_powerups", seed=None, rows=None, cols=None, spawn_interval=None,
+                 hq_health=None):
+        self.variant = VARIANTS[variant] if isinstance(variant, str) else variant
+        rows = rows or self.variant.rows
+        cols = cols or self.variant.cols
+        self.board = get_board(self.variant, rows, cols)
+        self.rows = rows
+        self.cols = cols
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.spawn_interval = spawn_interval or default_spawn_interval(seed)
+
+        size = self.board.size
+        self.dots = [0] * size
+        self.owner = [NONE] * size
+        self.powerup = [NO_POWERUP] * size
+        self.current_player = self.variant.first_player
+        self.turns_played = 0
+        self.moves = []  # Cell indices of the accepted moves
+        self.game_over = False
+        self.winner = NONE
+        self.powerup_spawns = 0
+        self.max_hq_health = hq_health if hq_health is not None else self.variant.hq_health
+        self.hqs = self.max_hq_health > 0
+        self.red_hq_health = self.blue_hq_health = self.max_hq_health
+        if self.hqs:
+            self.owner[self.board.red_hq] = RED
+            self.owner[self.board.blue_hq] = BLUE
+        # What the last move did, for statistics
+        self.waves = 0
+        self.exploded = 0
+        self.hq_hits = 0
+        self.powerups_taken = 0
+        self.explosion_counts = [0] * size  # Explosions per cell over the whole game
+        self.wave_log = None  # Set to a list to get [cell, color, cell, color, ...] of every wave of each move
+        self.hit_log = None  # Set to a list to get the cell of every HQ hit, in order
+        self.powerups_by_kind = [0, 0, 0]  # Powerups taken over the whole game, indexed by kind
+        self.in_flight = None  # (cell, color) of the dots in flight while a move resolves
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def is_hq(self, index):
+        return self.hqs and (index == self.board.red_hq or index == self.board.blue_hq)
+
+    def is_empty(self, index):
+        return self.dots[index] == 0 and not self.is_hq(index)
+
+    def is_near_critical(self, index):
+        return self.dots[index] != 0 and self.dots[index] == self.board.critical[index] - 1
+
+    def is_valid_move(self, row, col):
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return False
+        return self.is_valid_index(row * self.cols + col)
+
+    def is_valid_index(self, index):
+        if self.game_over:
+            return False
+        player = self.current_player
+        owner = self.owner[index]
+        if not self.hqs:
+            return self.dots[index] == 0 or owner == player
+
+        board = self.board
+        if index == board.red_hq or index == board.blue_hq:
+            return False
+        row = index // self.cols
+        # Your own HQ row: only empty cells or your own dots
+        if (player == RED and row == 0) or (player == BLUE and row == self.rows - 1):
+            return self.dots[index] == 0 or owner == player
+        # Opening moves go on the row in front of your HQ
+        if self.turns_played < 2:
+            return row == (1 if player == RED else self.rows - 2)
+        if self.dots[index]:
+            return owner == player
+        own_hq = board.red_hq if player == RED else board.blue_hq
+        for neighbor in board.all_neighbors[index]:
+            if neighbor == own_hq or (self.dots[neighbor] and self.owner[neighbor] == player):
+                return True
+        return False
+
+    def valid_moves(self):
+        """Indices of every cell the current player may play."""
+        return [index for index in range(self.board.size) if self.is_valid_index(index)]
+
+    def make_move(self, row, col):
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return False
+        return self.play_index(row * self.cols + col)
+
+    def play_index(self, index):
+        """Play a move and resolve its chain reaction. Returns False for an invalid move."""
+        if not self.start_move(index):
+            return False
+        while self.in_flight:
+            self.land_wave()
+        self.finish_move()
+        return True
+
+    def start_move(self, index):
+        """Play a move up to its own explosion, whose dots are left in `in_flight`.
+
+        land_wave() then resolves the chain reaction one wave at a time and
+        finish_move() ends the turn, for callers that animate the waves or
+        spread them out. Returns False for an invalid move, or while the last
+        move is still resolving.
+        """
+        if self.in_flight is not None or not self.is_valid_index(index):
+            return False
+        self.waves = self.exploded = self.hq_hits = self.powerups_taken = 0
+        if self.wave_log is not None:
+            self.wave_log = [[]]  # The move's own explosion is wave 0
+        deliveries = []
+        if self.powerup[index]:
+            self.handle_powerup(index)
+            self.powerup[index] = NO_POWERUP
+        elif self.add_dot(index, self.current_player):
+            self.explode(index, deliveries)
+        self.turns_played += 1
+        self.moves.append(index)
+
+        if self.variant.powerups and self.turns_played % self.spawn_interval == 0:
+            self.spawn_powerup()
+        self.in_flight = deliveries
+        return True
+
+    def land_wave(self):
+        """Land every dot in flight, then explode each cell that reached critical mass."""
+        if self.waves == MAX_WAVES:
+            # Only a board taken over by one player cycles forever
+            if not self.game_over:
+                self.game_over = True
+                self.winner = NONE
+            self.in_flight = []
+            return
+        self.waves += 1
+        coords = self.board.coords
+        # A set of (row, col) like the scripts, so the cells explode in the same order
+        cells_to_check = set()
+        for index, color in self.in_flight:
+            if self.add_dot(index, color):
+                cells_to_check.add(coords[index])
+        deliveries = self.in_flight = []
+        if self.wave_log is not None and cells_to_check:
+            self.wave_log.append([])
+        cols = self.cols
+        for row, col in cells_to_check:
+            self.explode(row * cols + col, deliveries)
+        if self.hqs:
+            self.check_hqs()
+        elif deliveries and self.turns_played > 1 and self.check_elimination():
+            # CR_0.8.py kept the explosions going forever; the game is already decided
+            deliveries.clear()
+
+    def finish_move(self):
+        """End the turn once nothing is in flight: check for a winner and pass the move on."""
+        self.in_flight = None
+        if self.hqs:
+            self.check_hqs()
+        elif self.turns_played > 1:
+            self.check_elimination()
+        self.current_player = BLUE if self.current_player == RED else RED
+
+    def add_dot(self, index, color):
+        """Land one dot. Returns True when the cell reached critical mass."""
+        if self.hqs:
+            board = self.board
+            if index == board.red_hq or index == board.blue_hq:
+                if index == board.red_hq and color == BLUE:
+                    self.red_hq_health -= 1
+                elif index == board.blue_hq and color == RED:
+                    self.blue_hq_health -= 1
+                else:
+                    return False
+                self.hq_hits += 1  # Hearts damage HQs too, but only dots landing on one are hits
+                self.hq_explosion(index)
+                return False
+            if self.powerup[index]:
+                self.handle_powerup(index)
+                self.powerup[index] = NO_POWERUP
+        self.owner[index] = color
+        self.dots[index] += 1
+        return self.dots[index] >= self.board.critical[index]
+
+    def explode(self, index, deliveries):
+        if self.dots[index] < self.board.critical[index]:
+            return
+        color = self.owner[index]
+        self.dots[index] = 0
+        self.owner[index] = NONE
+        self.powerup[index] = NO_POWERUP
+        self.exploded += 1
+        self.explosion_counts[index] += 1
+        if self.wave_log is not None:
+            self.wave_log[-1] += (index, color)
+        for neighbor in self.board.neighbors[index]:
+            deliveries.append((neighbor, color))
+
+    def hq_explosion(self, index):
+        if self.hit_log is not None:
+            self.hit_log.append(index)
+
+    def handle_powerup(self, index):
+        """A powerup taken by the current player, as handle_powerup in CR_1.6.py does it."""
+        color = self.current_player
+        kind = self.powerup[index]
+        self.powerups_taken += 1
+        self.powerups_by_kind[kind] += 1
+        if kind == HEART:
+            self.heart(color)
+            return
+        if kind != STAR:
+            return
+
+        # A star adds a dot of your color to every empty or own cell in its column
+        powerup_cells = []
+        for cell in self.board.columns[index % self.cols]:
+            if self.is_hq(cell):
+                continue
+            if self.powerup[cell]:
+                powerup_cells.append(cell)
+            owner = self.owner[cell]
+            if (self.dots[cell] == 0 or owner == color or not self.is_near_critical(cell)) \
+                    and (owner == NONE or owner == color):
+                self.owner[cell] = color
+                self.dots[cell] += 1
+        # Other powerups in the column are used up: hearts take effect, stars do nothing more
+        for cell in powerup_cells:
+            kind = self.powerup[cell]
+            if kind:
+                self.powerup[cell] = NO_POWERUP
+                if cell != index:
+                    self.powerups_taken += 1
+                    self.powerups_by_kind[kind] += 1
+                if kind == HEART:
+                    self.heart(color)
+
+    def heart(self, color):
+        """Heal your HQ, or damage the other one when yours is at full health."""
+        if color == RED:
+            if self.red_hq_health < self.max_hq_health:
+                self.red_hq_health += 1
+                return
+            self.blue_hq_health -= 1
+            self.hq_explosion(self.board.blue_hq)
+            if self.blue_hq_health <= 0:
+                self.game_over = True
+                self.winner = RED
+        else:
+            if self.blue_hq_health < self.max_hq_health:
+                self.blue_hq_health += 1
+                return
+            self.red_hq_health -= 1
+            self.hq_explosion(self.board.red_hq)
+            if self.red_hq_health <= 0:
+                self.game_over = True
+                self.winner = BLUE
+
+    def spawn_powerup(self):
+        if self.powerup_spawns >= self.variant.max_powerup_spawns:
+            return
+        dots = self.dots
+        all_neighbors = self.board.all_neighbors
+        hqs = (self.board.red_hq, self.board.blue_hq) if self.hqs else ()
+        empty_cells = [index for index in self.board.spawn_cells
+                       if not dots[index] and index not in hqs
+                       and not any(dots[neighbor] or neighbor in hqs for neighbor in all_neighbors[index])]
+        if empty_cells:
+            index = self.rng.choice(empty_cells)
+            self.powerup[index] = self.rng.choice([STAR, HEART])
+            self.powerup_spawns += 1
+
+    def check_hqs(self):
+        # The player whose move it is wins, as in update_game of CR_1.6.py
+        if not self.game_over and (self.red_hq_health <= 0 or self.blue_hq_health <= 0):
+            self.game_over = True
+            self.winner = self.current_player
+
+    def check_elimination(self):
+        """Classic rules: the game ends when only one color is left on the board."""
+        colors = {owner for owner, dots in zip(self.owner, self.dots) if dots}
+        if len(colors) == 1:
+            self.game_over = True
+            self.winner = colors.pop()
+            return True
+        return False
@@ -0,0 +1,233 @@
+"""
+Render a Chain Base game (CR_1.6.py) offscreen to PNG frames or a video.
+
+    python export_video.py frames/ --recording game.json
+    python export_video.py reel.mp4 --recording game.json --fps 60
+    python export_video.py frames/ --random-game 7
+
+Recordings come from `python CR_1.6.py --record game.json`. Frames are drawn
+under the SDL dummy driver with a simulated clock, so export runs as fast as
+rendering allows. Each frame is read out with pygame.surfarray and handed to
+a pool of worker processes (PNG) or a background ffmpeg process (video), so
+rendering and encoding overlap.
+"""
+
+import argparse
+import collections
+import json
+import os
+import queue
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+from headless import StepClock, load_script
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".mov", ".gif")
+MAX_MOVES = 2000  # Random games stop here even without a winner
+PNG_COMPRESSION = 1  # zlib level; frames are mostly flat color, so fast compression is nearly as small
+
+
+def write_png(path, frame):
+    """Encode a (width, height, 3) uint8 surfarray frame as an RGB PNG."""
+    import numpy
+
+    rows = numpy.ascontiguousarray(frame.transpose(1, 0, 2))
+    height, width = rows.shape[:2]
+    # Every scanline starts with filter type 0 (none)
+    scanlines = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)
+    scanlines[:, 1:] = rows.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", header))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes(), PNG_COMPRESSION)))
+        file.write(chunk(b"IEND", b""))
+
+
+class PngSink:
+    """Writes numbered PNG files from a process pool, with a bounded number of frames in flight."""
+
+    def __init__(self, directory, workers):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.pending = collections.deque()
+        self.max_pending = workers * 2
+        self.count = 0
+
+    def write(self, frame):
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft().result()
+        path = os.path.join(self.directory, f"frame_{self.count:06d}.png")
+        self.pending.append(self.pool.submit(write_png, path, frame))
+        self.count += 1
+
+    def close(self):
+        for future in self.pending:
+            future.result()
+        self.pool.shutdown()
+
+
+class FfmpegSink:
+    """Streams raw RGB frames to an ffmpeg process from a writer thread."""
+
+    def __init__(self, path, width, height, fps):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise SystemExit("ffmpeg was not found; export PNG frames to a directory instead")
+        command = [ffmpeg, "-loglevel", "error", "-y",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+                   "-i", "-"]
+        if not path.endswith(".gif"):
+            command += ["-pix_fmt", "yuv420p"]
+        self.process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+        self.frames = queue.Queue(maxsize=64)
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+        self.count = 0
+
+    def feed(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            self.process.stdin.write(frame.transpose(1, 0, 2).tobytes())
+        self.process.stdin.close()
+
+    def write(self, frame):
+        self.frames.put(frame)
+        self.count += 1
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        if self.process.wait() != 0:
+            raise SystemExit("ffmpeg failed")
+
+
+def recorded_moves(recording):
+    for row, col in recording["moves"]:
+        yield row, col
+
+
+def random_moves(cr, game, seed):
+    """Random valid moves; uses its own generator so the rules' random stream is untouched."""
+    rng = random.Random(seed)
+    for _ in range(MAX_MOVES):
+        moves = [(row, col) for row in range(cr.GRID_ROWS) for col in range(cr.GRID_COLS)
+                 if game.is_valid_move(row, col)]
+        if not moves:
+            return
+        yield rng.choice(moves)
+
+
+def export_game(cr, recording, moves, sink, surface, fps, hold):
+    """Play the game and push every frame to `sink`. `moves(game)` returns an iterator of moves."""
+    import pygame
+
+    cr.set_board_size(*recording["board"])
+    clock = StepClock()
+    cr.CLOCK = clock.now
+    cr.reset_scorch_layer()
+    game = cr.start_recorded_game(recording["seed"], recording["spawn_interval"])
+    moving_blobs = []
+
+    width, height = surface.get_size()
+    viewport = cr.Viewport(width, height)
+    viewport.cell_px = max(cr.MIN_CELL_PX, min(width // cr.GRID_COLS, height // cr.GRID_ROWS))
+    viewport.clamp()
+
+    def render_frame():
+        cr.update_game(game, moving_blobs)
+        cr.draw_game(game, viewport, surface)
+        visible_blobs = cr.update_visible_blobs(moving_blobs, viewport, clock.now())
+        cr.draw_moving_blobs(surface, visible_blobs, viewport)
+        sink.write(pygame.surfarray.array3d(surface))
+        clock.step(1 / fps)
+
+    def settle():
+        while moving_blobs or game.turn_pending or game.explosions:
+            render_frame()
+        # At least one frame per move, so every position is shown
+        for _ in range(max(1, int(hold * fps))):
+            render_frame()
+
+    # Moves are drawn only once the board has settled, so bots see the real position
+    pending_moves = moves(game)
+    while not game.game_over:
+        settle()
+        move = next(pending_moves, None) if not game.game_over else None
+        if move is None:
+            break
+        if not cr.make_move(game, move[0], move[1], moving_blobs):
+            raise SystemExit(f"move {len(game.moves)} {tuple(move)} is not valid here; the recording does not match")
+    settle()
+    return game
+
+
+def parse_size(text):
+    width, height = (int(part) for part in text.lower().split("x"))
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="directory for PNG frames, or a video file (.mp4, .webm, ...)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--recording", help="JSON recording made with CR_1.6.py --record")
+    source.add_argument("--random-game", type=int, metavar="SEED", help="export a game of random moves")
+    parser.add_argument("--board", default="9x9", help="board size for --random-game (ROWSxCOLS)")
+    parser.add_argument("--size", type=parse_size, default=(700, 700), help="frame size WIDTHxHEIGHT")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--hold", type=float, default=0.3, help="seconds to pause between moves")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="PNG encoder processes")
+    args = parser.parse_args()
+
+    cr = load_script("CR_1.6.py")
+    import pygame
+
+    if args.recording:
+        with open(args.recording) as file:
+            recording = json.load(file)
+        moves = lambda game: recorded_moves(recording)
+    else:
+        rows, cols = (int(part) for part in args.board.lower().split("x"))
+        spawn_interval = engine.default_spawn_interval(args.random_game)
+        recording = {"board": [rows, cols], "seed": args.random_game, "spawn_interval": spawn_interval}
+        moves = lambda game: random_moves(cr, game, args.random_game)
+
+    width, height = args.size
+    if args.output.lower().endswith(VIDEO_EXTENSIONS):
+        sink = FfmpegSink(args.output, width, height, args.fps)
+    else:
+        sink = PngSink(args.output, args.workers)
+
+    surface = pygame.Surface((width, height))
+    start = time.perf_counter()
+    try:
+        game = export_game(cr, recording, moves, sink, surface, args.fps, args.hold)
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - start
+
+    video_seconds = sink.count / args.fps
+    print(f"{len(game.moves)} moves, {sink.count} frames ({video_seconds:.1f} s of video) "
+          f"in {elapsed:.1f} s, {sink.count / elapsed:.1f} frames/s, "
+          f"{video_seconds / elapsed:.1f}x real time", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
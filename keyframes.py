@@ -0,0 +1,158 @@
+"""
+Keyframed replays: any turn of a logged game in at most K steps.
+
+    python keyframes.py build game.crlog game.crkf [--interval 32]
+    python keyframes.py seek game.crkf 250
+
+    replay = KeyframedReplay.build(record)
+    game = replay.position(250)        # an Engine of the board after move 250
+
+The game is played through once. Every `interval` turns the whole position
+is kept as a positions.py packed row (a keyframe); every turn in between
+keeps only the bytes of the packed position that the move changed. Seeking
+copies the keyframe at or before the turn and patches in at most
+interval - 1 deltas, without running the rules at all.
+
+A .crkf file is a NumPy .npz archive of those arrays plus the game record,
+so CR_1.6.py --replay can open it without re-playing the game.
+"""
+
+import argparse
+import time
+
+import numpy
+
+import engine
+import movelog
+import positions
+
+KEYFRAME_INTERVAL = 32
+
+
+class KeyframedReplay:
+    def __init__(self, record, interval, keyframes, offsets, values, starts):
+        self.record = record
+        self.interval = interval
+        self.codec = positions.PositionCodec(record.variant, record.rows, record.cols)
+        self.keyframes = keyframes  # (turns // interval + 1, size) packed positions
+        self.offsets = offsets  # Changed byte offsets of every turn, back to back
+        self.values = values  # New values of those bytes
+        self.starts = starts  # Turn t's delta is offsets[starts[t - 1]:starts[t]], starts[0] = 0
+
+    @property
+    def turns(self):
+        return len(self.starts) - 1
+
+    @classmethod
+    def build(cls, record, interval=KEYFRAME_INTERVAL):
+        """Play a GameRecord through once and keep its keyframes and deltas."""
+        game = record.new_game()
+        states = [positions.state(game)]
+        for number, index in enumerate(record.moves):
+            if not game.play_index(index):
+                raise ValueError(f"move {number + 1} (cell {index}) of seed {record.seed} is not valid")
+            states.append(positions.state(game))
+        codec = positions.PositionCodec(record.variant, record.rows, record.cols)
+        packed = codec.pack(states)
+
+        changed_turn, changed_offset = numpy.nonzero(packed[1:] != packed[:-1])
+        starts = numpy.zeros(len(packed), dtype=numpy.int64)
+        starts[1:] = numpy.cumsum(numpy.bincount(changed_turn, minlength=len(packed) - 1))
+        offsets = changed_offset.astype(numpy.uint8 if codec.size <= 256 else numpy.uint16)
+        values = packed[1:][changed_turn, changed_offset]
+        return cls(record, interval, packed[::interval].copy(), offsets, values, starts)
+
+    def seek(self, turn):
+        """The packed position after `turn` moves (0 is the start)."""
+        if not 0 <= turn <= self.turns:
+            raise IndexError(f"turn {turn} is outside 0-{self.turns}")
+        keyframe = turn // self.interval
+        position = self.keyframes[keyframe].copy()
+        starts = self.starts
+        for step in range(keyframe * self.interval, turn):
+            start, end = starts[step], starts[step + 1]
+            position[self.offsets[start:end]] = self.values[start:end]
+        return position
+
+    def position(self, turn):
+        return self.codec.decode(self.seek(turn).tobytes())
+
+    def save(self, path):
+        record = self.record
+        header = numpy.array([movelog.VARIANT_IDS.index(record.variant), record.rows, record.cols,
+                              record.hq_health, record.spawn_interval, record.seed, self.interval],
+                             dtype=numpy.uint64)
+        with open(path, "wb") as file:
+            numpy.savez_compressed(file, header=header, moves=numpy.array(list(record.moves), dtype=numpy.uint16),
+                                   keyframes=self.keyframes, offsets=self.offsets, values=self.values,
+                                   starts=self.starts)
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as archive:
+            variant, rows, cols, hq_health, spawn_interval, seed, interval = (int(value) for value in archive["header"])
+            record = movelog.GameRecord(movelog.VARIANT_IDS[variant], rows, cols, hq_health, spawn_interval,
+                                        seed, archive["moves"].tolist())
+            return cls(record, interval, archive["keyframes"], archive["offsets"], archive["values"],
+                       archive["starts"])
+
+
+def open_replay(path, interval=KEYFRAME_INTERVAL):
+    """A KeyframedReplay from a .crkf file, the first game of a .crlog log or a JSON recording."""
+    if path.endswith(".crkf"):
+        return KeyframedReplay.load(path)
+    if path.endswith(".crlog"):
+        record = next(movelog.read_log(path), None)
+        if record is None:
+            raise ValueError(f"{path} holds no games")
+    else:
+        import json
+
+        with open(path) as file:
+            record = movelog.from_recording(json.load(file))
+    return KeyframedReplay.build(record, interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="keyframe a game log or JSON recording")
+    build.add_argument("source")
+    build.add_argument("output")
+    build.add_argument("--interval", type=int, default=KEYFRAME_INTERVAL, help="turns between keyframes")
+    seek = commands.add_parser("seek", help="print the board after a turn")
+    seek.add_argument("replay")
+    seek.add_argument("turn", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        replay = open_replay(args.source, args.interval)
+        replay.save(args.output)
+        print(f"{replay.turns} turns, {len(replay.keyframes)} keyframes, {len(replay.offsets)} changed bytes; "
+              f"built in {time.perf_counter() - start:.2f} s")
+        return
+
+    replay = open_replay(args.replay)
+    start = time.perf_counter()
+    game = replay.position(args.turn)
+    elapsed = time.perf_counter() - start
+    symbols = {engine.NONE: ".", engine.RED: "r", engine.BLUE: "b"}
+    kinds = {engine.STAR: "*", engine.HEART: "+"}
+    for row in range(game.rows):
+        cells = []
+        for col in range(game.cols):
+            index = row * game.cols + col
+            if game.hqs and index in (game.board.red_hq, game.board.blue_hq):
+                cells.append("HQ")
+            elif game.powerup[index]:
+                cells.append(" " + kinds[game.powerup[index]])
+            else:
+                cells.append(f"{symbols[game.owner[index]]}{game.dots[index] or ' '}")
+        print(" ".join(cells))
+    print(f"turn {args.turn} of {replay.turns}; HQ health red {game.red_hq_health}, blue {game.blue_hq_health}; "
+          f"sought in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
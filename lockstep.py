@@ -0,0 +1,239 @@
+"""
+Deterministic lockstep play between two peers, without a server.
+
+    python lockstep.py host [--port 8766] [--variant hq_powerups] [--board 12x12] [--seed S]
+    python lockstep.py join HOST:PORT
+
+    peer = await host_match(port=8766)        # or: peer = await join_match("10.0.0.2", 8766)
+    await peer.play(index)                    # our move, played here and sent
+    index = await peer.receive()              # theirs, played here and checked
+
+Both peers run the same engine.py game; only the moves cross the network.
+The host picks the variant, board, seed and spawn interval and sends them in
+one JSON line. engine.py is deterministic given those and the moves (the
+powerup spawns come from the seed), so after that a turn is a single 12-byte
+frame: the turn number, the cell, and the CRC-32 of the packed position
+after the move (sync.checksum). The receiver plays the move and compares;
+the first turn at which the two positions differ raises Desync.
+
+The command line plays random moves on both ends, as a quick check of two
+machines against each other.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import time
+
+import engine
+import positions
+import sync
+
+DEFAULT_PORT = 8766
+VERSION = 1
+MOVE = struct.Struct("<III")  # turn, cell, checksum of the position after the move
+
+
+class Desync(Exception):
+    """The two peers' games no longer agree."""
+
+
+def hello_message(game, color):
+    """What the host sends: everything the guest needs to set up the same game, and the guest's color."""
+    return {"type": "hello", "version": VERSION, "variant": game.variant.name, "board": [game.rows, game.cols],
+            "seed": game.seed, "spawn_interval": game.spawn_interval, "hq_health": game.max_hq_health,
+            "color": sync.COLOR_NAMES[color]}
+
+
+def game_from_hello(message):
+    if message.get("type") != "hello" or message.get("version") != VERSION:
+        raise ValueError(f"not a lockstep version {VERSION} hello: {message}")
+    rows, cols = message["board"]
+    return engine.Engine(message["variant"], seed=message["seed"], rows=rows, cols=cols,
+                         spawn_interval=message["spawn_interval"], hq_health=message["hq_health"])
+
+
+class Lockstep:
+    """One side of a lockstep game, without the I/O: moves in and out as MOVE frames.
+
+    local() and remote() play a move whole. A game that resolves its moves a
+    wave at a time builds on frame(), read() and verify() instead.
+    """
+
+    def __init__(self, game, color):
+        self.game = game
+        self.color = color
+        self.codec = positions.PositionCodec(game.variant.name, game.rows, game.cols)
+
+    @property
+    def our_turn(self):
+        return self.game.current_player == self.color and not self.game.game_over
+
+    def local(self, index):
+        """Play one of our moves; returns the frame to send."""
+        if not self.our_turn:
+            raise ValueError(f"it is not {sync.COLOR_NAMES[self.color]}'s turn")
+        if not self.game.play_index(index):
+            raise ValueError(f"cell {index} is not a valid move")
+        return self.frame()
+
+    def remote(self, frame):
+        """Play the peer's move from its frame and check that both games still agree; returns the cell."""
+        turn, index, checksum = self.read(frame)
+        self.game.play_index(index)
+        self.verify(turn, checksum)
+        return index
+
+    def frame(self):
+        """The frame of the last move, once it has been resolved."""
+        game = self.game
+        return MOVE.pack(game.turns_played, game.moves[-1], sync.checksum(self.codec, game))
+
+    def read(self, frame):
+        """(turn, cell, checksum) of the peer's frame, checked to be its next move and a valid one here."""
+        game = self.game
+        turn, index, checksum = MOVE.unpack(frame)
+        if turn != game.turns_played + 1:
+            raise Desync(f"the peer played turn {turn}, expected turn {game.turns_played + 1}")
+        if game.current_player == self.color or index >= game.board.size or not game.is_valid_index(index):
+            raise Desync(f"the peer's move on turn {turn} (cell {index}) is not valid here")
+        return turn, index, checksum
+
+    def verify(self, turn, checksum):
+        """Compare our position after the peer's move with its checksum."""
+        if sync.checksum(self.codec, self.game) != checksum:
+            raise Desync(f"the positions differ after turn {turn}")
+
+
+class Peer:
+    """A Lockstep game over an asyncio stream."""
+
+    def __init__(self, reader, writer, game, color):
+        self.reader = reader
+        self.writer = writer
+        self.lockstep = Lockstep(game, color)
+        self.game = game
+        self.color = color
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    async def play(self, index):
+        frame = self.lockstep.local(index)
+        self.writer.write(frame)
+        self.bytes_sent += len(frame)
+        await self.writer.drain()
+
+    async def receive(self):
+        """The cell of the peer's next move, or None once it has left."""
+        try:
+            frame = await self.reader.readexactly(MOVE.size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        self.bytes_received += len(frame)
+        return self.lockstep.remote(frame)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def host_match(host="0.0.0.0", port=DEFAULT_PORT, variant="hq_powerups", rows=None, cols=None, seed=None,
+                     color=engine.RED):
+    """Wait for one guest and set up a game with it. The host plays `color`."""
+    game = engine.Engine(variant, seed=seed, rows=rows, cols=cols)
+    guest = asyncio.get_running_loop().create_future()
+
+    async def connected(reader, writer):
+        if guest.done():
+            writer.close()
+        else:
+            guest.set_result((reader, writer))
+
+    listener = await asyncio.start_server(connected, host, port)
+    try:
+        reader, writer = await guest
+    finally:
+        listener.close()
+    hello = json.dumps(hello_message(game, engine.RED + engine.BLUE - color)).encode() + b"\n"
+    writer.write(hello)
+    await writer.drain()
+    peer = Peer(reader, writer, game, color)
+    peer.bytes_sent = len(hello)
+    return peer
+
+
+async def join_match(host, port=DEFAULT_PORT):
+    reader, writer = await asyncio.open_connection(host, port)
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("the host closed the connection")
+    message = json.loads(line)
+    peer = Peer(reader, writer, game_from_hello(message), sync.COLORS[message["color"]])
+    peer.bytes_received = len(line)
+    return peer
+
+
+async def play_random(peer, rng, max_turns=2000):
+    """Random moves against the peer until the game ends; returns why it stopped."""
+    game = peer.game
+    while not game.game_over and game.turns_played < max_turns:
+        if peer.lockstep.our_turn:
+            moves = game.valid_moves()
+            if not moves:
+                return "no valid move"
+            await peer.play(rng.choice(moves))
+        elif await peer.receive() is None:
+            return "the peer left"
+    return "game over" if game.game_over else "turn limit"
+
+
+async def run(args):
+    if args.command == "host":
+        rows, cols = (int(side) for side in args.board.lower().split("x")) if args.board else (None, None)
+        print(f"waiting for a peer on port {args.port}")
+        peer = await host_match(port=args.port, variant=args.variant, rows=rows, cols=cols, seed=args.seed)
+    else:
+        host, port = args.address.rsplit(":", 1)
+        peer = await join_match(host, int(port))
+    game = peer.game
+    print(f"{game.variant.name} on {game.rows}x{game.cols}, seed {game.seed}, "
+          f"playing {sync.COLOR_NAMES[peer.color]}")
+    start = time.perf_counter()
+    try:
+        reason = await play_random(peer, random.Random(args.seed))
+    finally:
+        await peer.close()
+    elapsed = time.perf_counter() - start
+    winner = sync.COLOR_NAMES[game.winner] or "nobody"
+    print(f"{reason} after {game.turns_played} turns, {winner} won; "
+          f"{(peer.bytes_sent + peer.bytes_received) / max(game.turns_played, 1):.1f} bytes per turn "
+          f"both ways, {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    host = commands.add_parser("host", help="wait for a peer and pick the game")
+    host.add_argument("--port", type=int, default=DEFAULT_PORT)
+    host.add_argument("--variant", choices=sorted(engine.VARIANTS), default="hq_powerups")
+    host.add_argument("--board", help="ROWSxCOLS (default: the variant's)")
+    host.add_argument("--seed", type=int)
+    join = commands.add_parser("join", help="play the game of a host")
+    join.add_argument("address", metavar="HOST:PORT")
+    join.add_argument("--seed", type=int, help="seed of our random moves")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except Desync as error:
+        raise SystemExit(f"desync: {error}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Tens of thousands of turn-based matches in one process, each kept packed.
+
+    python matchhost.py [--port 8767] [--ws-port 8768] [--memory-budget 64] [--idle-hours 168] [--seed S]
+
+Made for correspondence play: a match outlives its players' connections,
+and a player takes their seat again with the token it came with. Between
+moves a match is its positions.py packed position (81 bytes on 9x9, seed
+included) and a tape of what its random generator has drawn, nothing more.
+A move is resolved on demand: the position is decoded into an engine.py
+game, the generator is brought back by replaying the tape from the seed,
+the move is played (server.WAVES_PER_TICK waves of its chain reaction at a
+time, as server.py does) and the result is packed again. PackedMatch.nbytes
+is the memory one match holds; new matches are refused once the total
+would pass the budget.
+A match nobody has been connected to for --idle-hours is dropped, so
+abandoned matches do not hold the budget forever.
+
+The protocol is server.py's, with these changes:
+
+    client  {"type": "resume", "match": 12, "token": "..."}   take your seat again, closing
+                                                              any connection that still holds it
+            {"type": "stats"}
+    server  "joined" carries the seat's "token", and a snapshot always follows it
+            {"type": "stats", "matches", "players_online", "matches_online", "expired",
+             "bytes", "per_match", "budget"}
+
+Leaving does not end a match; it is dropped once it is over or has sat idle.
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import secrets
+import sys
+import time
+from array import array
+
+import engine
+import positions
+import server
+import sync
+
+DEFAULT_PORT = 8767
+TOKEN_BYTES = 8
+DEFAULT_IDLE_HOURS = 7 * 24
+SWEEP_EVERY = 60  # Seconds between looks for idle matches, at most
+COLOR_NAMES = sync.COLOR_NAMES
+
+
+class RecordedRandom:
+    """Engine.rng for a packed match: draws from random.Random(seed) and notes each one on a tape.
+
+    The tape holds the length of every choice(), which is all it takes to
+    bring a fresh generator to the same state. engine.py draws only when it
+    spawns a powerup, two choices each time, so a whole game fits in a few
+    dozen bytes of tape.
+    """
+
+    def __init__(self, seed, tape):
+        self.generator = random.Random(seed)
+        self.tape = tape
+        for length in tape:
+            self.generator.choice(range(length))
+
+    def choice(self, seq):
+        self.tape.append(len(seq))
+        return self.generator.choice(seq)
+
+
+class PackedMatch:
+    __slots__ = ("number", "codec", "position", "tape", "tokens", "seats", "updated")
+
+    def __init__(self, number, codec, seed):
+        self.number = number
+        self.codec = codec  # Shared by every match on the same board
+        self.position = codec.encode(engine.Engine(codec.variant, seed=seed, rows=codec.rows, cols=codec.cols))
+        self.tape = array("i")
+        self.tokens = secrets.token_bytes(2 * TOKEN_BYTES)  # Red's, then blue's
+        self.seats = 0  # Taken colors, as a bit mask
+        self.updated = time.time()  # Last move, or last time a player came or went
+
+    @property
+    def key(self):
+        return self.codec.variant.name, self.codec.rows, self.codec.cols
+
+    @property
+    def nbytes(self):
+        """Memory held by this match alone (the codec is shared)."""
+        return sum(sys.getsizeof(part) for part in
+                   (self, self.position, self.tape, self.tokens, self.updated))
+
+    def game(self):
+        """The match as an engine.py game, with its random generator where it was."""
+        game = self.codec.decode(self.position)
+        game.rng = RecordedRandom(game.seed, self.tape)
+        return game
+
+    def store(self, game):
+        self.position = self.codec.encode(game)
+        self.updated = time.time()
+
+    def free_color(self):
+        first = self.codec.variant.first_player
+        for color in (first, engine.BLUE if first == engine.RED else engine.RED):
+            if not self.seats & color:
+                return color
+        return None
+
+    def token(self, color):
+        return self.tokens[(color - 1) * TOKEN_BYTES:color * TOKEN_BYTES].hex()
+
+
+class Host:
+    def __init__(self, seed=None, budget=None, idle_ttl=None):
+        self.matches = {}
+        self.waiting = {}  # (variant, rows, cols) -> match with a free seat
+        self.online = {}  # Match number -> {color: connection}, only while someone is connected
+        self.resolving = set()  # Numbers of the matches with a move part-way through its chain reaction
+        self.codecs = {}
+        self.numbers = itertools.count(1)
+        self.rng = random.Random(seed)
+        self.budget = budget  # Bytes, or None
+        self.idle_ttl = idle_ttl  # Seconds a match may sit with nobody connected, or None to keep it
+        self.bytes = 0  # nbytes of every match
+        self.connections = 0
+        self.expired = 0  # Matches dropped for sitting idle
+
+    def new_match(self, key):
+        """A new match with no one seated, or None when it would not fit in the budget."""
+        codec = self.codecs.get(key)
+        if codec is None:
+            codec = self.codecs[key] = positions.PositionCodec(*key)
+        match = PackedMatch(next(self.numbers), codec, self.rng.randrange(2 ** 32))
+        if self.budget is not None and self.bytes + match.nbytes > self.budget:
+            return None
+        self.matches[match.number] = match
+        self.bytes += match.nbytes
+        return match
+
+    def seat(self, key):
+        """A free seat on the board `key`: (match, color), or (None, None) when the host is full."""
+        match = self.waiting.pop(key, None) or self.new_match(key)
+        if match is None:
+            return None, None
+        color = match.free_color()
+        match.seats |= color
+        if match.free_color() is not None:
+            self.waiting[key] = match
+        return match, color
+
+    async def play(self, match, color, row, col):
+        """Resolve one move: the state message to publish, or an error string."""
+        if match.free_color() is not None:
+            return "the match has not started"
+        if match.number in self.resolving:
+            return "the last move is still being resolved"
+        game = match.game()
+        if game.game_over:
+            return "the game is over"
+        if game.current_player != color:
+            return "it is not your turn"
+        if not (isinstance(row, int) and isinstance(col, int) and 0 <= row < game.rows and 0 <= col < game.cols) \
+                or not game.is_valid_move(row, col):
+            return f"({row}, {col}) is not a valid move"
+        encoder = sync.DeltaEncoder(match.codec, game)
+        before = match.nbytes  # The move may lengthen the tape
+        game.wave_log = []
+        self.resolving.add(match.number)
+        try:
+            await server.resolve(game, row * game.cols + col)
+        finally:
+            self.resolving.discard(match.number)
+        match.store(game)
+        self.bytes += match.nbytes - before
+        message = {"type": "state", "match": match.number, "player": COLOR_NAMES[color], "move": [row, col],
+                   "exploded": game.exploded}
+        message.update(encoder.delta(game))
+        if game.game_over:
+            self.drop(match)
+        return message
+
+    def drop(self, match):
+        if self.matches.pop(match.number, None) is not None:
+            self.bytes -= match.nbytes
+        if self.waiting.get(match.key) is match:
+            del self.waiting[match.key]
+
+    def sweep(self, now=None):
+        """Drop the matches nobody has been connected to for idle_ttl seconds. Returns how many."""
+        if self.idle_ttl is None:
+            return 0
+        deadline = (now or time.time()) - self.idle_ttl
+        idle = [match for number, match in self.matches.items()
+                if match.updated < deadline and number not in self.online]
+        for match in idle:
+            self.drop(match)
+        self.expired += len(idle)
+        return len(idle)
+
+    async def sweep_idle(self):
+        while True:
+            await asyncio.sleep(min(SWEEP_EVERY, self.idle_ttl))
+            self.sweep()
+
+    def stats(self):
+        return {"type": "stats", "matches": len(self.matches),
+                "players_online": sum(len(seats) for seats in self.online.values()),
+                "matches_online": len(self.online), "expired": self.expired, "bytes": self.bytes,
+                "per_match": round(self.bytes / len(self.matches), 1) if self.matches else 0,
+                "budget": self.budget}
+
+    async def handle(self, connection):
+        """Serve one client until it disconnects; its match goes on without it."""
+        match = color = None
+        self.connections += 1
+        try:
+            async for message in connection.messages():
+                if match is not None and self.online.get(match.number, {}).get(color) is not connection:
+                    break  # The seat was resumed from another connection
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind in ("join", "resume") and match is None:
+                    match, color = await self.join(connection, message)
+                elif kind == "move" and match is not None:
+                    result = await self.play(match, color, message.get("row"), message.get("col"))
+                    if isinstance(result, str):
+                        await connection.send({"type": "error", "message": result})
+                    else:
+                        self.publish(match, result)
+                elif kind == "resync" and match is not None:
+                    await connection.send(self.snapshot_message(match))
+                elif kind == "stats":
+                    await connection.send(self.stats())
+                else:
+                    await connection.send({"type": "error", "message": f"unexpected message {kind!r}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if match is not None:
+                seats = self.online.get(match.number, {})
+                if seats.get(color) is connection:
+                    del seats[color]
+                if not seats:
+                    self.online.pop(match.number, None)
+                match.updated = time.time()  # The idle time runs from when the last player left
+            connection.close()
+            self.connections -= 1
+
+    async def join(self, connection, message):
+        if message["type"] == "resume":
+            match = self.matches.get(message.get("match"))
+            token = message.get("token")
+            color = next((color for color in (engine.RED, engine.BLUE)
+                          if match is not None and match.seats & color and isinstance(token, str)
+                          and secrets.compare_digest(match.token(color).encode(), token.encode())), None)
+            if color is None:
+                await connection.send({"type": "error", "message": "no seat in that match has this token"})
+                return None, None
+            previous = self.online.get(match.number, {}).get(color)
+            if previous is not None:
+                # Only the newest connection holds the seat
+                previous.write(server.encode_message({"type": "error",
+                                                      "message": "the seat was resumed from another connection"}))
+                previous.close()
+        else:
+            key, error = server.match_key(message)
+            if error:
+                await connection.send({"type": "error", "message": error})
+                return None, None
+            match, color = self.seat(key)
+            if match is None:
+                await connection.send({"type": "error", "message": "the host is full"})
+                return None, None
+        game = match.game()
+        self.online.setdefault(match.number, {})[color] = connection
+        match.updated = time.time()
+        await connection.send({"type": "joined", "match": match.number, "color": COLOR_NAMES[color],
+                               "variant": game.variant.name, "board": [game.rows, game.cols], "seed": game.seed,
+                               "spawn_interval": game.spawn_interval, "token": match.token(color)})
+        await connection.send(self.snapshot_message(match, game))
+        if message["type"] == "join" and match.free_color() is None:
+            self.publish(match, {"type": "start", "match": match.number})
+        return match, color
+
+    def snapshot_message(self, match, game=None):
+        return dict(sync.snapshot(match.codec, game or match.game()), type="snapshot", match=match.number)
+
+    def publish(self, match, message):
+        data = server.encode_message(message)
+        for connection in self.online.get(match.number, {}).values():
+            connection.write(data)
+
+    async def serve_tcp(self, host, port):
+        async def client_connected(reader, writer):
+            await self.handle(server.StreamConnection(reader, writer))
+
+        return await asyncio.start_server(client_connected, host, port)
+
+    async def serve_websocket(self, host, port):
+        import websockets
+
+        async def client_connected(websocket, path=None):
+            await self.handle(server.WebSocketConnection(websocket))
+
+        return await websockets.serve(client_connected, host, port)
+
+
+async def serve(host, port, ws_port, seed, budget, idle_ttl):
+    match_host = Host(seed, budget, idle_ttl)
+    await match_host.serve_tcp(host, port)
+    print(f"hosting matches on TCP {host}:{port}" + (f", at most {budget // 2 ** 20} MiB of them" if budget else ""))
+    if ws_port:
+        await match_host.serve_websocket(host, ws_port)
+        print(f"and on ws://{host}:{ws_port}")
+    # Until interrupted
+    await (match_host.sweep_idle() if idle_ttl else asyncio.Future())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ws-port", type=int, help="also serve WebSocket clients here (needs websockets)")
+    parser.add_argument("--memory-budget", type=float, metavar="MIB", help="refuse new matches past this much")
+    parser.add_argument("--idle-hours", type=float, default=DEFAULT_IDLE_HOURS,
+                        help="drop a match nobody has connected to for this long (0 keeps them)")
+    parser.add_argument("--seed", type=int, help="seed of the match seeds, for reproducible sessions")
+    args = parser.parse_args()
+    budget = int(args.memory_budget * 2 ** 20) if args.memory_budget else None
+    idle_ttl = args.idle_hours * 3600 if args.idle_hours > 0 else None
+    try:
+        asyncio.run(serve(args.host, args.port, args.ws_port, args.seed, budget, idle_ttl))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
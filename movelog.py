@@ -0,0 +1,191 @@
+"""
+Compact binary game logs and a headless replayer.
+
+    python movelog.py record games.crlog --games 10000 [--variant hq_powerups] [--seed S]
+    python movelog.py convert game.json games.crlog
+    python movelog.py replay games.crlog
+
+A log starts with MAGIC, whose last byte is engine.REPLAY_VERSION, and holds
+any number of games. Each game is a
+RECORD header (variant, board size, HQ health, spawn interval, RNG seed,
+number of moves) followed by the moves as cell indices (row * cols + col):
+one byte each on boards of up to 256 cells, two bytes on larger ones.
+Everything else, including the powerup spawns, is replayed from the seed
+by engine.py, so a typical 9x9 game takes well under 200 bytes.
+"""
+
+import argparse
+import json
+import random
+import struct
+import sys
+import time
+from array import array
+
+import engine
+
+MAGIC = b"CRLG" + bytes([engine.REPLAY_VERSION])
+RECORD = struct.Struct("<BBBBBQI")  # variant, rows, cols, HQ health, spawn interval, seed, moves
+VARIANT_IDS = ("classic", "hq", "hq_powerups")
+MAX_MOVES = 2000  # Random games stop here even without a winner
+
+
+class GameRecord:
+    """One logged game."""
+
+    def __init__(self, variant, rows, cols, hq_health, spawn_interval, seed, moves):
+        self.variant = variant
+        self.rows = rows
+        self.cols = cols
+        self.hq_health = hq_health
+        self.spawn_interval = spawn_interval
+        self.seed = seed
+        self.moves = moves  # Sequence of cell indices
+
+    @classmethod
+    def from_game(cls, game):
+        return cls(game.variant.name, game.rows, game.cols, game.max_hq_health,
+                   game.spawn_interval, game.seed, game.moves)
+
+    def new_game(self):
+        return engine.Engine(self.variant, seed=self.seed, rows=self.rows, cols=self.cols,
+                             spawn_interval=self.spawn_interval, hq_health=self.hq_health)
+
+
+def move_width(rows, cols):
+    return 1 if rows * cols <= 256 else 2
+
+
+def encode(record):
+    if not 0 <= record.seed < 2 ** 64:
+        raise ValueError(f"seed {record.seed} does not fit in 64 bits")
+    header = RECORD.pack(VARIANT_IDS.index(record.variant), record.rows, record.cols,
+                         record.hq_health, record.spawn_interval, record.seed, len(record.moves))
+    if move_width(record.rows, record.cols) == 1:
+        return header + bytes(record.moves)
+    moves = array("H", record.moves)
+    if sys.byteorder != "little":
+        moves.byteswap()
+    return header + moves.tobytes()
+
+
+def write_log(path, records):
+    """Write a log of GameRecords (or finished Engines). Returns the number of games."""
+    count = 0
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        for record in records:
+            if isinstance(record, engine.Engine):
+                record = GameRecord.from_game(record)
+            file.write(encode(record))
+            count += 1
+    return count
+
+
+def read_log(path):
+    """Yield the GameRecords of a log, one at a time."""
+    with open(path, "rb") as file:
+        magic = file.read(len(MAGIC))
+        if magic[:-1] == MAGIC[:-1] and magic != MAGIC:
+            raise ValueError(f"{path} was logged by version {magic[-1]} of engine.py; "
+                             f"version {engine.REPLAY_VERSION} does not replay it the same")
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game log")
+        while True:
+            header = file.read(RECORD.size)
+            if not header:
+                return
+            if len(header) < RECORD.size:
+                raise ValueError(f"{path} ends in the middle of a game")
+            variant, rows, cols, hq_health, spawn_interval, seed, count = RECORD.unpack(header)
+            width = move_width(rows, cols)
+            data = file.read(count * width)
+            if len(data) < count * width:
+                raise ValueError(f"{path} ends in the middle of a game")
+            if width == 1:
+                moves = data
+            else:
+                moves = array("H")
+                moves.frombytes(data)
+                if sys.byteorder != "little":
+                    moves.byteswap()
+            yield GameRecord(VARIANT_IDS[variant], rows, cols, hq_health, spawn_interval, seed, moves)
+
+
+def replay(record):
+    """Re-play a logged game at engine speed and return the finished Engine."""
+    game = record.new_game()
+    play = game.play_index
+    for number, index in enumerate(record.moves):
+        if not play(index):
+            raise ValueError(f"move {number + 1} (cell {index}) of seed {record.seed} is not valid")
+    return game
+
+
+def random_game(variant, seed, rows=None, cols=None):
+    """A game of uniformly random valid moves; the bot has its own generator."""
+    game = engine.Engine(variant, seed=seed, rows=rows, cols=cols)
+    rng = random.Random(seed)
+    while not game.game_over and game.turns_played < MAX_MOVES:
+        moves = game.valid_moves()
+        if not moves:
+            break
+        game.play_index(rng.choice(moves))
+    return game
+
+
+def from_recording(recording):
+    """A GameRecord from a JSON recording made with CR_1.6.py --record."""
+    if recording.get("version") != engine.REPLAY_VERSION:
+        raise ValueError(f"the recording is version {recording.get('version')}; "
+                         f"engine.py replays version {engine.REPLAY_VERSION}")
+    rows, cols = recording["board"]
+    return GameRecord("hq_powerups", rows, cols, engine.VARIANTS["hq_powerups"].hq_health,
+                      recording["spawn_interval"], recording["seed"],
+                      [row * cols + col for row, col in recording["moves"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="log games of random moves")
+    record.add_argument("log")
+    record.add_argument("--games", type=int, default=1000)
+    record.add_argument("--variant", choices=VARIANT_IDS, default="hq_powerups")
+    record.add_argument("--board", help="ROWSxCOLS (default: the variant's)")
+    record.add_argument("--seed", type=int, default=1, help="seed of the first game")
+    convert = commands.add_parser("convert", help="turn a CR_1.6.py JSON recording into a log")
+    convert.add_argument("recording")
+    convert.add_argument("log")
+    replay_command = commands.add_parser("replay", help="re-play every game of a log")
+    replay_command.add_argument("log")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        rows = cols = None
+        if args.board:
+            rows, cols = (int(part) for part in args.board.lower().split("x"))
+        games = (random_game(args.variant, seed, rows, cols) for seed in range(args.seed, args.seed + args.games))
+        count = write_log(args.log, games)
+        print(f"{count} games written to {args.log}")
+    elif args.command == "convert":
+        with open(args.recording) as file:
+            count = write_log(args.log, [from_recording(json.load(file))])
+        print(f"{count} game written to {args.log}")
+    else:
+        games = moves = 0
+        winners = {}
+        start = time.perf_counter()
+        for record in read_log(args.log):
+            game = replay(record)
+            games += 1
+            moves += len(record.moves)
+            winner = {engine.RED: "red", engine.BLUE: "blue"}.get(game.winner, "none")
+            winners[winner] = winners.get(winner, 0) + 1
+        elapsed = time.perf_counter() - start
+        print(f"{games} games, {moves} moves in {elapsed:.2f} s: "
+              f"{games / elapsed:.1f} games/s, {moves / elapsed:.0f} moves/s; winners {winners}")
+
+
+if __name__ == "__main__":
+    main()
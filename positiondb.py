@@ -0,0 +1,254 @@
+"""
+Append-only, memory-mapped database of packed positions with outcome labels.
+
+    python positiondb.py add selfplay.crdb games.crlog
+    python positiondb.py info selfplay.crdb
+
+    with PositionDB("selfplay.crdb", positions.PositionCodec("hq_powerups")) as db:
+        number = db.add(game, engine.RED)        # record number, the same for a repeated position
+    db = PositionDB("selfplay.crdb", mode="r")   # any number of reader processes
+    db.positions[numbers]                        # zero-copy rows of the memory map
+    db.outcomes[db.find(game)]                   # games won by nobody, red and blue from there
+
+The data file is a header and fixed-size records: a positions.py packed
+position, its seed zeroed, and three outcome counters indexed by
+engine.NONE, RED and BLUE.
+A position seen again only bumps its counters, so every record is unique.
+The hash index lives next to it in <path>.idx, an open-addressing table of
+(hash, record number + 1) pairs, and is rebuilt from the records whenever it
+is missing or behind. There is one writer at a time; readers see the records
+committed by the last flush() when they open or refresh().
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+
+import numpy
+
+import engine
+import movelog
+import positions
+
+MAGIC = b"CRDB\x01"
+HEADER = struct.Struct("<5sBBBHQ")  # magic, variant, rows, cols, position size, records
+DATA_OFFSET = 64
+MIN_CAPACITY = 1024
+INDEX_LOAD = 0.5  # The index doubles once it is this full
+
+
+def position_hash(data):
+    """A non-zero 64-bit hash of packed position bytes; 0 marks a free index slot."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") | 1
+
+
+class PositionDB:
+    def __init__(self, path, codec=None, mode="a"):
+        if mode not in ("a", "r"):
+            raise ValueError(f"mode must be 'a' or 'r', not {mode!r}")
+        self.path = path
+        self.index_path = path + ".idx"
+        self.writable = mode == "a"
+        if not os.path.exists(path):
+            if not self.writable or codec is None:
+                raise FileNotFoundError(f"{path} does not exist; give a codec to create it")
+            with open(path, "wb") as file:
+                file.write(HEADER.pack(MAGIC, movelog.VARIANT_IDS.index(codec.variant.name),
+                                       codec.rows, codec.cols, codec.size, 0).ljust(DATA_OFFSET, b"\0"))
+        self.data = self.index = None
+        self.refresh()
+        if codec is not None and (codec.variant.name, codec.rows, codec.cols) != \
+                (self.codec.variant.name, self.codec.rows, self.codec.cols):
+            raise ValueError(f"{path} holds {self.codec.variant.name} positions "
+                             f"on a {self.codec.rows}x{self.codec.cols} board")
+
+    def refresh(self):
+        """Re-read the header and map the records (and index) committed so far."""
+        with open(self.path, "rb") as file:
+            magic, variant, rows, cols, size, count = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a position database")
+        self.codec = positions.PositionCodec(movelog.VARIANT_IDS[variant], rows, cols)
+        if size != self.codec.size:
+            raise ValueError(f"{self.path} has {size}-byte positions, expected {self.codec.size}")
+        self.dtype = numpy.dtype([("position", numpy.uint8, size), ("outcomes", "<u4", 3)])
+        self.count = count
+        capacity = (os.path.getsize(self.path) - DATA_OFFSET) // self.dtype.itemsize
+        self.map_data(max(capacity, count))
+        self.load_index()
+
+    def map_data(self, capacity):
+        if self.writable and capacity < MIN_CAPACITY:
+            capacity = MIN_CAPACITY
+        self.capacity = capacity
+        if capacity == 0:
+            self.data = numpy.zeros(0, dtype=self.dtype)
+            return
+        mode = "r+" if self.writable else "r"
+        self.data = numpy.memmap(self.path, dtype=self.dtype, mode=mode, offset=DATA_OFFSET,
+                                 shape=(capacity,))
+
+    def load_index(self):
+        """Map <path>.idx, rebuilding it first if it does not cover every record (readers go without)."""
+        if os.path.exists(self.index_path):
+            mode = "r+" if self.writable else "r"
+            self.index = numpy.memmap(self.index_path, dtype="<u8", mode=mode).reshape(-1, 2)
+            # Readers may open between a writer's index and header flushes
+            if self.index[0, 0] == self.count or (not self.writable and self.index[0, 0] > self.count):
+                return
+        self.index = None
+        if self.writable:
+            self.build_index(max(MIN_CAPACITY, int(self.count / INDEX_LOAD) * 2))
+
+    def build_index(self, slots):
+        slots = 1 << (slots - 1).bit_length()
+        self.index = None
+        index = numpy.memmap(self.index_path, dtype="<u8", mode="w+", shape=(slots + 1, 2))
+        self.index = index
+        self.mask = slots - 1
+        for number in range(self.count):
+            self.insert(position_hash(self.data["position"][number].tobytes()), number)
+        index[0] = (self.count, slots)
+
+    def slot(self, key, data):
+        """The index row of `data`, or of the free slot it would go to."""
+        mask = int(self.index[0, 1]) - 1
+        row = key & mask
+        while True:
+            stored = int(self.index[row + 1, 0])
+            if stored == 0:
+                return row + 1, False
+            number = int(self.index[row + 1, 1]) - 1
+            if number >= self.count:
+                return row + 1, False  # Left behind by a writer that never flushed
+            if stored == key:
+                if self.data["position"][number].tobytes() == data:
+                    return row + 1, True
+            row = (row + 1) & mask
+
+    def insert(self, key, number):
+        row = key & self.mask
+        while self.index[row + 1, 0]:
+            row = (row + 1) & self.mask
+        self.index[row + 1] = (key, number + 1)
+
+    def find(self, position):
+        """Record number of a position (an Engine or packed bytes), or -1."""
+        if self.index is None:
+            raise ValueError(f"{self.index_path} is missing or out of date; open {self.path} for writing to rebuild it")
+        data = self.pack(position)
+        row, found = self.slot(position_hash(data), data)
+        return int(self.index[row, 1]) - 1 if found else -1
+
+    def pack(self, position):
+        """Packed bytes of a position with its seed zeroed, so that every game through it shares the record."""
+        data = bytearray(self.codec.encode(position) if isinstance(position, engine.Engine) else position)
+        data[positions.SEED] = bytes(positions.SEED.stop - positions.SEED.start)
+        return bytes(data)
+
+    def add(self, position, winner):
+        """Count one game won by `winner` through `position`. Returns the record number."""
+        if not self.writable:
+            raise ValueError(f"{self.path} is open read-only")
+        data = self.pack(position)
+        if len(data) != self.codec.size:
+            raise ValueError(f"a position is {self.codec.size} bytes, not {len(data)}")
+        key = position_hash(data)
+        row, found = self.slot(key, data)
+        if found:
+            number = int(self.index[row, 1]) - 1
+        else:
+            number = self.count
+            if number == self.capacity:
+                self.grow()
+            self.data["position"][number] = numpy.frombuffer(data, dtype=numpy.uint8)
+            self.count += 1
+            if self.count > INDEX_LOAD * int(self.index[0, 1]):
+                self.build_index(int(self.index[0, 1]) * 2)
+            else:
+                self.index[row] = (key, number + 1)
+        self.data["outcomes"][number, winner] += 1
+        return number
+
+    def add_batch(self, batch, winner):
+        """Add every row of a packed (N, size) batch with the same outcome."""
+        return [self.add(row.tobytes(), winner) for row in numpy.asarray(batch, dtype=numpy.uint8)]
+
+    def grow(self):
+        self.data.flush()
+        capacity = self.capacity * 2
+        with open(self.path, "r+b") as file:
+            file.truncate(DATA_OFFSET + capacity * self.dtype.itemsize)
+        self.data = None
+        self.map_data(capacity)
+
+    def flush(self):
+        """Commit the records to disk, so new readers see them."""
+        if not self.writable:
+            return
+        self.data.flush()
+        self.index[0, 0] = self.count
+        self.index.flush()
+        with open(self.path, "r+b") as file:
+            file.seek(HEADER.size - 8)
+            file.write(struct.pack("<Q", self.count))
+
+    def close(self):
+        self.flush()
+        self.data = self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def positions(self):
+        return self.data["position"][:self.count]
+
+    @property
+    def outcomes(self):
+        return self.data["outcomes"][:self.count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add every position of a game log, labeled with its result")
+    add.add_argument("database")
+    add.add_argument("log")
+    info = commands.add_parser("info", help="summarize a database")
+    info.add_argument("database")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        db = None
+        games = added = 0
+        for record in movelog.read_log(args.log):
+            if db is None:
+                db = PositionDB(args.database, positions.PositionCodec(record.variant, record.rows, record.cols))
+                before = len(db)
+            batch = positions.log_positions(db.codec, record)
+            winner = int(db.codec.unpack(batch[-1:])["winner"][0]) if len(batch) else engine.NONE
+            db.add_batch(batch, winner)
+            games += 1
+            added += len(batch)
+        if db is None:
+            raise SystemExit(f"{args.log} holds no games")
+        db.close()
+        print(f"{added} positions of {games} games, {db.count - before} new; {db.count} in {args.database}")
+    else:
+        db = PositionDB(args.database, mode="r")
+        outcomes = db.outcomes.sum(axis=0)
+        print(f"{db.count} {db.codec.variant.name} positions on a {db.codec.rows}x{db.codec.cols} board, "
+              f"{db.dtype.itemsize} bytes each; {outcomes.sum()} labels: "
+              f"{outcomes[engine.RED]} red wins, {outcomes[engine.BLUE]} blue wins, {outcomes[engine.NONE]} other")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Fixed-width packed positions of engine.py games, encoded and decoded in batches with NumPy.
+
+    codec = PositionCodec("hq_powerups")
+    data = codec.encode(game)                 # bytes, codec.size long
+    batch = codec.encode_batch(games)         # uint8 array, one row per position
+    fields = codec.unpack(batch)              # dots, owner, powerup, ... as arrays
+    games = codec.decode_batch(batch)
+
+    python positions.py games.crlog positions.npy
+
+From the command line, every position of a movelog.py log is written to a
+.npy dataset of packed rows.
+
+A position is an 18-byte header followed by 6 bits per cell, four cells to
+three bytes (81 bytes on 9x9):
+
+    header   red HQ health (int8), blue HQ health (int8),
+             flags (player to move: bits 0-1, winner: bits 2-3, game over: bit 4),
+             powerups spawned (uint8), turns played (uint32, little-endian),
+             seed (uint64, little-endian), spawn interval (uint8), HQ health
+             at the start (uint8)
+    cell     dots (bits 0-1), owner (bits 2-3), powerup (bits 4-5)
+
+Only stars overfill a cell past three dots, and a cell holding dots never
+holds a powerup, so powerup code 3 marks an overfull cell whose dots field
+counts from 4. Positions keep the seed but not how far the random generator
+has got: a decoded game draws its next powerups from the start of the seed
+(matchhost.py replays what was drawn to put it back).
+"""
+
+import argparse
+import time
+
+import numpy
+
+import engine
+import movelog
+
+HEADER_SIZE = 18
+SEED = slice(8, 16)  # Header bytes of the seed
+OVERFULL = 3  # Powerup code of a cell with 4-7 dots
+MAX_DOTS = 7
+
+
+def state(game):
+    """A copy of everything a packed position holds, cheap enough to take after every move."""
+    return (game.dots[:], game.owner[:], game.powerup[:],
+            (game.red_hq_health, game.blue_hq_health,
+             game.current_player | game.winner << 2 | game.game_over << 4,
+             game.powerup_spawns, game.turns_played, game.seed, game.spawn_interval, game.max_hq_health))
+
+
+class PositionCodec:
+    """Packs positions of one variant and board size."""
+
+    def __init__(self, variant="hq_powerups", rows=None, cols=None):
+        self.variant = engine.VARIANTS[variant] if isinstance(variant, str) else variant
+        self.rows = rows or self.variant.rows
+        self.cols = cols or self.variant.cols
+        self.cells = self.rows * self.cols
+        self.padded_cells = -(-self.cells // 4) * 4
+        self.size = HEADER_SIZE + self.padded_cells // 4 * 3
+
+    def pack_cells(self, dots, owner, powerup):
+        """(N, cells) arrays of dots, owners and powerups -> (N, cell bytes) uint8."""
+        dots = numpy.asarray(dots, dtype=numpy.uint8)
+        owner = numpy.asarray(owner, dtype=numpy.uint8)
+        powerup = numpy.asarray(powerup, dtype=numpy.uint8)
+        if (dots > MAX_DOTS).any():
+            raise ValueError(f"a cell holds more than {MAX_DOTS} dots")
+        overfull = dots > 3
+        if (overfull & (powerup != engine.NO_POWERUP)).any():
+            raise ValueError("an overfull cell holds a powerup")
+        codes = numpy.zeros((dots.shape[0], self.padded_cells), dtype=numpy.uint8)
+        codes[:, :self.cells] = ((dots - overfull * 4) | (owner << 2)
+                                 | (numpy.where(overfull, OVERFULL, powerup) << 4))
+        groups = codes.reshape(len(codes), -1, 4)
+        packed = numpy.empty((len(codes), groups.shape[1], 3), dtype=numpy.uint8)
+        packed[:, :, 0] = groups[:, :, 0] | (groups[:, :, 1] << 6)
+        packed[:, :, 1] = (groups[:, :, 1] >> 2) | (groups[:, :, 2] << 4)
+        packed[:, :, 2] = (groups[:, :, 2] >> 4) | (groups[:, :, 3] << 2)
+        return packed.reshape(len(codes), -1)
+
+    def unpack_cells(self, data):
+        """(N, cell bytes) uint8 -> dots, owner, powerup as (N, cells) uint8 arrays."""
+        packed = numpy.asarray(data, dtype=numpy.uint8).reshape(len(data), -1, 3)
+        codes = numpy.empty((len(data), packed.shape[1], 4), dtype=numpy.uint8)
+        codes[:, :, 0] = packed[:, :, 0] & 0x3F
+        codes[:, :, 1] = (packed[:, :, 0] >> 6) | ((packed[:, :, 1] & 0x0F) << 2)
+        codes[:, :, 2] = (packed[:, :, 1] >> 4) | ((packed[:, :, 2] & 0x03) << 4)
+        codes[:, :, 3] = packed[:, :, 2] >> 2
+        codes = codes.reshape(len(data), -1)[:, :self.cells]
+        dots = codes & 0x03
+        owner = (codes >> 2) & 0x03
+        powerup = codes >> 4
+        overfull = powerup == OVERFULL
+        dots[overfull] += 4
+        powerup[overfull] = engine.NO_POWERUP
+        return dots, owner, powerup
+
+    def encode_batch(self, games):
+        """Pack a sequence of Engines into an (N, size) uint8 array."""
+        games = list(games)
+        for game in games:
+            if game.rows != self.rows or game.cols != self.cols:
+                raise ValueError(f"a {game.rows}x{game.cols} game does not fit a {self.rows}x{self.cols} codec")
+        return self.pack([state(game) for game in games])
+
+    def pack(self, states):
+        """Pack a list of state() tuples into an (N, size) uint8 array."""
+        batch = numpy.zeros((len(states), self.size), dtype=numpy.uint8)
+        if not states:
+            return batch
+        dots, owner, powerup, header = zip(*states)
+        batch[:, HEADER_SIZE:] = self.pack_cells(dots, owner, powerup)
+        seeds = [fields[5] for fields in header]
+        if not all(0 <= seed < 2 ** 64 for seed in seeds):
+            raise ValueError("a seed does not fit in 64 bits")
+        header = numpy.array([fields[:5] + fields[6:] for fields in header], dtype=numpy.int64)
+        batch[:, 0:2] = header[:, 0:2].astype(numpy.int8).view(numpy.uint8)
+        batch[:, 2] = header[:, 2]
+        batch[:, 3] = header[:, 3]
+        batch[:, 4:8] = header[:, 4].astype("<u4").view(numpy.uint8).reshape(-1, 4)
+        batch[:, SEED] = numpy.array(seeds, dtype="<u8").view(numpy.uint8).reshape(-1, 8)
+        batch[:, 16] = header[:, 5]
+        batch[:, 17] = header[:, 6]
+        return batch
+
+    def encode(self, game):
+        return self.encode_batch([game])[0].tobytes()
+
+    def unpack(self, batch):
+        """All fields of an (N, size) batch as NumPy arrays, for analysis without building games."""
+        batch = numpy.asarray(batch, dtype=numpy.uint8).reshape(-1, self.size)
+        dots, owner, powerup = self.unpack_cells(batch[:, HEADER_SIZE:])
+        flags = batch[:, 2]
+        return {
+            "dots": dots,
+            "owner": owner,
+            "powerup": powerup,
+            "red_hq_health": batch[:, 0].view(numpy.int8),
+            "blue_hq_health": batch[:, 1].view(numpy.int8),
+            "current_player": flags & 0x03,
+            "winner": (flags >> 2) & 0x03,
+            "game_over": (flags >> 4) & 0x01,
+            "powerup_spawns": batch[:, 3],
+            "turns_played": numpy.ascontiguousarray(batch[:, 4:8]).view("<u4")[:, 0],
+            "seed": numpy.ascontiguousarray(batch[:, SEED]).view("<u8")[:, 0],
+            "spawn_interval": batch[:, 16],
+            "max_hq_health": batch[:, 17],
+        }
+
+    def decode_batch(self, batch):
+        """Engines for every position of a batch."""
+        fields = self.unpack(batch)
+        columns = {name: values.tolist() for name, values in fields.items()}
+        games = []
+        for number in range(len(columns["dots"])):
+            game = engine.Engine(self.variant, seed=columns["seed"][number], rows=self.rows, cols=self.cols,
+                                 spawn_interval=columns["spawn_interval"][number],
+                                 hq_health=columns["max_hq_health"][number])
+            game.dots = columns["dots"][number]
+            game.owner = columns["owner"][number]
+            game.powerup = columns["powerup"][number]
+            game.red_hq_health = columns["red_hq_health"][number]
+            game.blue_hq_health = columns["blue_hq_health"][number]
+            game.current_player = columns["current_player"][number]
+            game.winner = columns["winner"][number]
+            game.game_over = bool(columns["game_over"][number])
+            game.powerup_spawns = columns["powerup_spawns"][number]
+            game.turns_played = columns["turns_played"][number]
+            games.append(game)
+        return games
+
+    def decode(self, data):
+        return self.decode_batch(numpy.frombuffer(data, dtype=numpy.uint8).reshape(1, -1))[0]
+
+
+def log_positions(codec, record):
+    """The position after every move of a logged game, as an (N, size) batch."""
+    game = record.new_game()
+    states = []
+    for number, index in enumerate(record.moves):
+        if not game.play_index(index):
+            raise ValueError(f"move {number + 1} (cell {index}) of seed {record.seed} is not valid")
+        states.append(state(game))
+    return codec.pack(states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="game log made with movelog.py")
+    parser.add_argument("output", help=".npy file for the packed positions")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    codec = None
+    batches = []
+    for record in movelog.read_log(args.log):
+        if codec is None:
+            codec = PositionCodec(record.variant, record.rows, record.cols)
+        elif (record.variant, record.rows, record.cols) != (codec.variant.name, codec.rows, codec.cols):
+            raise SystemExit("every game of the log must share one variant and board size")
+        batches.append(log_positions(codec, record))
+    if codec is None:
+        raise SystemExit(f"{args.log} holds no games")
+    positions = numpy.concatenate(batches)
+    numpy.save(args.output, positions)
+    elapsed = time.perf_counter() - start
+    print(f"{len(positions)} positions of {len(batches)} games, {codec.size} bytes each, "
+          f"written to {args.output} in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
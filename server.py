@@ -0,0 +1,429 @@
+"""
+Authoritative multiplayer server: matches are played out in engine.py, clients send moves and draw.
+
+    python server.py [--host 127.0.0.1] [--port 8765] [--ws-port 8766]
+    python CR_1.6.py --connect 127.0.0.1:8765
+
+Every match lives in one asyncio event loop with all the others. A move is
+checked with is_valid_move and its chain reaction is resolved WAVES_PER_TICK
+waves at a time, so a long reaction lets the other matches run in between;
+then what changed goes to both players as a sync.py delta.
+
+Any number of spectators can watch a match. Each update is encoded once and
+the same bytes are queued on every connection without waiting for any of
+them. A connection with more than HIGH_WATER bytes still unsent is skipped
+from then on; once it drains it gets the latest snapshot instead of the
+deltas it missed, and if it has not drained within DROP_AFTER seconds it is
+disconnected. The rules are those of CR_1.6.py, as
+engine.py reproduces them (check_engine.py), since the script itself opens a
+window on import.
+
+Messages are JSON objects, one per line over TCP or one per text message over
+WebSocket (which needs the websockets package):
+
+    client  {"type": "join"}                        pair with the next player
+            {"type": "join", "match": 12}           take the free seat of match 12
+            {"type": "join", "variant": "hq", "board": [12, 12]}
+            {"type": "move", "row": 7, "col": 4}
+            {"type": "resync"}                      ask for a snapshot
+            {"type": "watch", "match": 12}          spectate match 12
+    server  {"type": "joined", "match", "color", "variant", "board", "seed", "spawn_interval"}
+            {"type": "watching", "match", "variant", "board", "players"}
+            {"type": "start", "match"}               both seats are taken
+            {"type": "snapshot", "match", "turn", "position", "checksum"}
+                                                     after start and on resync
+            {"type": "state", "match", "player", "move", "exploded", ...}
+                                                     after every move, with the sync.py delta
+            {"type": "opponent_left", "match", "color"}
+            {"type": "error", "message"}
+
+"position" is a base64 positions.py packed position.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+from functools import lru_cache
+
+import engine
+import positions
+import sync
+
+DEFAULT_PORT = 8765
+MAX_BOARD_SIDE = 500
+HIGH_WATER = 256 * 1024  # Unsent bytes that make a connection skip updates until it drains
+DROP_AFTER = 10.0  # Seconds a lagging connection gets to drain before it is closed
+WAVES_PER_TICK = 64  # Waves of one chain reaction resolved before the event loop runs other work
+COLOR_NAMES = sync.COLOR_NAMES
+
+
+def encode_message(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+@lru_cache(maxsize=4)
+def frame_text(data):
+    """The WebSocket text of an encoded message, shared by every WebSocket client."""
+    return data[:-1].decode()
+
+
+def match_key(message):
+    """(variant, rows, cols) of a join message and None, or None and what is wrong with it."""
+    variant = message.get("variant", "hq_powerups")
+    if variant not in engine.VARIANTS:
+        return None, f"unknown variant {variant!r}"
+    try:
+        rows, cols = (int(side) for side in message.get("board") or
+                      (engine.VARIANTS[variant].rows, engine.VARIANTS[variant].cols))
+    except (TypeError, ValueError):
+        rows = cols = 0
+    if not (4 <= rows <= MAX_BOARD_SIDE and 3 <= cols <= MAX_BOARD_SIDE):
+        return None, f"the board must be [rows, cols] from 4x3 to {MAX_BOARD_SIDE}x{MAX_BOARD_SIDE}"
+    return (variant, rows, cols), None
+
+
+async def resolve(game, index):
+    """Play a valid move, letting the other matches run every WAVES_PER_TICK waves of its chain reaction."""
+    game.start_move(index)
+    waves = 0
+    while game.in_flight:
+        game.land_wave()
+        waves += 1
+        if waves % WAVES_PER_TICK == 0:
+            await asyncio.sleep(0)
+    game.finish_move()
+
+
+class StreamConnection:
+    """A client on a TCP stream, one JSON object per line."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lagging = False
+
+    async def send(self, message):
+        self.writer.write(encode_message(message))
+        await self.writer.drain()
+
+    def write(self, data):
+        """Queue an encoded message without waiting."""
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def buffered(self):
+        return self.writer.transport.get_write_buffer_size()
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def messages(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                await self.send({"type": "error", "message": "messages must be JSON objects, one per line"})
+
+    def close(self):
+        self.writer.close()
+
+
+class WebSocketConnection:
+    """A client on a websockets connection, one JSON object per text message."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.lagging = False
+        self.pending = set()  # Sends still in progress
+        self.pending_bytes = 0
+
+    async def send(self, message):
+        await self.websocket.send(json.dumps(message, separators=(",", ":")))
+
+    def write(self, data):
+        task = asyncio.ensure_future(self.websocket.send(frame_text(data)))
+        self.pending.add(task)
+        self.pending_bytes += len(data)
+
+        def sent(task, size=len(data)):
+            self.pending.discard(task)
+            self.pending_bytes -= size
+
+        task.add_done_callback(sent)
+
+    def buffered(self):
+        return self.pending_bytes
+
+    async def drain(self):
+        if self.pending:
+            await asyncio.gather(*self.pending)
+
+    async def messages(self):
+        async for text in self.websocket:
+            try:
+                yield json.loads(text)
+            except ValueError:
+                await self.send({"type": "error", "message": "messages must be JSON objects"})
+
+    def close(self):
+        asyncio.ensure_future(self.websocket.close())
+
+
+class Match:
+    def __init__(self, number, variant, rows, cols, seed):
+        self.number = number
+        self.game = engine.Engine(variant, seed=seed, rows=rows, cols=cols)
+        self.codec = positions.PositionCodec(variant, rows, cols)
+        self.game.wave_log = []
+        self.encoder = sync.DeltaEncoder(self.codec, self.game)
+        self.players = {}  # Color -> connection
+        self.spectators = set()
+        self.snapshot = None  # (encoder state, encoded snapshot message)
+        self.resolving = False  # A move is part-way through its chain reaction
+
+    @property
+    def key(self):
+        return self.game.variant.name, self.game.rows, self.game.cols
+
+    def free_color(self):
+        """The first player's color goes to whoever joins first."""
+        first = self.game.variant.first_player
+        for color in (first, engine.BLUE if first == engine.RED else engine.RED):
+            if color not in self.players:
+                return color
+        return None
+
+    def state_message(self, player, index):
+        game = self.game
+        message = {"type": "state", "match": self.number, "player": COLOR_NAMES[player],
+                   "move": list(divmod(index, game.cols)), "exploded": game.exploded}
+        message.update(self.encoder.delta(game))
+        return message
+
+    def snapshot_message(self):
+        return dict(self.encoder.snapshot(), type="snapshot", match=self.number)
+
+    def snapshot_frame(self):
+        """The encoded snapshot of the last published position, shared by everyone who needs one.
+
+        While a move resolves that is the position before it, which the move's delta applies to.
+        """
+        if self.snapshot is None or self.snapshot[0] is not self.encoder.last:
+            self.snapshot = (self.encoder.last, encode_message(self.snapshot_message()))
+        return self.snapshot[1]
+
+    def audience(self):
+        return [*self.players.values(), *self.spectators]
+
+
+class Server:
+    def __init__(self, seed=None):
+        self.matches = {}
+        self.waiting = {}  # (variant, rows, cols) -> match with one free seat
+        self.numbers = itertools.count(1)
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.lagged = 0  # Times a connection fell behind and was sent a snapshot
+        self.dropped = 0  # Connections closed for not draining in time
+
+    async def handle(self, connection):
+        """Serve one client until it disconnects."""
+        match = color = None
+        self.connections += 1
+        try:
+            async for message in connection.messages():
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind == "join" and match is None:
+                    match, color = await self.join(connection, message)
+                elif kind == "move" and match is not None:
+                    await self.move(match, color, connection, message)
+                elif kind == "watch" and match is None:
+                    match = await self.watch(connection, message)
+                elif kind == "resync" and match is not None:
+                    connection.write(match.snapshot_frame())
+                else:
+                    await connection.send({"type": "error", "message": f"unexpected message {kind!r}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if match is not None and color is None:
+                match.spectators.discard(connection)
+            elif match is not None:
+                self.leave(match, color)
+            connection.close()
+            self.connections -= 1
+
+    async def join(self, connection, message):
+        if "match" in message:
+            match = self.matches.get(message["match"])
+            if match is None or match.free_color() is None:
+                await connection.send({"type": "error", "message": f"match {message['match']} has no free seat"})
+                return None, None
+        else:
+            key, error = match_key(message)
+            if error:
+                await connection.send({"type": "error", "message": error})
+                return None, None
+            match = self.waiting.pop(key, None)
+            if match is None:
+                match = Match(next(self.numbers), *key, self.rng.randrange(2 ** 32))
+                self.matches[match.number] = match
+                self.waiting[key] = match
+        color = match.free_color()
+        match.players[color] = connection
+        if len(match.players) == 2 and self.waiting.get(match.key) is match:
+            del self.waiting[match.key]
+        game = match.game
+        await connection.send({"type": "joined", "match": match.number, "color": COLOR_NAMES[color],
+                               "variant": game.variant.name, "board": [game.rows, game.cols],
+                               "seed": game.seed, "spawn_interval": game.spawn_interval})
+        if len(match.players) == 2:
+            self.publish(match, {"type": "start", "match": match.number})
+            self.publish_frame(match, match.snapshot_frame())
+        return match, color
+
+    async def watch(self, connection, message):
+        match = self.matches.get(message.get("match"))
+        if match is None:
+            await connection.send({"type": "error", "message": f"there is no match {message.get('match')!r} to watch"})
+            return None
+        match.spectators.add(connection)
+        game = match.game
+        await connection.send({"type": "watching", "match": match.number, "variant": game.variant.name,
+                               "board": [game.rows, game.cols],
+                               "players": sorted(COLOR_NAMES[color] for color in match.players)})
+        connection.write(match.snapshot_frame())
+        return match
+
+    async def move(self, match, color, connection, message):
+        game = match.game
+        row, col = message.get("row"), message.get("col")
+        if color is None:
+            error = "spectators cannot move"
+        elif len(match.players) < 2:
+            error = "the match has not started"
+        elif game.game_over:
+            error = "the game is over"
+        elif match.resolving:
+            error = "the last move is still being resolved"
+        elif color != game.current_player:
+            error = "it is not your turn"
+        elif not (isinstance(row, int) and isinstance(col, int) and 0 <= row < game.rows and 0 <= col < game.cols) \
+                or not game.is_valid_move(row, col):
+            error = f"({row}, {col}) is not a valid move"
+        else:
+            index = row * game.cols + col
+            match.resolving = True
+            try:
+                await resolve(game, index)
+            finally:
+                match.resolving = False
+            self.publish(match, match.state_message(color, index))
+            if game.game_over:
+                self.matches.pop(match.number, None)
+            return
+        await connection.send({"type": "error", "message": error})
+
+    def leave(self, match, color):
+        match.players.pop(color, None)
+        if self.waiting.get(match.key) is match:
+            del self.waiting[match.key]
+        self.matches.pop(match.number, None)
+        if not match.game.game_over:
+            # After the last move nobody is left waiting for this one
+            self.publish(match, {"type": "opponent_left", "match": match.number, "color": COLOR_NAMES[color]})
+
+    def publish(self, match, message):
+        """Send a message to the players and spectators of a match, encoded once."""
+        self.publish_frame(match, encode_message(message))
+
+    def publish_frame(self, match, data):
+        for connection in match.audience():
+            if connection.lagging:
+                continue  # catch_up() sends it a newer snapshot
+            if connection.buffered() > HIGH_WATER:
+                connection.lagging = True
+                self.lagged += 1
+                asyncio.ensure_future(self.catch_up(match, connection))
+            else:
+                connection.write(data)
+
+    async def catch_up(self, match, connection):
+        """Let a slow connection drain, then send the latest snapshot in place of the updates it missed."""
+        try:
+            await asyncio.wait_for(connection.drain(), DROP_AFTER)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.dropped += 1
+            connection.close()  # Its handler cleans up
+            return
+        connection.lagging = False
+        connection.write(match.snapshot_frame())
+
+    async def serve_tcp(self, host, port):
+        async def client_connected(reader, writer):
+            await self.handle(StreamConnection(reader, writer))
+
+        return await asyncio.start_server(client_connected, host, port)
+
+    async def serve_websocket(self, host, port):
+        import websockets
+
+        async def client_connected(websocket, path=None):
+            await self.handle(WebSocketConnection(websocket))
+
+        return await websockets.serve(client_connected, host, port)
+
+
+class Client:
+    """A TCP client for bots, tests and loopback benchmarks."""
+
+    async def connect(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.bytes_received = 0
+        return self
+
+    async def send(self, message):
+        self.writer.write(encode_message(message))
+        await self.writer.drain()
+
+    async def receive(self):
+        """The next message from the server, or None once it has closed the connection."""
+        line = await self.reader.readline()
+        self.bytes_received += len(line)
+        return json.loads(line) if line else None
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(host, port, ws_port, seed):
+    server = Server(seed)
+    await server.serve_tcp(host, port)
+    print(f"serving TCP on {host}:{port}")
+    if ws_port:
+        await server.serve_websocket(host, ws_port)
+        print(f"serving WebSocket on ws://{host}:{ws_port}")
+    await asyncio.Future()  # Until interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ws-port", type=int, help="also serve WebSocket clients here (needs websockets)")
+    parser.add_argument("--seed", type=int, help="seed of the match seeds, for reproducible sessions")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.ws_port, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Per-turn state deltas of engine.py games, for server.py and its clients.
+
+    encoder = DeltaEncoder(codec, game)      # server, once per match
+    game.wave_log = []                       # record the explosion waves
+    ...
+    message.update(encoder.delta(game))      # after every move
+
+    mirror = codec.decode(snapshot)          # client
+    apply_delta(mirror, message)
+    if not check(codec, mirror, message): ask for a snapshot
+
+A delta holds only what the move changed:
+
+    cells     [cell, dots, owner, powerup, cell, dots, ...] of every changed cell
+    hq        [red health, blue health], when either changed
+    spawns    [cells that got a new powerup, powerups spawned so far], when one
+              spawned (it may be taken in the same turn and leave no cell)
+    waves     one [cell, color, cell, color, ...] list per explosion wave, so
+              clients can animate the chain reaction themselves
+    checksum  CRC-32 of the packed position, every CHECKSUM_INTERVAL turns
+
+plus the turn, the player to move and the result. A client whose checksum
+disagrees asks for a snapshot: the whole packed position in base64.
+"""
+
+import base64
+import zlib
+
+import engine
+import positions
+
+CHECKSUM_INTERVAL = 8
+COLOR_NAMES = {engine.NONE: None, engine.RED: "red", engine.BLUE: "blue"}
+COLORS = {name: color for color, name in COLOR_NAMES.items()}
+
+
+def checksum(codec, game):
+    return zlib.crc32(codec.encode(game))
+
+
+def snapshot(codec, game):
+    """The fields of a snapshot message: the full position and its checksum."""
+    return snapshot_of_state(codec, positions.state(game))
+
+
+def snapshot_of_state(codec, state):
+    """snapshot() of a positions.state() tuple."""
+    data = codec.pack([state])[0].tobytes()
+    return {"turn": state[3][4], "position": base64.b64encode(data).decode("ascii"),
+            "checksum": zlib.crc32(data)}
+
+
+def read_snapshot(codec, message):
+    return codec.decode(base64.b64decode(message["position"]))
+
+
+class DeltaEncoder:
+    """Server side: what changed in one game since the last delta."""
+
+    def __init__(self, codec, game):
+        self.codec = codec
+        self.last = positions.state(game)  # The position the clients have
+
+    def snapshot(self):
+        """Snapshot fields of the position the last delta brought the clients to."""
+        return snapshot_of_state(self.codec, self.last)
+
+    def delta(self, game):
+        state = positions.state(game)
+        dots, owner, powerup, header = state
+        old_dots, old_owner, old_powerup, old_header = self.last
+        cells = []
+        spawns = []
+        for index, cell in enumerate(zip(dots, owner, powerup)):
+            if cell != (old_dots[index], old_owner[index], old_powerup[index]):
+                cells += (index, *cell)
+                # Nothing but a spawn puts a powerup on the board
+                if cell[2] and not old_powerup[index]:
+                    spawns.append(index)
+        self.last = state
+
+        message = {"turn": game.turns_played, "to_move": COLOR_NAMES[game.current_player],
+                   "game_over": game.game_over, "winner": COLOR_NAMES[game.winner], "cells": cells}
+        if header[:2] != old_header[:2]:
+            message["hq"] = [game.red_hq_health, game.blue_hq_health]
+        if header[3] != old_header[3]:
+            message["spawns"] = [spawns, game.powerup_spawns]
+        if game.wave_log is not None:
+            message["waves"] = [wave for wave in game.wave_log if wave]
+        if game.turns_played % CHECKSUM_INTERVAL == 0 or game.game_over:
+            message["checksum"] = checksum(self.codec, game)
+        return message
+
+
+def apply_delta(game, message):
+    """Client side: bring a mirror Engine up to date with a delta."""
+    cells = message["cells"]
+    for start in range(0, len(cells), 4):
+        index, dots, owner, powerup = cells[start:start + 4]
+        game.dots[index] = dots
+        game.owner[index] = owner
+        game.powerup[index] = powerup
+    if "hq" in message:
+        game.red_hq_health, game.blue_hq_health = message["hq"]
+    if "spawns" in message:
+        game.powerup_spawns = message["spawns"][1]
+    game.turns_played = message["turn"]
+    game.current_player = COLORS[message["to_move"]]
+    game.game_over = message["game_over"]
+    game.winner = COLORS[message["winner"]]
+
+
+def check(codec, game, message):
+    """False when the message carries a checksum that the mirror does not match."""
+    return "checksum" not in message or checksum(codec, game) == message["checksum"]